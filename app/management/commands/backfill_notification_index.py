@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from app.models import User
+from notifications.dispatcher import (
+    NOTIFICATIONS_PATH, UNREAD_NOTIFICATIONS_PATH, send_writes, unread_counter_path,
+)
+
+
+class Command(BaseCommand):
+    help = "Build unreadNotifications/ and the unread counters from the existing notifications/ data (one full read per user)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Paths per multi-path update")
+
+    def handle(self, *args, **options):
+        from firebase.firebase_config import db
+
+        users = total = 0
+        for user_id in User.all_objects.values_list('id', flat=True).iterator():
+            notifications = db.reference(f"{NOTIFICATIONS_PATH}/{user_id}").get() or {}
+            unread = {
+                key: value for key, value in notifications.items()
+                if isinstance(value, dict) and not value.get('is_read')
+            }
+            writes = {f"{UNREAD_NOTIFICATIONS_PATH}/{user_id}/{key}": value for key, value in unread.items()}
+            # A plain value, not an increment: this run is the source of truth
+            writes[unread_counter_path(user_id)] = len(unread)
+            send_writes(db, writes, options['chunk_size'])
+            users += 1
+            total += len(unread)
+
+        self.stdout.write(f"indexed {total} unread notifications for {users} users")
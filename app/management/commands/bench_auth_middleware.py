@@ -0,0 +1,55 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.response import Response
+
+from middlewares import auth_middleware
+from utils.jwt import generate_access_token
+from utils.redis import remove_cache, set_cache
+from utils.token_verifier import token_verifier
+
+
+@auth_middleware
+def _protected_view(request):
+    return Response({"id": request.user['id']})
+
+
+class Command(BaseCommand):
+    help = "Requests/sec through auth_middleware with and without the local token cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--tokens', type=int, default=50,
+                            help="Number of distinct users cycling through the middleware")
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        tokens = [generate_access_token(uuid.uuid4(), False) for _ in range(options['tokens'])]
+        for token in tokens:
+            set_cache(f"access_token:{token}", token, 600)
+        requests = [
+            factory.get('/bench', HTTP_AUTHORIZATION=f"Bearer {token}") for token in tokens
+        ]
+
+        try:
+            for use_local_cache in (False, True):
+                token_verifier.use_local_cache = use_local_cache
+                token_verifier.clear()
+
+                start = time.perf_counter()
+                for i in range(options['requests']):
+                    response = _protected_view(requests[i % len(requests)])
+                    if response.status_code != 200:
+                        raise RuntimeError(f"Unexpected status {response.status_code}")
+                elapsed = time.perf_counter() - start
+
+                label = 'local + redis' if use_local_cache else 'redis only'
+                self.stdout.write(
+                    f"{label:>14}: {options['requests'] / elapsed:10.0f} req/s "
+                    f"({elapsed * 1e6 / options['requests']:.1f} us/req)"
+                )
+        finally:
+            for token in tokens:
+                remove_cache(f"access_token:{token}")
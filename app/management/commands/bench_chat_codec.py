@@ -0,0 +1,77 @@
+import random
+import string
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.codec import JsonCodec, MsgpackCodec, msgpack
+
+
+def _frame_header(length):
+    # Server to client websocket frames are not masked
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+
+class Command(BaseCommand):
+    help = "Serialization CPU and wire bytes of a chat history replay, JSON vs MessagePack"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10000)
+        parser.add_argument('--batch', type=int, default=50,
+                            help="Messages per frame in batched mode")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if msgpack is None:
+            self.stderr.write("msgpack is not installed")
+            return
+
+        rng = random.Random(42)
+        start = timezone.now() - timedelta(days=1)
+        messages = [
+            {
+                'id': str(uuid.UUID(int=rng.getrandbits(128))),
+                'content': ''.join(rng.choices(string.ascii_letters + ' ', k=rng.randint(10, 160))),
+                'sender': f"user-{rng.randint(1, 50)}",
+                'created_at': (start + timedelta(seconds=i)).isoformat(),
+            }
+            for i in range(options['messages'])
+        ]
+        single = [{'action': 'send_message', 'message': message} for message in messages]
+        batched = [
+            {'action': 'send_messages', 'messages': messages[i:i + options['batch']]}
+            for i in range(0, len(messages), options['batch'])
+        ]
+
+        self.stdout.write(
+            f"{'protocol':>22} {'frames':>7} {'wire KB':>9} {'encode ms':>10} {'decode ms':>10}")
+        for label, codec, frames in (
+            ('json, 1 per frame', JsonCodec, single),
+            (f"json, {options['batch']} per frame", JsonCodec, batched),
+            ('msgpack, 1 per frame', MsgpackCodec, single),
+            (f"msgpack, {options['batch']} per frame", MsgpackCodec, batched),
+        ):
+            encode, decode = [], []
+            for _ in range(options['repeat']):
+                began = time.process_time()
+                payloads = [codec.encode(frame) for frame in frames]
+                encode.append(time.process_time() - began)
+
+                began = time.process_time()
+                for payload in payloads:
+                    codec.decode(payload)
+                decode.append(time.process_time() - began)
+
+            sizes = [len(payload.encode() if isinstance(payload, str) else payload) for payload in payloads]
+            wire = sum(size + _frame_header(size) for size in sizes)
+            self.stdout.write(
+                f"{label:>22} {len(frames):>7} {wire / 1024:>9.0f} "
+                f"{min(encode) * 1000:>10.1f} {min(decode) * 1000:>10.1f}"
+            )
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, teardown_databases
+
+from app.models import Message, Room, User
+import chat.consumers
+from chat.consumers import ChatConsumer
+from chat.message_writer import MessageWriter
+
+
+class Command(BaseCommand):
+    help = "Chat send throughput: one INSERT per message vs the batched message writer (seeded test database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--senders', type=int, default=50,
+                            help="Concurrent websockets sending at once")
+        parser.add_argument('--messages', type=int, default=40,
+                            help="Messages per sender")
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--flush-interval', type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        # Seed into a throwaway test database, never the configured one
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            asyncio.run(self._run(options))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    async def _run(self, options):
+        room, users = await database_sync_to_async(self._seed)(options['senders'])
+        total = options['senders'] * options['messages']
+
+        async def direct(user):
+            # Previous handle_send_message: sender lookup and INSERT per message
+            def save(content):
+                sender = User.objects.only('id', 'username').get(id=user.id)
+                return Message.objects.create(room_id=room.id, sender=sender, content=content)
+
+            layer = InMemoryChannelLayer()
+            for number in range(options['messages']):
+                message = await database_sync_to_async(save)(f"direct {number}")
+                await layer.group_send(f"chat_{room.name}", {
+                    'type': 'chat_message',
+                    'message': {'id': str(message.id), 'content': message.content},
+                })
+
+        writer = MessageWriter(batch_size=options['batch_size'], flush_interval=options['flush_interval'])
+
+        async def batched(user):
+            consumer = ChatConsumer()
+            consumer.channel_layer = InMemoryChannelLayer()
+            consumer.room_id, consumer.room_group_name = room.id, f"chat_{room.name}"
+            consumer.sender_id, consumer.sender_name = user.id, user.username
+
+            async def send(text_data=None, bytes_data=None):
+                pass
+            consumer.send = send
+            for number in range(options['messages']):
+                await consumer.handle_send_message({'content': f"batched {number}"})
+
+        get_writer = chat.consumers.get_message_writer
+        chat.consumers.get_message_writer = lambda: writer
+        try:
+            runs = (('insert per message', direct, 'direct'), ('message writer', batched, 'batched'))
+            for label, sender, prefix in runs:
+                start = time.perf_counter()
+                await asyncio.gather(*(sender(user) for user in users))
+                broadcast = time.perf_counter() - start
+                if sender is batched:
+                    await writer.close()
+                elapsed = time.perf_counter() - start
+
+                saved = await database_sync_to_async(
+                    Message.objects.filter(room=room, content__startswith=prefix).count)()
+                self.stdout.write(
+                    f"{label:>20}: {total / broadcast:>8.0f} msgs/s broadcast, "
+                    f"{total / elapsed:>8.0f} msgs/s stored ({saved}/{total} rows, {elapsed:.2f}s)"
+                )
+        finally:
+            chat.consumers.get_message_writer = get_writer
+
+    @staticmethod
+    def _seed(senders):
+        room = Room.objects.create(name='bench')
+        users = User.objects.bulk_create([
+            User(username=f"bench-{i}", email=f"bench-{i}@example.com") for i in range(senders)
+        ])
+        return room, users
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from firebase.local_db import LocalDatabase
+from notifications.dispatcher import NotificationDispatcher
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-member push() against batched NotificationDispatcher flushes (offline)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, nargs='+', default=[1, 10, 40, 200])
+        parser.add_argument('--latency-ms', type=float, default=50,
+                            help="Simulated Firebase round-trip per call")
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        database = LocalDatabase(latency=options['latency_ms'] / 1000)
+        notification = {
+            "title": "Project",
+            "content": "user@example.com has joined Project",
+            "is_read": False,
+        }
+
+        self.stdout.write(f"{'members':>8} {'serial ms':>10} {'calls':>6} {'batched ms':>11} {'calls':>6}")
+        for members in options['members']:
+            database.reset()
+            start = time.perf_counter()
+            for i in range(members):
+                database.reference(f"notifications/user-{i}").push(notification)
+            serial_ms = (time.perf_counter() - start) * 1000
+            serial_calls = database.calls
+
+            database.reset()
+            dispatcher = NotificationDispatcher(database=database, chunk_size=options['chunk_size'])
+            for i in range(members):
+                dispatcher.push(f"notifications/user-{i}", notification)
+            report = dispatcher.flush()
+
+            self.stdout.write(
+                f"{members:>8} {serial_ms:>10.1f} {serial_calls:>6} "
+                f"{report.latency_ms:>11.1f} {database.calls:>6}"
+            )
@@ -0,0 +1,70 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from app.models import Notification, User
+from notifications.store import NotificationStore, get_unread_count, read_notifications
+from firebase.push_id import parse_push_id
+from utils.pagination import decode_cursor
+
+
+class Command(BaseCommand):
+    help = "Latency of the notification endpoints' SQL reads and mark-as-read on a seeded test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--per-user', type=int, default=200,
+                            help="Notifications per user")
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Seed into a throwaway test database, never the configured one
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self._run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def _run(self, options):
+        users = User.objects.bulk_create([
+            User(username=f"bench-{i}", email=f"bench-{i}@example.com") for i in range(options['users'])
+        ])
+        start = timezone.now()
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=user, title=f"Notification {n}", is_read=n % 3 == 0,
+                created_at=start - timedelta(seconds=n),
+            )
+            for user in users for n in range(options['per_user'])
+        ], batch_size=1000)
+        self.stdout.write(f"seeded {len(users) * options['per_user']} notifications for {len(users)} users")
+
+        user = users[len(users) // 2]
+        limit = options['limit']
+        _, next_before = read_notifications(user.id, limit)
+        cursor = decode_cursor(next_before, parse_id=parse_push_id)
+
+        def mark_read():
+            rows, _ = read_notifications(user.id, 1, unread_only=True)
+            NotificationStore(mirror=False).mark_read(user.id, [row.id for row in rows])
+
+        self.stdout.write(f"{'operation':<22} {'avg ms':>8} {'p95 ms':>8}")
+        for label, run in (
+            ('first window', lambda: read_notifications(user.id, limit)),
+            ('unread window', lambda: read_notifications(user.id, limit, unread_only=True)),
+            ('next window', lambda: read_notifications(user.id, limit, cursor=cursor)),
+            ('unread count', lambda: get_unread_count(user.id)),
+            ('mark one read', mark_read),
+        ):
+            timings = []
+            for _ in range(options['repeat']):
+                begin = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - begin) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(f"{label:<22} {sum(timings) / len(timings):>8.2f} {p95:>8.2f}")
@@ -0,0 +1,76 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.request import Request
+
+from app.models import Project, User
+from utils.pagination import KeysetPagination, Pagination
+
+
+class Command(BaseCommand):
+    help = "Compare deep-page latency of page-number and keyset pagination on a seeded test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=30000)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--page-size', type=int, default=25)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Seed into a throwaway test database, never the configured one
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self._run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def _run(self, options):
+        page, page_size = options['page'], options['page_size']
+        rows = max(options['rows'], page * page_size)
+
+        owner = User.objects.create(username='bench-owner', email='bench@example.com')
+        Project.objects.bulk_create(
+            [Project(id=uuid.uuid4(), name=f"Project {i}", owner=owner) for i in range(rows)],
+            batch_size=1000,
+        )
+        self.stdout.write(f"seeded {rows} projects, fetching page {page} (size {page_size})")
+
+        factory = RequestFactory()
+        queryset = Project.objects.all()
+
+        def offset_page():
+            request = Request(factory.get('/bench', {'page': page, 'page_size': page_size}))
+            return Pagination().paginate_queryset(queryset.order_by('-created_at', '-id'), request)
+
+        # The cursor a client would hold after walking to page - 1
+        keyset = KeysetPagination()
+        anchor = queryset.order_by('-created_at', '-id')[(page - 1) * page_size - 1]
+        cursor = keyset.encode_cursor(anchor)
+
+        def keyset_page(include_total):
+            request = Request(factory.get('/bench', {
+                'cursor': cursor,
+                'page_size': page_size,
+                'include_total': 'true' if include_total else 'false',
+            }))
+            return KeysetPagination().paginate_queryset(queryset, request)
+
+        if [p.id for p in offset_page()] != [p.id for p in keyset_page(False)]:
+            self.stderr.write("keyset page does not match offset page")
+            return
+
+        self.stdout.write(f"{'mode':<22} {'avg ms':>8} {'best ms':>8}")
+        for label, run in (
+            ('page number', offset_page),
+            ('cursor', lambda: keyset_page(True)),
+            ('cursor, no count', lambda: keyset_page(False)),
+        ):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(f"{label:<22} {sum(timings) / len(timings):>8.2f} {min(timings):>8.2f}")
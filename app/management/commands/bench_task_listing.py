@@ -0,0 +1,87 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+
+from app.models import Project, Task, User
+from tasks.views import get_tasks_by_project_id
+from utils.jwt import generate_access_token
+from utils.redis import remove_cache, set_cache
+from utils.token_verifier import token_verifier
+
+
+class Command(BaseCommand):
+    help = "Latency of the paginated task listing for growing project sizes (seeded test database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+        parser.add_argument('--assignees', type=int, default=3,
+                            help="Assignees per task")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Seed into a throwaway test database, never the configured one
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self._run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, options):
+        users = User.objects.bulk_create([
+            User(username=f"bench-{i}", email=f"bench-{i}@example.com")
+            for i in range(max(options['assignees'], 1))
+        ])
+        owner = users[0]
+        token = generate_access_token(owner.id, False)
+        set_cache(f"access_token:{token}", token, 600)
+        factory = RequestFactory()
+        Assignee = Task.assignees.through
+
+        self.stdout.write(f"{'tasks':>8} {'avg ms':>8} {'best ms':>8} {'queries':>8}")
+        try:
+            for size in options['sizes']:
+                project = Project.objects.create(name=f"Project {size}", owner=owner)
+                tasks = Task.objects.bulk_create(
+                    [Task(id=uuid.uuid4(), title=f"Task {i}", project=project) for i in range(size)],
+                    batch_size=1000,
+                )
+                Assignee.objects.bulk_create(
+                    [Assignee(task_id=task.id, user_id=user.id)
+                     for task in tasks for user in users[:options['assignees']]],
+                    batch_size=1000,
+                )
+
+                def run():
+                    token_verifier.clear()
+                    request = factory.get(
+                        '/api/tasks/', {'project_id': str(project.id)},
+                        HTTP_AUTHORIZATION=f"Bearer {token}")
+                    return get_tasks_by_project_id(request)
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = run()
+                response.render()
+                if response.status_code != 200:
+                    self.stderr.write(f"unexpected status {response.status_code}")
+                    return
+
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    run().render()
+                    timings.append((time.perf_counter() - start) * 1000)
+                self.stdout.write(
+                    f"{size:>8} {sum(timings) / len(timings):>8.2f} "
+                    f"{min(timings):>8.2f} {len(queries):>8}"
+                )
+        finally:
+            remove_cache(f"access_token:{token}")
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from app.models import Notification, User
+from notifications.dispatcher import INVITED_NOTIFICATIONS_PATH, NOTIFICATIONS_PATH
+from notifications.store import TIME_FORMAT, to_row
+
+
+def parse_time(value):
+    try:
+        return datetime.strptime(value, TIME_FORMAT).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Copy notifications/ and invitedNotifications/ from Firebase into the notification table (safe to re-run)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Rows per INSERT")
+
+    def handle(self, *args, **options):
+        from firebase.firebase_config import db
+
+        user_ids = {str(user_id) for user_id in User.all_objects.values_list('id', flat=True)}
+        sources = ((NOTIFICATIONS_PATH, 'notification'), (INVITED_NOTIFICATIONS_PATH, 'invitation'))
+
+        total = 0
+        for user_id in user_ids:
+            rows = []
+            for path, kind in sources:
+                for key, value in (db.reference(f"{path}/{user_id}").get() or {}).items():
+                    if not isinstance(value, dict):
+                        continue
+                    row = to_row(user_id, kind, value)
+                    row.id = key
+                    if str(row.sender_id) not in user_ids:
+                        row.sender_id = None
+                    row.created_at = parse_time(value.get('created_at')) or row.created_at
+                    rows.append(row)
+            # Keys already imported are skipped, so an interrupted run can be resumed
+            Notification.objects.bulk_create(rows, batch_size=options['batch_size'], ignore_conflicts=True)
+            total += len(rows)
+
+        self.stdout.write(f"imported {total} notifications for {len(user_ids)} users")
@@ -0,0 +1,118 @@
+import asyncio
+import multiprocessing
+import queue
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+GROUP_PREFIX = 'chat_loadtest'
+
+
+def _receiver(index, options, ready, results):
+    """
+    One "daphne process": opens `sockets` channels, joins them to the room
+    groups and counts what arrives until every socket has all messages or
+    the timeout expires.
+    """
+    import django
+    django.setup()
+    from channels.layers import get_channel_layer
+
+    async def run():
+        layer = get_channel_layer()
+        rooms = {}
+        for socket in range(options['sockets']):
+            channel = await layer.new_channel()
+            rooms[channel] = f"{GROUP_PREFIX}_{(index * options['sockets'] + socket) % options['rooms']}"
+            await layer.group_add(rooms[channel], channel)
+        ready.put(index)
+
+        received = Counter()
+
+        async def drain(channel):
+            while received[channel] < options['messages']:
+                await layer.receive(channel)
+                received[channel] += 1
+
+        tasks = [asyncio.ensure_future(drain(channel)) for channel in rooms]
+        _, pending = await asyncio.wait(tasks, timeout=options['timeout'])
+        for task in pending:
+            task.cancel()
+        for channel, group in rooms.items():
+            await layer.group_discard(group, channel)
+        results.put((index, sum(received.values()), len(pending), time.time()))
+
+    asyncio.run(run())
+
+
+class Command(BaseCommand):
+    help = "Multi-process chat fan-out through the configured channel layer (run with CHANNEL_LAYER=redis)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4,
+                            help="Receiving processes, like daphne workers")
+        parser.add_argument('--sockets', type=int, default=50,
+                            help="Websockets per process")
+        parser.add_argument('--rooms', type=int, default=10)
+        parser.add_argument('--messages', type=int, default=100,
+                            help="Messages sent to every room")
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        self.stdout.write(f"layer: {layer}")
+        ring = getattr(layer, 'ring', None)
+        if ring is not None:
+            shards = Counter(layer.consistent_hash(f"{GROUP_PREFIX}_{room}") for room in range(options['rooms']))
+            self.stdout.write(f"rooms per shard: {dict(sorted(shards.items()))}")
+
+        context = multiprocessing.get_context('spawn')
+        ready, results = context.Queue(), context.Queue()
+        workers = [
+            context.Process(target=_receiver, args=(index, options, ready, results), daemon=True)
+            for index in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        for _ in workers:
+            ready.get(timeout=options['timeout'])
+
+        async def send():
+            for number in range(options['messages']):
+                for room in range(options['rooms']):
+                    await layer.group_send(f"{GROUP_PREFIX}_{room}", {
+                        'type': 'chat_message',
+                        'message': f"load test {number}",
+                    })
+
+        start = time.time()
+        asyncio.run(send())
+        send_seconds = time.time() - start
+
+        expected = options['processes'] * options['sockets'] * options['messages']
+        delivered, timed_out, finished = 0, 0, start
+        for _ in workers:
+            try:
+                _, received, pending, finished_at = results.get(timeout=options['timeout'] + 10)
+            except queue.Empty:
+                break
+            delivered += received
+            timed_out += pending
+            finished = max(finished, finished_at)
+        for worker in workers:
+            worker.join(timeout=5)
+
+        elapsed = max(finished - start, 1e-9)
+        self.stdout.write(
+            f"sent {options['messages'] * options['rooms']} group messages in {send_seconds:.2f}s, "
+            f"delivered {delivered}/{expected} across {options['processes']} processes "
+            f"({delivered / elapsed:.0f} deliveries/s)"
+        )
+        if delivered < expected:
+            self.stderr.write(
+                f"{timed_out} sockets missed messages; a per-process layer (InMemoryChannelLayer) "
+                f"cannot deliver across processes, otherwise raise CHANNEL_LAYER_CAPACITY"
+            )
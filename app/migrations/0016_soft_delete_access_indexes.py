@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:53
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_token_hash(apps, schema_editor):
+    RefreshToken = apps.get_model('app', 'RefreshToken')
+    tokens = list(RefreshToken.objects.only('id', 'token'))
+    for refresh_token in tokens:
+        refresh_token.token_hash = hashlib.sha256(refresh_token.token.encode()).hexdigest()
+    RefreshToken.objects.bulk_update(tokens, ['token_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='token_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(fill_token_hash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'created_at', 'id'], name='message_room_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='refreshtoken',
+            index=models.Index(fields=['token_hash'], name='refreshtoken_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'is_deleted', 'deleted_at'], name='task_project_alive_idx'),
+        ),
+    ]
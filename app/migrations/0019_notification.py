@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:12
+
+import app.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_message_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.CharField(default=app.models._new_notification_id, editable=False, max_length=20, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('notification', 'Notification'), ('invitation', 'Invitation')], default='notification', max_length=20)),
+                ('title', models.CharField(blank=True, default='', max_length=255)),
+                ('content', models.TextField(blank=True, default='')),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+                ('sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications_sent', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notification',
+                'indexes': [models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'), models.Index(fields=['recipient', 'kind', 'created_at'], name='notification_recipient_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0019_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='mirrored',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0020_notification_mirrored'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='firebaseoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
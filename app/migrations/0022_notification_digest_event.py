@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0021_outbox_sending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDigestEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event', models.CharField(max_length=50)),
+                ('subject_id', models.CharField(max_length=64)),
+                ('subject', models.CharField(max_length=255)),
+                ('actor', models.CharField(max_length=255)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notification_digest_event',
+                'indexes': [models.Index(fields=['recipient', 'event', 'subject_id', 'created_at'], name='digest_event_key_idx')],
+            },
+        ),
+    ]
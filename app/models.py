@@ -1,13 +1,58 @@
-import datetime
+import hashlib
 import uuid
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from django.contrib.auth.models import AbstractUser, UserManager
 
 
 # Create your models here.
-class SoftDeletedManager(models.Manager):
+def _has_updated_at(model):
+    return any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        Soft delete every row in one UPDATE. Returns the number of rows.
+        """
+        return self._set_deleted(True)
+
+    def restore(self):
+        return self._set_deleted(False)
+
+    def _set_deleted(self, deleted):
+        now = timezone.now()
+        values = {'is_deleted': deleted, 'deleted_at': now if deleted else None}
+        # update() skips auto_now, stamp it by hand
+        if _has_updated_at(self.model):
+            values['updated_at'] = now
+        return self.update(**values)
+
+
+class SoftDeletedManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """
+    Default manager: hides soft-deleted rows. Use `all_objects` or
+    `deleted_objects` for admin and restore flows.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class DeletedManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
     def get_queryset(self):
-        return super().get_queryset()
+        return super().get_queryset().filter(is_deleted=True)
+
+
+class SoftDeletedUserManager(UserManager.from_queryset(SoftDeleteQuerySet)):
+    """
+    UserManager (create_user, natural key lookups) that hides deleted users,
+    so soft-deleted accounts cannot log in.
+    """
+    use_in_migrations = False
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
 
 
 class SoftDeleteMixin(models.Model):
@@ -15,7 +60,8 @@ class SoftDeleteMixin(models.Model):
     deleted_at = models.DateTimeField(blank=True, null=True)
 
     objects = SoftDeletedManager()
-    all_objects = models.Manager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+    deleted_objects = DeletedManager()
 
     class Meta:
         abstract = True
@@ -23,15 +69,21 @@ class SoftDeleteMixin(models.Model):
     def delete(self, using=None, keep_parents=False, soft=True):
         if soft:
             self.is_deleted = True
-            self.deleted_at = datetime.datetime.now()
-            self.save()
+            self.deleted_at = timezone.now()
+            self.save(using=using, update_fields=self._soft_delete_fields())
         else:
             super().delete(using=using, keep_parents=keep_parents)
 
     def restore(self):
         self.is_deleted = False
         self.deleted_at = None
-        self.save()
+        self.save(update_fields=self._soft_delete_fields())
+
+    def _soft_delete_fields(self):
+        fields = ['is_deleted', 'deleted_at']
+        if _has_updated_at(type(self)):
+            fields.append('updated_at')
+        return fields
 
 
 class User(AbstractUser, SoftDeleteMixin):
@@ -46,8 +98,14 @@ class User(AbstractUser, SoftDeleteMixin):
     avatar = models.URLField(max_length=255, blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SoftDeletedUserManager()
+
     class Meta:
         db_table = 'user'
+        default_manager_name = 'objects'
+        indexes = [
+            models.Index(fields=['date_joined', 'id'], name='user_date_joined_id_idx'),
+        ]
 
 class Project(SoftDeleteMixin):
     STATUS_CHOICES = [
@@ -75,6 +133,9 @@ class Project(SoftDeleteMixin):
 
     class Meta:
         db_table = 'project'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='project_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -115,6 +176,11 @@ class Task(SoftDeleteMixin):
 
     class Meta:
         db_table = 'task'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='task_created_id_idx'),
+            # project.tasks.filter(is_deleted=False, deleted_at__isnull=True)
+            models.Index(fields=['project', 'is_deleted', 'deleted_at'], name='task_project_alive_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -144,11 +210,17 @@ class Message(SoftDeleteMixin):
         Room, on_delete=models.SET_NULL, blank=True, null=True, related_name="messages")
     content = models.TextField()
     is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: the chat writer saves messages in batches after
+    # broadcasting them and keeps the time they were sent
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'message'
+        indexes = [
+            # Room history: filter(room=...).order_by('-created_at')
+            models.Index(fields=['room', 'created_at', 'id'], name='message_room_created_idx'),
+        ]
 
     def __str__(self):
         sender_name = self.sender.username if self.sender else "Unknown"
@@ -164,6 +236,8 @@ class RefreshToken(SoftDeleteMixin):
         related_name="refresh_tokens"  
     )
     token = models.TextField()
+    # sha256 of `token`; TEXT columns cannot be indexed in full, look up by this
+    token_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
     agent = models.CharField(max_length=255, blank=True, null=True)
     location = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -172,10 +246,24 @@ class RefreshToken(SoftDeleteMixin):
 
     class Meta:
         db_table = 'refreshtoken'
+        indexes = [
+            models.Index(fields=['token_hash'], name='refreshtoken_hash_idx'),
+        ]
 
     def __str__(self):
         return f"RefreshToken for {self.user.username}"
 
+    @staticmethod
+    def hash_token(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        self.token_hash = self.hash_token(self.token)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'token' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'token_hash'}
+        super().save(*args, **kwargs)
+
 class ProjectDocument(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     project_id = models.ForeignKey(Project, on_delete=models.CASCADE)
@@ -186,4 +274,111 @@ class ProjectDocument(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    
\ No newline at end of file
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='document_created_id_idx'),
+        ]
+
+
+def _new_notification_id():
+    from firebase.push_id import generate_push_id
+    return generate_push_id()
+
+
+class Notification(models.Model):
+    """
+    Notifications and invitations, stored here and mirrored to Firebase
+    (notifications/<uid>, invitedNotifications/<uid>) under the same key
+    for recipients without a notification socket open.
+    """
+    KIND_CHOICES = [
+        ('notification', 'Notification'),
+        ('invitation', 'Invitation'),
+    ]
+    # Firebase push key: sorts by creation time
+    id = models.CharField(max_length=20, primary_key=True, default=_new_notification_id, editable=False)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    sender = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, related_name="notifications_sent")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='notification')
+    title = models.CharField(max_length=255, blank=True, default='')
+    content = models.TextField(blank=True, default='')
+    # Remaining payload keys, e.g. project/task/status/type of an invitation
+    data = models.JSONField(default=dict, blank=True)
+    is_read = models.BooleanField(default=False)
+    # Written to Firebase too (the recipient had no notification socket open)
+    mirrored = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'notification'
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'),
+            models.Index(fields=['recipient', 'kind', 'created_at'], name='notification_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"Notification {self.id} for {self.recipient_id}"
+
+
+class NotificationDigestEvent(models.Model):
+    """
+    Notification events waiting for their digest window to close, recorded in
+    the same transaction as the change that caused them and merged by the
+    `flush_notification_digests` Celery task (see notifications.digest).
+    """
+    id = models.BigAutoField(primary_key=True)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    # A notifications.digest.DIGEST_TEMPLATES key
+    event = models.CharField(max_length=50)
+    # Project or task the event is about, and its name
+    subject_id = models.CharField(max_length=64)
+    subject = models.CharField(max_length=255)
+    # Who caused it, e.g. the email of the user who joined
+    actor = models.CharField(max_length=255)
+    # Notification sent when the event is alone in its window
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'notification_digest_event'
+        indexes = [
+            models.Index(fields=['recipient', 'event', 'subject_id', 'created_at'], name='digest_event_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"Digest event {self.event} for {self.recipient_id}"
+
+
+class FirebaseOutbox(models.Model):
+    """
+    Firebase writes recorded in the same transaction as the domain change and
+    delivered later by the `drain_firebase_outbox` Celery task.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    # Multi-path update: {"notifications/<uid>/<key>": {...}, ...}
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'firebase_outbox'
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"FirebaseOutbox {self.idempotency_key} ({self.status})"
@@ -0,0 +1,162 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import FirebaseOutbox
+from notifications.dispatcher import merge_write, send_writes, unread_counter_path
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_payloads(rows, chunk_size):
+    """
+    Group outbox rows so that each group is sent as a single update() with at
+    most `chunk_size` paths. Later rows win when they touch the same path,
+    except that increments of the same path add up.
+    """
+    groups, current, current_paths = [], [], {}
+    for row in rows:
+        if current and len(current_paths) + len(row.payload) > chunk_size:
+            groups.append((current, current_paths))
+            current, current_paths = [], {}
+        current.append(row)
+        for path, value in row.payload.items():
+            merge_write(current_paths, path, value)
+    if current:
+        groups.append((current, current_paths))
+    return groups
+
+
+def _counter_recipient(path):
+    # The user id of an unread counter path, None for other paths
+    parts = path.split('/')
+    if len(parts) == 3 and path == unread_counter_path(parts[1]):
+        return parts[1]
+    return None
+
+
+def _resolve_counters(rows):
+    """
+    Replace the unread counter increments of `rows` with the count in the
+    Notification table now. Rows sent again after their drain died (Firebase
+    applied them, the outcome was never saved) then write the same value
+    instead of adding their increments a second time.
+    """
+    from notifications.store import mirrored_unread_counts
+
+    recipients = {_counter_recipient(path) for row in rows for path in row.payload} - {None}
+    if not recipients:
+        return
+    counts = mirrored_unread_counts(recipients)
+    for row in rows:
+        payload = {}
+        for path, value in row.payload.items():
+            recipient = _counter_recipient(path)
+            payload[path] = counts[recipient] if recipient else value
+        row.payload = payload
+
+
+def _mark_failed(row, error, now):
+    row.attempts += 1
+    row.last_error = str(error)
+    if row.attempts >= settings.FIREBASE_OUTBOX_MAX_ATTEMPTS:
+        row.status = 'failed'
+        logger.error(f"Firebase outbox {row.idempotency_key} gave up after {row.attempts} attempts: {error}")
+    else:
+        backoff = min(2 ** row.attempts, settings.FIREBASE_OUTBOX_MAX_BACKOFF)
+        row.status = 'pending'
+        row.available_at = now + timedelta(seconds=backoff)
+
+
+def claim_outbox_batch(batch_size, now):
+    """
+    Take up to `batch_size` due rows and mark them 'sending' for
+    FIREBASE_OUTBOX_LEASE seconds, in a short transaction of its own. Rows
+    of a drain that died mid-send are claimed again once the lease is over.
+    """
+    with transaction.atomic():
+        rows = list(
+            FirebaseOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status__in=('pending', 'sending'), available_at__lte=now)
+            .order_by('created_at')[:batch_size]
+        )
+        if rows:
+            FirebaseOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+                status='sending', available_at=now + timedelta(seconds=settings.FIREBASE_OUTBOX_LEASE))
+    return rows
+
+
+def drain_outbox_batch(database, batch_size, chunk_size):
+    """
+    Deliver one batch of pending outbox rows. Returns the number of rows handled.
+
+    No row lock is held while Firebase is called: the rows are claimed
+    first and their outcome saved afterwards.
+    """
+    now = timezone.now()
+    rows = claim_outbox_batch(batch_size, now)
+    if not rows:
+        return 0
+    _resolve_counters(rows)
+
+    for group, writes in _merge_payloads(rows, chunk_size):
+        try:
+            send_writes(database, writes, chunk_size)
+            for row in group:
+                row.status = 'sent'
+                row.sent_at = now
+        except Exception:
+            # Retry row by row so one bad payload cannot block the others
+            for row in group:
+                try:
+                    send_writes(database, row.payload, chunk_size)
+                    row.status = 'sent'
+                    row.sent_at = now
+                except Exception as e:
+                    _mark_failed(row, e, now)
+
+    FirebaseOutbox.objects.bulk_update(
+        rows, ['status', 'sent_at', 'attempts', 'last_error', 'available_at'])
+    return len(rows)
+
+
+@shared_task(ignore_result=True)
+def drain_firebase_outbox():
+    """
+    Drain pending Firebase writes in batches until the outbox is empty.
+    """
+    from firebase.firebase_config import db
+
+    batch_size = settings.FIREBASE_OUTBOX_BATCH_SIZE
+    total = 0
+    while True:
+        handled = drain_outbox_batch(db, batch_size, settings.FIREBASE_FANOUT_CHUNK_SIZE)
+        total += handled
+        if handled < batch_size:
+            break
+    return total
+
+
+@shared_task(ignore_result=True)
+def flush_notification_digests():
+    """
+    Deliver the notification digests whose window closed.
+    """
+    from notifications.digest import engine
+
+    return engine.flush_due()
+
+
+@shared_task(ignore_result=True)
+def flush_presence():
+    """
+    Copy online presence from Redis to User.online_status.
+    """
+    from user.presence import flush_to_db
+
+    return flush_to_db()
@@ -1,3 +1,692 @@
-from django.test import TestCase
+import base64
+import json
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from app.models import FirebaseOutbox, Message, Notification, Project, RefreshToken, Room, Task, User
+from app.tasks import _merge_payloads, claim_outbox_batch, drain_outbox_batch
+from core.channel_layers import ShardedRedisChannelLayer
+from core.metrics import end_request, registry, start_request
+from core.profiling_middleware import QueryBudgetExceeded
+from core.websocket_auth import JWTAuthMiddleware
+from firebase.local_db import LocalDatabase
+from firebase.push_id import parse_push_id
+from notifications.dispatcher import (
+    NOTIFICATIONS_PATH, UNREAD_NOTIFICATIONS_PATH, NotificationDispatcher, send_writes, unread_counter_path,
+)
+from notifications import realtime, store
+from notifications.digest import DigestEngine, DigestEvent
+from notifications.routing import websocket_urlpatterns as notification_websocket_urlpatterns
+from utils.jwt import generate_access_token, generate_refresh_token
+from utils.pagination import InvalidCursor, decode_cursor
+from utils.redis import remove_cache, set_cache
+from utils.testing import AuthTestMixin
+from utils.token_verifier import TokenRevoked, TokenVerifier, token_verifier
+
+
+class ProfilingMiddlewareTests(AuthTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='profiled-user', email='profiled@example.com', password='secret123')
+        Project.objects.create(name='Profiled project', owner=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+
+    def test_server_timing_header_and_registry(self):
+        response = self.get('/api/project/list')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+        view = registry.snapshot()['views']['projects.views.get_list_project']
+        self.assertEqual(view['count'], 1)
+        self.assertLessEqual(view['db_queries']['p99'], 4)
+
+    @override_settings(
+        VIEW_QUERY_BUDGETS={'projects.views.get_list_project': 1},
+        ENFORCE_QUERY_BUDGETS=True,
+    )
+    def test_exceeding_query_budget_fails(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.get('/api/project/list')
+
+    def test_firebase_writes_are_timed_per_update(self):
+        metrics, token = start_request()
+        try:
+            send_writes(LocalDatabase(), {'a/1': 1, 'a/2': 2, 'a/3': 3}, chunk_size=2)
+            self.assertEqual(metrics.firebase_calls, 2)
+        finally:
+            end_request(token)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.get('/api/project/list')
+
+        response = self.get('/api/app/metrics')
+        self.assertEqual(response.status_code, 403)
+
+        response = self.get('/api/app/metrics', token=self.authenticate(self.user, role=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('projects.views.get_list_project', response.json()['data']['views'])
+
+
+class IndexUsageTests(TestCase):
+    """
+    The hot lookups must be served by an index. EXPLAIN names the index on
+    both SQLite and MySQL, so assert on the name.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='indexed-user', email='indexed@example.com')
+        cls.project = Project.objects.create(name='Indexed project', owner=cls.user)
+        cls.room = Room.objects.create(name='indexed-room', owner=cls.user)
+        for i in range(20):
+            Task.objects.create(title=f"Task {i}", project=cls.project, is_deleted=i % 4 == 0)
+            Message.objects.create(room=cls.room, sender=cls.user, content=f"Message {i}")
+        RefreshToken.objects.create(
+            user=cls.user, token='refresh-token', expires_at=timezone.now())
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_project_tasks_use_alive_index(self):
+        # tasks.views.get_tasks_by_project_id
+        tasks = self.project.tasks.filter(deleted_at__isnull=True, is_deleted=False)
+        self.assertUsesIndex(tasks, 'task_project_alive_idx')
+
+    def test_room_history_uses_room_created_index(self):
+        # chat.consumers.ChatConsumer.get_messages
+        messages = (
+            Message.objects.filter(room_id=self.room.id)
+            .select_related('sender')
+            .only('id', 'content', 'created_at', 'sender__username')
+            .order_by('-created_at', '-id')[:21]
+        )
+        self.assertUsesIndex(messages, 'message_room_created_idx')
+
+    def test_refresh_token_lookup_uses_hash_index(self):
+        # auths.views.refresh_token
+        tokens = RefreshToken.objects.filter(
+            token_hash=RefreshToken.hash_token('refresh-token'), is_deleted=False)
+        self.assertUsesIndex(tokens, 'refreshtoken_hash_idx')
+        self.assertEqual(tokens.get().token, 'refresh-token')
+
+    def test_token_hash_follows_token_changes(self):
+        refresh_token = RefreshToken.objects.get(user=self.user)
+        refresh_token.token = 'rotated-token'
+        refresh_token.save(update_fields=['token'])
+
+        refresh_token.refresh_from_db()
+        self.assertEqual(refresh_token.token_hash, RefreshToken.hash_token('rotated-token'))
+
+
+class SoftDeleteManagerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='soft-owner', email='soft@example.com')
+        cls.project = Project.objects.create(name='Soft project', owner=cls.user)
+        for i in range(6):
+            Task.objects.create(title=f"Task {i}", project=cls.project)
+
+    def test_default_manager_hides_deleted_rows(self):
+        Task.objects.filter(title__in=['Task 0', 'Task 1']).soft_delete()
+
+        self.assertEqual(Task.objects.count(), 4)
+        self.assertEqual(self.project.tasks.count(), 4)
+        self.assertEqual(Task.deleted_objects.count(), 2)
+        self.assertEqual(Task.all_objects.count(), 6)
+
+    def test_bulk_soft_delete_and_restore_are_single_updates(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.project.tasks.all().soft_delete(), 6)
+        self.assertTrue(all(task.deleted_at for task in Task.all_objects.all()))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Task.deleted_objects.restore(), 6)
+        self.assertFalse(Task.all_objects.filter(deleted_at__isnull=False).exists())
+
+    def test_deleted_users_are_hidden_but_keep_user_manager(self):
+        deleted = User.objects.create_user(username='soft-deleted', email='gone@example.com')
+        deleted.delete(soft=True)
+
+        self.assertFalse(User.objects.filter(id=deleted.id).exists())
+        self.assertTrue(User.deleted_objects.filter(id=deleted.id).exists())
+        with self.assertRaises(User.DoesNotExist):
+            User.objects.get_by_natural_key('soft-deleted')
+
+    def test_refresh_token_of_deleted_user_is_rejected(self):
+        deleted = User.objects.create_user(username='soft-refresh', email='refresh@example.com')
+        token = generate_refresh_token(deleted.id)
+        refresh_token = RefreshToken.objects.create(
+            user=deleted, token=token, expires_at=timezone.now() + timedelta(days=30))
+        deleted.delete(soft=True)
+
+        response = self.client.post('/api/auth/refresh_token', {'refresh_token': token}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(RefreshToken.deleted_objects.filter(id=refresh_token.id).exists())
+
+
+def tampered_cursor(**payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+# Cursors that decode but carry the wrong types
+TAMPERED_CURSORS = [
+    'not-a-cursor',
+    tampered_cursor(v=1, id=str(uuid.uuid4())),
+    tampered_cursor(v=None, id=str(uuid.uuid4())),
+    tampered_cursor(v='2024-01-01T00:00:00', id='not-a-uuid'),
+    tampered_cursor(v='2024-01-01T00:00:00', id=5),
+    tampered_cursor(v='yesterday', id=str(uuid.uuid4())),
+]
+
+
+class TamperedCursorTests(AuthTestMixin, TestCase):
+    auth_user = 'admin'
+    auth_role = True
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='cursor-admin', email='cursor-admin@example.com', is_staff=True)
+        cls.project = Project.objects.create(name='Cursor project', owner=cls.admin)
+        Room.objects.create(name='cursor-room')
+
+    def test_decode_cursor_rejects_wrong_types(self):
+        for cursor in TAMPERED_CURSORS:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_every_cursor_endpoint_answers_400(self):
+        keyset = {'pagination': 'cursor'}
+        endpoints = [
+            ('/api/project/all', keyset, 'cursor'),
+            ('/api/project/filter', keyset, 'cursor'),
+            ('/api/project/list', keyset, 'cursor'),
+            ('/api/user/all', keyset, 'cursor'),
+            ('/api/user/list', keyset, 'cursor'),
+            ('/api/project-document/all', keyset, 'cursor'),
+            ('/api/tasks/', {**keyset, 'project_id': str(self.project.id)}, 'cursor'),
+            ('/api/chat/rooms/cursor-room/messages/', {}, 'cursor'),
+            ('/api/notification/all', {}, 'before'),
+        ]
+        for url, params, name in endpoints:
+            for cursor in TAMPERED_CURSORS:
+                with self.subTest(url=url, cursor=cursor):
+                    token_verifier.clear()
+                    response = self.get(url, {**params, name: cursor})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json()['data'], {name: 'invalid cursor'})
+
+
+class ShardedChannelLayerTests(SimpleTestCase):
+    hosts = [f"redis://10.0.0.{i}:6379" for i in range(1, 4)]
+    groups = [f"chat_room-{i}" for i in range(2000)]
+
+    def shard_of(self, layer, group):
+        return layer.hosts[layer.consistent_hash(group)]['address']
+
+    def test_adding_a_host_moves_few_groups(self):
+        before = ShardedRedisChannelLayer(hosts=self.hosts)
+        after = ShardedRedisChannelLayer(hosts=self.hosts + ['redis://10.0.0.9:6379'])
+
+        moved = [group for group in self.groups if self.shard_of(before, group) != self.shard_of(after, group)]
+        # ideal is 1/4; crc32 range partitioning moves about half
+        self.assertLess(len(moved) / len(self.groups), 0.35)
+        self.assertTrue(all(self.shard_of(after, group) == 'redis://10.0.0.9:6379' for group in moved))
+
+    def test_host_order_does_not_matter(self):
+        layer = ShardedRedisChannelLayer(hosts=self.hosts)
+        reordered = ShardedRedisChannelLayer(hosts=list(reversed(self.hosts)))
+        for group in self.groups[:200]:
+            self.assertEqual(self.shard_of(layer, group), self.shard_of(reordered, group))
+
+
+class NotificationDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.database = LocalDatabase()
+
+    def test_increments_for_the_same_user_add_up_in_one_write(self):
+        dispatcher = NotificationDispatcher(database=self.database, mode='direct')
+        for i in range(3):
+            dispatcher.push_notification('user-2', {'title': f"Notification {i}", 'is_read': False})
+        self.assertEqual(dispatcher._writes['notificationCounters/user-2/unread'], {'.sv': {'increment': 3}})
+        dispatcher.flush()
+        self.assertEqual(self.database.reference(unread_counter_path('user-2')).get(), 3)
+
+    def test_outbox_batches_keep_every_increment(self):
+        rows = [FirebaseOutbox(idempotency_key=str(i), payload={
+            'notificationCounters/user-3/unread': {'.sv': {'increment': 1}},
+            f'notifications/user-3/key-{i}': {'is_read': False},
+        }) for i in range(3)]
+        [(group, writes)] = _merge_payloads(rows, chunk_size=100)
+        self.assertEqual(writes['notificationCounters/user-3/unread'], {'.sv': {'increment': 3}})
+
+
+class TokenVerifierTests(SimpleTestCase):
+    def setUp(self):
+        self.verifier = TokenVerifier(max_size=2, max_ttl=3600, use_local_cache=True)
+        self.tokens = []
+
+    def tearDown(self):
+        for token in self.tokens:
+            remove_cache(f"access_token:{token}")
+
+    def new_token(self, user_id):
+        token = generate_access_token(user_id, False)
+        set_cache(f"access_token:{token}", token, 60)
+        self.tokens.append(token)
+        return token
+
+    def test_entries_live_until_the_token_exp(self):
+        token = self.new_token('user-1')
+        payload = self.verifier.verify(token)
+        # Served from the process cache until `exp`, even without the Redis whitelist
+        remove_cache(f"access_token:{token}")
+        with mock.patch('utils.token_verifier.time.time', return_value=payload['exp'] - 1):
+            self.assertEqual(self.verifier.verify(token)['id'], 'user-1')
+        with mock.patch('utils.token_verifier.time.time', return_value=payload['exp']):
+            with self.assertRaises(TokenRevoked):
+                self.verifier.verify(token)
+
+    def test_least_recently_used_token_is_evicted(self):
+        first, second, third = (self.new_token(f"user-{i}") for i in range(3))
+        for token in (first, second, first, third):
+            self.verifier.verify(token)
+        remove_cache(f"access_token:{first}")
+        remove_cache(f"access_token:{second}")
+
+        self.assertEqual(self.verifier.verify(first)['id'], 'user-0')
+        with self.assertRaises(TokenRevoked):
+            self.verifier.verify(second)
+
+    def test_revoked_tokens_are_checked_again(self):
+        token = self.new_token('user-1')
+        self.verifier.verify(token)
+        remove_cache(f"access_token:{token}")
+        self.verifier.revoke(token)
+        with self.assertRaises(TokenRevoked):
+            self.verifier.verify(token)
+
+    def test_a_revoke_during_the_remote_check_is_not_overwritten(self):
+        token = self.new_token('user-1')
+        verify_remote = self.verifier._verify_remote
+
+        def revoked_meanwhile(value):
+            payload = verify_remote(value)
+            remove_cache(f"access_token:{value}")
+            self.verifier.revoke(value)
+            return payload
+
+        with mock.patch.object(self.verifier, '_verify_remote', side_effect=revoked_meanwhile):
+            self.verifier.verify(token)
+        with self.assertRaises(TokenRevoked):
+            self.verifier.verify(token)
+
+
+class FlakyDatabase(LocalDatabase):
+    """
+    Rejects every update() that writes a path containing 'bad'.
+    """
+
+    def reference(self, path='/'):
+        reference = super().reference(path)
+        update = reference.update
+
+        def checked_update(value):
+            if any('bad' in key for key in value):
+                raise ValueError('Rejected payload')
+            return update(value)
+
+        reference.update = checked_update
+        return reference
+
+
+class OutboxDrainTests(TestCase):
+    def setUp(self):
+        self.database = FlakyDatabase()
+
+    def enqueue(self, writes, key):
+        dispatcher = NotificationDispatcher(mode='outbox', idempotency_key=key)
+        for path, value in writes.items():
+            dispatcher._writes[path] = value
+        return dispatcher.enqueue()
+
+    def drain(self):
+        return drain_outbox_batch(self.database, batch_size=50, chunk_size=100)
+
+    def test_rows_are_merged_into_one_update_and_replays_are_ignored(self):
+        self.enqueue({'notifications/u1/a': {'title': 'A'}}, 'request-1')
+        self.enqueue({'notifications/u1/a': {'title': 'A'}}, 'request-1')
+        self.enqueue({'notifications/u1/b': {'title': 'B'}}, 'request-2')
+        self.assertEqual(FirebaseOutbox.objects.count(), 2)
+
+        self.assertEqual(self.drain(), 2)
+        self.assertEqual(self.database.calls, 1)
+        self.assertEqual(set(self.database.reference('notifications/u1').get()), {'a', 'b'})
+        self.assertEqual(set(FirebaseOutbox.objects.values_list('status', flat=True)), {'sent'})
+        self.assertEqual(self.drain(), 0)
+
+    def test_a_bad_row_is_retried_with_backoff_then_failed(self):
+        self.enqueue({'notifications/u1/good': {'title': 'Good'}}, 'good')
+        self.enqueue({'notifications/u1/bad': {'title': 'Bad'}}, 'bad')
+
+        with override_settings(FIREBASE_OUTBOX_MAX_ATTEMPTS=2):
+            self.assertEqual(self.drain(), 2)
+            # Row by row after the merged update failed: the good row still went out
+            self.assertIsNotNone(self.database.reference('notifications/u1/good').get())
+            bad = FirebaseOutbox.objects.get(idempotency_key='bad:0')
+            self.assertEqual((bad.status, bad.attempts), ('pending', 1))
+            self.assertGreater(bad.available_at, timezone.now())
+            self.assertEqual(self.drain(), 0)
+
+            FirebaseOutbox.objects.filter(pk=bad.pk).update(available_at=timezone.now())
+            self.assertEqual(self.drain(), 1)
+            bad.refresh_from_db()
+            self.assertEqual((bad.status, bad.attempts), ('failed', 2))
+            self.assertEqual(bad.last_error, 'Rejected payload')
+
+    def test_counters_are_not_applied_twice_when_rows_are_sent_again(self):
+        user = User.objects.create(username='outbox-user', email='outbox-user@example.com')
+        counter = unread_counter_path(user.id)
+        notifications = store.NotificationStore(dispatcher=NotificationDispatcher(mode='outbox'), mirror=True)
+        ids = [notifications.notify(user.id, {'title': f"Notification {i}", 'is_read': False}) for i in range(3)]
+        notifications.save()
+        notifications.mark_read(user.id, ids[:1])
+        notifications.save()
+
+        self.assertEqual(self.drain(), 2)
+        self.assertEqual(self.database.reference(counter).get(), 2)
+
+        # The drain died after Firebase applied the update: the rows are sent again after the lease
+        FirebaseOutbox.objects.update(status='sending', available_at=timezone.now())
+        self.assertEqual(self.drain(), 2)
+        self.assertEqual(self.database.reference(counter).get(), 2)
+
+    def test_claimed_rows_wait_for_the_lease_of_a_dead_drain(self):
+        self.enqueue({'notifications/u1/a': {'title': 'A'}}, 'request-1')
+        [row] = claim_outbox_batch(10, timezone.now())
+        self.assertEqual(FirebaseOutbox.objects.get(pk=row.pk).status, 'sending')
+        self.assertEqual(self.drain(), 0)
+
+        FirebaseOutbox.objects.filter(pk=row.pk).update(available_at=timezone.now())
+        self.assertEqual(self.drain(), 1)
+        self.assertEqual(FirebaseOutbox.objects.get(pk=row.pk).status, 'sent')
+
+
+class NotificationStoreTests(AuthTestMixin, TestCase):
+    auth_user = 'member'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='store-owner', email='owner@example.com', password='secret123')
+        cls.member = User.objects.create_user(username='store-member', email='member@example.com', password='secret123')
+
+    def setUp(self):
+        super().setUp()
+        self.database = LocalDatabase()
+
+    def new_store(self):
+        return store.NotificationStore(
+            dispatcher=NotificationDispatcher(database=self.database, mode='direct'), mirror=True)
+
+    def mirrored(self, user_id):
+        """
+        Keys of the user's notifications in the Firebase mirror.
+        """
+        return set(self.database.reference(f"{NOTIFICATIONS_PATH}/{user_id}").get() or {})
+
+    def mirrored_unread_count(self, user_id):
+        return self.database.reference(unread_counter_path(user_id)).get() or 0
+
+    def notify_member(self, count):
+        notifications = self.new_store()
+        ids = [
+            notifications.notify(self.member.id, {
+                'title': f"Notification {i}", 'content': '...', 'is_read': False,
+                'sender_id': str(self.owner.id), 'project': 'p-1',
+            })
+            for i in range(count)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                notifications.save()
+        return ids
+
+    def test_fan_out_is_one_insert_mirrored_under_the_same_keys(self):
+        ids = self.notify_member(5)
+        self.assertEqual(Notification.objects.filter(recipient=self.member, is_read=False).count(), 5)
+        self.assertEqual(Notification.objects.get(id=ids[0]).data, {'project': 'p-1'})
+
+        self.assertEqual(self.mirrored(self.member.id), set(ids))
+        self.assertEqual(self.mirrored_unread_count(self.member.id), 5)
+
+    def test_mark_read_updates_unread_rows_once(self):
+        ids = self.notify_member(3)
+        notifications = self.new_store()
+        self.assertEqual(notifications.mark_read(self.member.id, ids[:2]), ids[:2])
+        self.assertEqual(notifications.mark_read(self.member.id, ids[:2]), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.save()
+
+        self.assertEqual(store.get_unread_count(self.member.id), 1)
+        self.assertEqual(self.mirrored_unread_count(self.member.id), 1)
+        self.assertIsNone(
+            self.database.reference(f"{UNREAD_NOTIFICATIONS_PATH}/{self.member.id}/{ids[0]}").get())
+
+    def test_invitations_are_removed_once(self):
+        notifications = self.new_store()
+        invitation_id = notifications.invite(self.member.id, {'project': 'p-1', 'type': 'invite'})
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.save()
+        self.assertIsNotNone(self.database.reference(f"invitedNotifications/{self.member.id}/{invitation_id}").get())
+
+        notifications = self.new_store()
+        self.assertTrue(notifications.remove_invitation(self.member.id, invitation_id))
+        self.assertFalse(notifications.remove_invitation(self.member.id, invitation_id))
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.save()
+        self.assertIsNone(self.database.reference(f"invitedNotifications/{self.member.id}/{invitation_id}").get())
+
+    def test_windows_walk_newest_first(self):
+        ids = self.notify_member(25)
+        seen, before = [], None
+        while True:
+            rows, before = store.read_notifications(
+                self.member.id, 10, cursor=decode_cursor(before, parse_id=parse_push_id) if before else None)
+            seen += [row.id for row in rows]
+            if before is None:
+                break
+        self.assertEqual(seen, ids[::-1])
+
+    def test_endpoint_reads_from_the_table(self):
+        ids = self.notify_member(3)
+        self.new_store().mark_read(self.member.id, ids[:1])
+
+        with override_settings(NOTIFICATION_FIREBASE_MIRROR=False):
+            response = self.get('/api/notification/all', {'limit': 2})
+        body = response.json()
+        self.assertEqual(list(body['data']), ids[::-1][:2])
+        self.assertEqual(body['data'][ids[2]]['sender_id'], str(self.owner.id))
+        self.assertEqual(body['pagination']['unread'], 2)
+        self.assertTrue(body['pagination']['has_more'])
+
+    def test_bulk_mark_read_before_a_time(self):
+        ids = self.notify_member(4)
+        Notification.objects.filter(id__in=ids[:3]).update(created_at=timezone.now() - timedelta(days=1))
+
+        notifications = self.new_store()
+        self.assertEqual(
+            sorted(notifications.mark_read(self.member.id, before=timezone.now() - timedelta(hours=1))),
+            sorted(ids[:3]))
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.save()
+        self.assertEqual(self.mirrored_unread_count(self.member.id), 1)
+
+    def test_bulk_delete_keeps_the_mirror_counter(self):
+        ids = self.notify_member(3)
+        self.new_store().mark_read(self.member.id, ids[:1])
+
+        notifications = self.new_store()
+        self.assertEqual(sorted(notifications.delete(self.member.id, ids[:2])), sorted(ids[:2]))
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications.save()
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)), ids[2:])
+        self.assertEqual(self.mirrored(self.member.id), set(ids[2:]))
+
+    @override_settings(NOTIFICATION_FIREBASE_MIRROR=False)
+    def test_bulk_endpoints_return_the_unread_count(self):
+        ids = self.notify_member(5)
+
+        response = self.post('/api/notification/bulk-update-status', {'ids': ids[:2]})
+        self.assertEqual(response.json()['data'], {'changed': 2, 'unread': 3, 'has_more': False})
+
+        # `before` handles BULK_ACTION_MAX_IDS rows per call, oldest first
+        for age, notification_id in enumerate(ids[::-1]):
+            Notification.objects.filter(id=notification_id).update(
+                created_at=timezone.now() - timedelta(minutes=age + 1))
+        before = timezone.now().isoformat()
+        with override_settings(BULK_ACTION_MAX_IDS=3):
+            response = self.post('/api/notification/bulk-delete', {'before': before})
+            self.assertEqual(response.json()['data'], {'changed': 3, 'unread': 2, 'has_more': True})
+            self.assertEqual(set(Notification.objects.values_list('id', flat=True)), set(ids[3:]))
+
+            response = self.post('/api/notification/bulk-delete', {'before': before})
+            self.assertEqual(response.json()['data'], {'changed': 2, 'unread': 0, 'has_more': False})
+
+        response = self.post('/api/notification/bulk-delete', {})
+        self.assertFalse(response.json()['success'])
+
+    def test_recipients_are_mirrored_when_the_layer_is_not_shared(self):
+        listening = {str(self.member.id)}
+        with mock.patch.object(realtime.presence, 'get_online', return_value=listening):
+            # The in-memory layer cannot reach a socket held by another process
+            self.assertIsNone(realtime.get_listening([self.member.id]))
+            with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'core.channel_layers.ShardedRedisChannelLayer'}}):
+                self.assertEqual(realtime.get_listening([self.member.id]), listening)
+
+    def test_listening_recipients_get_a_push_instead_of_the_mirror(self):
+        notifications = self.new_store()
+
+        def save():
+            notifications.notify(self.member.id, {'title': 'Live', 'is_read': False})
+            notifications.notify(self.owner.id, {'title': 'Offline', 'is_read': False})
+            with mock.patch.object(realtime, 'get_listening', return_value={str(self.member.id)}):
+                with self.captureOnCommitCallbacks(execute=True):
+                    notifications.save()
+
+        async def run(path):
+            communicator = WebsocketCommunicator(
+                JWTAuthMiddleware(URLRouter(notification_websocket_urlpatterns)), path)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            if not await communicator.receive_nothing():
+                return (await communicator.receive_output())['code']
+            await sync_to_async(save)()
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        # Accepted, then closed with 4401 so the client sees the code
+        self.assertEqual(async_to_sync(run)("/ws/notifications/"), 4401)
+        frame = async_to_sync(run)(f"/ws/notifications/?token={self.token}")
+        self.assertEqual((frame['action'], frame['kind']), ('notification', 'notification'))
+        self.assertEqual(frame['notification']['title'], 'Live')
+
+        live = Notification.objects.get(recipient=self.member)
+        self.assertFalse(live.mirrored)
+        self.assertTrue(Notification.objects.get(recipient=self.owner).mirrored)
+        self.assertEqual(self.mirrored_unread_count(self.member.id), 0)
+        self.assertEqual(self.mirrored_unread_count(self.owner.id), 1)
+
+        # Read state of a row that never reached Firebase is not mirrored either
+        notifications = self.new_store()
+        notifications.mark_read(self.member.id, [live.id])
+        self.assertEqual(len(notifications.dispatcher), 0)
+
+
+class DigestEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='digest-owner', email='digest-owner@example.com')
+        cls.joiners = User.objects.bulk_create([
+            User(username=f"joiner-{i}", email=f"joiner-{i}@example.com") for i in range(5)
+        ])
+
+    def setUp(self):
+        registry.reset()
+        self.engine = DigestEngine(window=30)
+
+    def join(self, joiner, recipient):
+        return DigestEvent(recipient.id, 'project_joined', 'p-1', 'Project X', joiner.email, {
+            'title': 'Project X', 'content': f"{joiner.email} has joined Project X",
+            'is_read': False, 'sender_id': str(joiner.id),
+        })
+
+    def after(self, seconds):
+        return timezone.now() + timedelta(seconds=seconds)
+
+    @override_settings(NOTIFICATION_FIREBASE_MIRROR=False)
+    def test_events_of_one_window_become_one_digest_per_recipient(self):
+        self.engine.submit(self.join(joiner, self.owner) for joiner in self.joiners)
+        self.engine.submit([self.join(self.joiners[0], self.joiners[1])])
+
+        self.assertEqual(self.engine.flush_due(now=self.after(29)), 0)
+        self.assertEqual(self.engine.flush_due(now=self.after(30)), 2)
+        self.assertEqual(len(self.engine), 0)
+
+        digest = Notification.objects.get(recipient=self.owner)
+        self.assertEqual(digest.content, "5 people joined Project X")
+        self.assertEqual(digest.data['count'], 5)
+        # A window with a single event keeps its own notification
+        single = Notification.objects.get(recipient=self.joiners[1])
+        self.assertEqual(single.content, f"{self.joiners[0].email} has joined Project X")
+        self.assertEqual(single.sender_id, self.joiners[0].id)
+
+        counters = registry.snapshot()['counters']
+        self.assertEqual(counters['notifications.digest.events_in'], 6)
+        self.assertEqual(counters['notifications.digest.notifications_out'], 2)
+
+    @override_settings(NOTIFICATION_FIREBASE_MIRROR=False)
+    def test_pending_events_are_shared_by_every_worker(self):
+        self.engine.submit([self.join(self.joiners[0], self.owner)])
+        # Another worker (or the engine of a restarted one) sees the same window
+        other = DigestEngine(window=30)
+        other.submit([self.join(self.joiners[1], self.owner)])
+        self.assertEqual(len(other), 2)
+
+        self.assertEqual(other.flush_due(now=self.after(30)), 1)
+        self.assertEqual(self.engine.flush_due(now=self.after(30)), 0)
+        self.assertEqual(Notification.objects.get(recipient=self.owner).data['count'], 2)
+
+    @override_settings(NOTIFICATION_FIREBASE_MIRROR=False)
+    def test_a_new_window_starts_after_delivery_and_zero_window_is_direct(self):
+        self.engine.submit([self.join(self.joiners[0], self.owner)])
+        self.engine.flush_due(now=self.after(30))
+        self.engine.submit([self.join(self.joiners[1], self.owner)])
+        self.assertEqual(len(self.engine), 1)
+        self.assertEqual(self.engine.flush_due(now=self.after(30)), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.owner).count(), 2)
+
+        DigestEngine(window=0).submit([self.join(self.joiners[2], self.owner)])
+        self.assertEqual(Notification.objects.filter(recipient=self.owner).count(), 3)
+
+    @override_settings(NOTIFICATION_FIREBASE_MIRROR=False)
+    def test_flush_delivers_in_batches(self):
+        engine = DigestEngine(window=30, batch_size=2)
+        engine.submit(self.join(self.owner, joiner) for joiner in self.joiners)
+
+        self.assertEqual(engine.flush_due(now=self.after(30)), 5)
+        self.assertEqual(Notification.objects.count(), 5)
@@ -3,7 +3,9 @@ from rest_framework.response import Response
 from django.db.models import Count
 from rest_framework import status
 from app.serializers import ListUserTaskSerializer
-from middlewares import auth_middleware
+from core.metrics import registry
+from middlewares import admin_middleware, auth_middleware
+from user import presence
 from user.serializers import ListUserSerializer
 from utils.response import failure_response, success_response
 
@@ -58,10 +60,11 @@ def get_list_user_project(request):
         project = Project.objects.get(id=project_id)
 
         # Lấy danh sách user trong project
-        users = [project.owner] + list(project.members.filter(is_deleted=False)) if project.owner else list(project.members.filter(is_deleted=False))
+        users = [project.owner] + list(project.members.all()) if project.owner else list(project.members.all())
 
         # owner của project
-        users_data = ListUserSerializer(users, many=True).data
+        online = presence.get_online([user.id for user in users])
+        users_data = ListUserSerializer(users, many=True, context={'online': online}).data
 
 
         return success_response(
@@ -73,3 +76,14 @@ def get_list_user_project(request):
             data=str(e),
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['GET'])
+@auth_middleware
+@admin_middleware
+def get_metrics(request):
+    """
+    Per-view latency, query, cache and Firebase percentiles of this process,
+    plus the named counters, gauges and timings (e.g. chat.outbound.*).
+    """
+    return success_response(data=registry.snapshot())
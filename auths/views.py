@@ -6,10 +6,12 @@ from drf_yasg import openapi
 from rest_framework import status
 from utils.jwt import decode_token, generate_access_token, generate_refresh_token
 from app.models import User, RefreshToken
+from chat import cache as chat_cache
 from user.serializers import UserSerializers
 from auths.serializers import AuthSerializer, LogoutSerializer, UserDataSerializer, RegisterSerializer, UpdateUserSerializer, ChangePasswordSerializer, RefreshTokenSerializer, ForgotPasswordSerializer, ResetPasswordSerializer
 from middlewares import auth_middleware
 from utils.redis import remove_cache, set_cache, get_cache
+from utils.token_verifier import token_verifier
 from utils.response import success_response, failure_response
 import jwt
 from datetime import datetime, timedelta, timezone
@@ -124,7 +126,7 @@ def register(request, *args, **kwargs):
     last_name = serializer.validated_data['last_name']
     user_name = serializer.validated_data['user_name']
 
-    user = User.objects.filter(email=email).first()
+    user = User.all_objects.filter(email=email).first()
     if user:
         return failure_response(message='Email is existed', status_code=status.HTTP_409_CONFLICT)
 
@@ -188,10 +190,14 @@ def profile_view(request, *args, **kwargs):
         if not user:
             return failure_response(message="Not found user", status_code=status.HTTP_404_NOT_FOUND)
 
+        username_changed = user.username != username
         user.first_name = first_name
         user.last_name = last_name
         user.username = username
         user.save()
+        if username_changed:
+            # Chat sockets cache the sender name per process
+            chat_cache.invalidate_sync(user=user.id)
 
         return Response(status=status.HTTP_200_OK, data=UserDataSerializer(user).data)
 
@@ -263,13 +269,17 @@ def refresh_token(request, *args, **kwargs):
     refresh_token = serializer.validated_data['refresh_token']
 
     old_refresh_token = RefreshToken.objects.filter(
-        token=refresh_token).first()
+        token_hash=RefreshToken.hash_token(refresh_token), is_deleted=False).first()
     if not old_refresh_token:
         return failure_response(status_code=status.HTTP_401_UNAUTHORIZED, message="Invalid refresh token")
 
     try:
         decoded = decode_token(refresh_token)
         user = User.objects.filter(id=decoded['id']).first()
+        if not user:
+            # Deleted since the token was issued: it can never be used again
+            old_refresh_token.delete()
+            return failure_response(message="User not found", status_code=status.HTTP_401_UNAUTHORIZED)
         new_access_token = generate_access_token(
             id=decoded['id'], role=user.is_staff)
         set_cache(f"access_token:{new_access_token}", new_access_token, 6000)
@@ -380,8 +390,9 @@ def logout(request):
 
     # Remove token
         remove_cache(f"access_token:{access_token}")
+        token_verifier.revoke(access_token)
         refresh_token = RefreshToken.objects.get(
-            token=valid_data['refresh_token'])
+            token_hash=RefreshToken.hash_token(valid_data['refresh_token']))
         refresh_token.delete()
 
         return success_response(
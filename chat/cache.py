@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_GROUP = 'chat_cache_invalidation'
+# Lets the listener skip the events this process published itself
+PROCESS_ID = uuid.uuid4().hex
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU whose entries also expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# room name -> {'id': room id, 'members': frozenset of member ids (str)}
+room_cache = TTLCache(settings.CHAT_CACHE_SIZE, settings.CHAT_CACHE_TTL)
+# user id (str) -> {'id': user id, 'username': ...}
+profile_cache = TTLCache(settings.CHAT_CACHE_SIZE, settings.CHAT_CACHE_TTL)
+
+
+def load_profile(user_id):
+    user = User.objects.only('id', 'username').get(id=user_id)
+    return {'id': user.id, 'username': user.username}
+
+
+async def get_profile(user_id):
+    """
+    Display profile of a user, from the cache or the database. Raises
+    User.DoesNotExist for unknown (or soft-deleted) users.
+    """
+    profile = profile_cache.get(str(user_id))
+    if profile is None:
+        profile = await database_sync_to_async(load_profile)(user_id)
+        profile_cache.set(str(user_id), profile)
+    return profile
+
+
+def evict(room=None, user=None):
+    if room is not None:
+        room_cache.pop(room)
+    if user is not None:
+        profile_cache.pop(str(user))
+
+
+async def invalidate(room=None, user=None):
+    """
+    Evict a room and/or a user profile here and in every other process
+    listening on the channel layer.
+    """
+    evict(room=room, user=user)
+    try:
+        await get_channel_layer().group_send(INVALIDATION_GROUP, {
+            'type': 'chat.cache.invalidate',
+            'origin': PROCESS_ID,
+            'room': room,
+            'user': None if user is None else str(user),
+        })
+    except Exception as e:
+        # Other processes catch up when their entries expire
+        logger.warning(f"Could not publish chat cache invalidation: {e}")
+
+
+def invalidate_sync(room=None, user=None):
+    async_to_sync(invalidate)(room=room, user=user)
+
+
+_listeners = weakref.WeakKeyDictionary()
+
+
+def ensure_invalidation_listener():
+    """
+    Start the invalidation listener of the running event loop (one per
+    daphne process) if it is not running yet.
+    """
+    loop = asyncio.get_running_loop()
+    task = _listeners.get(loop)
+    if task is None or task.done():
+        _listeners[loop] = asyncio.ensure_future(_listen())
+
+
+async def _listen():
+    layer = get_channel_layer()
+    # Re-join well before the layer's group_expiry drops this channel
+    refresh = max(min(getattr(layer, 'group_expiry', 86400) / 2, 3600), 1)
+    backoff = 1
+    while True:
+        try:
+            channel = await layer.new_channel()
+            await layer.group_add(INVALIDATION_GROUP, channel)
+            backoff = 1
+            while True:
+                try:
+                    message = await asyncio.wait_for(layer.receive(channel), refresh)
+                except asyncio.TimeoutError:
+                    await layer.group_add(INVALIDATION_GROUP, channel)
+                    continue
+                if message.get('origin') != PROCESS_ID:
+                    evict(room=message.get('room'), user=message.get('user'))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Chat cache invalidation listener error: {e}")
+            # Anything changed while disconnected may still be cached
+            room_cache.clear()
+            profile_cache.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
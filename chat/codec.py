@@ -0,0 +1,86 @@
+import json
+
+try:
+    import msgpack
+except ImportError:  # optional: without it only JSON is offered
+    msgpack = None
+
+# Websocket subprotocol a client requests to receive MessagePack frames
+MSGPACK_SUBPROTOCOL = 'pm-chat.msgpack.v1'
+# JSON frames, with the send_messages and resync frames of chat.outbound
+JSON_SUBPROTOCOL = 'pm-chat.json.v1'
+
+
+class JsonCodec:
+    """
+    Default protocol: one JSON object per text frame, one `send_message`
+    frame per message as clients have always received them.
+    """
+    subprotocol = None
+    binary = False
+    # Understands `send_messages` and `resync` frames
+    batching = False
+
+    @staticmethod
+    def encode(frame):
+        return json.dumps(frame)
+
+    @staticmethod
+    def decode(data):
+        return json.loads(data)
+
+
+class BatchingJsonCodec(JsonCodec):
+    """
+    JSON for clients that negotiated JSON_SUBPROTOCOL and handle batched
+    frames.
+    """
+    subprotocol = JSON_SUBPROTOCOL
+    batching = True
+
+
+class MsgpackCodec:
+    """
+    MessagePack object per binary frame. Frames carry the same keys as the
+    JSON protocol.
+    """
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+    batching = True
+
+    @staticmethod
+    def encode(frame):
+        return msgpack.packb(frame, use_bin_type=True)
+
+    @staticmethod
+    def decode(data):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack frame: {e}") from e
+
+
+def select_codec(scope):
+    """
+    MessagePack when the client lists MSGPACK_SUBPROTOCOL in
+    Sec-WebSocket-Protocol (and msgpack is installed), batching JSON for
+    JSON_SUBPROTOCOL, plain JSON otherwise.
+    """
+    subprotocols = scope.get('subprotocols', ())
+    if msgpack is not None and MSGPACK_SUBPROTOCOL in subprotocols:
+        return MsgpackCodec
+    if JSON_SUBPROTOCOL in subprotocols:
+        return BatchingJsonCodec
+    return JsonCodec
+
+
+def decode_frame(text_data=None, bytes_data=None):
+    """
+    Inbound frames are decoded by their type, so a MessagePack client may
+    still send JSON text.
+    """
+    if bytes_data is not None:
+        if msgpack is None:
+            raise ValueError("Binary frames are not supported")
+        return MsgpackCodec.decode(bytes_data)
+    return JsonCodec.decode(text_data)
@@ -1,16 +1,23 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.utils.timezone import now
 from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
-from app.models import Room, Message, User
+from app.models import Room, Message
 import logging
-from middlewares import auth_middleware
+from chat import cache
+from chat.codec import JsonCodec, decode_frame, select_codec
+from chat.message_writer import get_message_writer
+from chat.outbound import OutboundQueue
+from user import presence
+from utils.pagination import decode_cursor, encode_cursor, keyset_filter
 
 logger = logging.getLogger(__name__)
 
+MAX_HISTORY_PAGE = 100
+
 class ChatConsumer(AsyncWebsocketConsumer):
-    @auth_middleware
+    codec = JsonCodec
+
     async def connect(self):
         """
         ###########################################
@@ -18,30 +25,38 @@ class ChatConsumer(AsyncWebsocketConsumer):
         ###########################################
         """
         try:
-            # Get token or sender_id from query string
-            sender_id = self.scope['query_string'].decode().split('id=')[1]
+            # Set by core.websocket_auth.JWTAuthMiddleware
+            user = self.scope.get('user')
+            if not user:
+                # 4401: missing or invalid access token. Accepted first: a close
+                # before accept() reaches the client as an HTTP 403 without the code
+                await self.accept()
+                await self.close(code=4401)
+                return
 
-            # user = await database_sync_to_async(User.objects.get)(id=sender_id)
-            # print(f"check >>> {user}")
-
-            # check sender_id
-            
             self.room_name = self.scope['url_route']['kwargs']['room_name']
             self.room_group_name = f"chat_{self.room_name}"
+            cache.ensure_invalidation_listener()
             # Create or fetch room
-            self.room = await database_sync_to_async(self.get_or_create_room)(self.room_name)
+            self.room_id = (await self.get_room(self.room_name))['id']
+            # Sender of the messages this socket writes
+            self.sender_id, self.sender_name = user['id'], user['username']
 
             # Add sender as a member of the room
-            await self.add_user_to_room(sender_id)
+            await self.add_user_to_room(user['id'])
+            await presence.tracker.connect(self.sender_id)
 
             # Join group chat
             await self.channel_layer.group_add(
                 self.room_group_name,
                 self.channel_name
             )
-            await self.accept()
+            self.codec = select_codec(self.scope)
+            self.outbound = OutboundQueue(
+                self.send_frame, self.close_slow_consumer, batching=self.codec.batching)
+            await self.accept(self.codec.subprotocol)
 
-            logger.info(f"User {sender_id} connected to room {self.room_name}")
+            logger.info(f"User {self.sender_id} connected to room {self.room_name}")
 
         except Exception as e:
             logger.error(f"Error during websocket connect: {e}")
@@ -49,44 +64,67 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         try:
-            # Leave the group chat
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
-            )
+            if getattr(self, 'outbound', None):
+                self.outbound.close()
+            if getattr(self, 'sender_id', None):
+                await presence.tracker.disconnect(self.sender_id)
+
+            # Leave the group chat (unauthenticated sockets never joined one)
+            if getattr(self, 'room_group_name', None):
+                await self.channel_layer.group_discard(
+                    self.room_group_name,
+                    self.channel_name
+                )
         except Exception as e:
             logger.error(f"Error during websocket disconnect: {e}")
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
-            action = data.get("action")
-
-            if action == "send_message":
-                await self.handle_send_message(data)
-            elif action == "load_messages":
-                await self.handle_load_messages(data)
-            else:
-                await self.send_error("invalid action")
-
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON format received.")
-            await self.send(text_data=json.dumps({
-                "error": "Invalid JSON format"
-            }))
+            data = decode_frame(text_data, bytes_data)
+            # A frame may carry a list of actions
+            for item in data if isinstance(data, list) else [data]:
+                action = item.get("action") if isinstance(item, dict) else None
+
+                if action == "send_message":
+                    await self.handle_send_message(item)
+                elif action == "load_messages":
+                    await self.handle_load_messages(item)
+                else:
+                    await self.send_error("invalid action")
+
+        except ValueError:
+            logger.error("Invalid frame received.")
+            await self.send_frame({
+                "error": "Invalid MessagePack frame" if bytes_data is not None else "Invalid JSON format"
+            })
         except Exception as e:
             logger.error(f"Error in receive method: {e}")
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "error": "Internal error occurred"
-            }))
+            })
 
     async def handle_send_message(self, data):
+        """
+        Broadcast right away and hand the message to the per-process writer,
+        which saves it in a later batch. The id is generated here; a client
+        `id` comes back as `client_id` in the echo so the sender can match
+        it, and a message the database rejects is reported with an
+        {"error", "id"} frame.
+        """
         try:
             content = data.get("content")
-            sender_id = data.get("sender_id")
+            if not isinstance(content, str) or not content:
+                await self.send_error("content is required")
+                return
 
-            # Save to db
-            message = await sync_to_async(self.save_message)(self.room_name, sender_id, content)
+            message = Message(
+                room_id=self.room_id,
+                sender_id=self.sender_id,
+                content=content,
+                created_at=now()
+            )
+            # Waits only when the writer is backed up
+            await get_message_writer().submit(message, reply_to=self.channel_name)
 
             # Send message to all members in group
             await self.channel_layer.group_send(
@@ -96,67 +134,104 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     "message": {
                         "id": str(message.id),
                         "content": message.content,
-                        "sender": message.sender.username if message.sender else "Unknown",
-                        "created_at": message.created_at.isoformat()
+                        "sender": self.sender_name,
+                        "created_at": message.created_at.isoformat(),
+                        "client_id": str(data["id"]) if data.get("id") else None
                     }
                 }
             )
         except Exception as e:
             logger.error(f"Error in handle_send_message: {e}")
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "error": "Failed to send message"
-            }))
+            })
 
     async def handle_load_messages(self, data):
+        """
+        Page through history, newest first. Pass back the `before` cursor of
+        the previous page to load older messages.
+        """
         try:
-            offset = data.get("offset", 0)
-            limit = data.get("limit", 20)
+            limit = min(max(int(data.get("limit", 20)), 1), MAX_HISTORY_PAGE)
+            before = data.get("before")
+            if before:
+                try:
+                    before = decode_cursor(before)
+                except ValueError:
+                    await self.send_error("invalid cursor")
+                    return
 
             # Get messages from db
-            messages = await sync_to_async(self.get_messages)(self.room_name, offset, limit)
+            messages, next_before = await sync_to_async(self.get_messages)(
+                self.room_id, limit, before=before, offset=data.get("offset", 0))
 
             # Send messages to client
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "action": "load_messages",
-                "messages": messages
-            }))
+                "messages": messages,
+                "before": next_before,
+                "has_more": next_before is not None
+            })
         except Exception as e:
             logger.error(f"Error in handle_load_messages: {e}")
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 "error": "Failed to load messages"
-            }))
+            })
 
     async def chat_message(self, event):
         try:
-            # Send message to WebSocket
-            await self.send(text_data=json.dumps({
-                "action": "send_message",
-                "message": event["message"]
-            }))
+            # Queue for this WebSocket, never waits on a slow client
+            self.outbound.put(event["message"])
         except Exception as e:
             logger.error(f"Error in chat_message: {e}")
 
+    async def chat_message_failed(self, event):
+        # Sent by the message writer when the database rejected our message
+        await self.send_frame({
+            "error": "Failed to save message",
+            "id": event["id"]
+        })
+
+    async def close_slow_consumer(self):
+        logger.warning(f"Closing slow websocket {self.channel_name} in room {self.room_name}")
+        # 1013: try again later
+        await self.close(code=1013)
+
     async def add_user_to_room(self, user_id):
         try:
-            # Get user from db
-            user = await database_sync_to_async(User.objects.get)(id=user_id)
-
             # Check if user is already a member of the room
-            user_in_room = await database_sync_to_async(self.room.members.filter)(id=user.id).exists()
-            if not user_in_room:
-                await database_sync_to_async(self.room.members.add)(user)
-                await database_sync_to_async(self.room.save)()
+            room = await self.get_room(self.room_name)
+            if str(user_id) not in room['members']:
+                await database_sync_to_async(Room(id=room['id']).members.add)(user_id)
+                await cache.invalidate(room=self.room_name)
+                cache.room_cache.set(self.room_name, {
+                    'id': room['id'],
+                    'members': room['members'] | {str(user_id)},
+                })
 
             logger.info(f"User {user_id} added to room {self.room_name}")
 
         except Exception as e:
             logger.error(f"Error in add_user_to_room: {e}")
 
+    async def get_room(self, room_name):
+        room = cache.room_cache.get(room_name)
+        if room is None:
+            room = await database_sync_to_async(self.load_room)(room_name)
+            cache.room_cache.set(room_name, room)
+        return room
+
     async def send_error(self, error_message):
-        await self.send(
-            text_data=json.dumps({
-                "error": error_message
-            }))
+        await self.send_frame({
+            "error": error_message
+        })
+
+    async def send_frame(self, frame):
+        data = self.codec.encode(frame)
+        if self.codec.binary:
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
 
     """
     ###########################################
@@ -164,20 +239,29 @@ class ChatConsumer(AsyncWebsocketConsumer):
     ###########################################
     """
     @staticmethod
-    def save_message(room_name, sender_id, content):
-        room = Room.objects.get(name=room_name)
-        sender = User.objects.get(id=sender_id) if sender_id else None
-        return Message.objects.create(room=room, sender=sender, content=content)
-
-    @staticmethod
-    def get_messages(room_name, offset, limit):
-        try:
-            room = Room.objects.get(name=room_name)
-        except Room.DoesNotExist:
-            logger.error(f"Room {room_name} does not exist.")
-            return []  # Return an empty list if room does not exist
+    def get_messages(room_id, limit, before=None, offset=0):
+        """
+        One indexed query on (room, created_at, id) whatever the room size.
+        Returns the page (oldest first) and the cursor for the next older
+        page, or None when there is nothing older.
+        """
+        messages = (
+            Message.objects
+            .filter(room_id=room_id)
+            .select_related('sender')
+            .only('id', 'content', 'created_at', 'sender__username')
+            .order_by('-created_at', '-id')
+        )
+        if before:
+            messages = keyset_filter(messages, 'created_at', before)
+        elif offset:
+            # Clients that still page with `offset`
+            messages = messages[int(offset):]
 
-        messages = Message.objects.filter(room=room).order_by('-created_at')[offset:offset + limit]
+        messages = list(messages[:limit + 1])
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        next_before = encode_cursor(messages[-1].created_at, messages[-1].id) if has_more else None
         return [
             {
                 "id": str(message.id),
@@ -186,9 +270,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 "created_at": message.created_at.isoformat()
             }
             for message in messages[::-1]
-        ]
+        ], next_before
 
     @staticmethod
-    def get_or_create_room(room_name):
+    def load_room(room_name):
         room, created = Room.objects.get_or_create(name=room_name)
-        return room
+        members = frozenset(str(id) for id in room.members.values_list('id', flat=True))
+        return {'id': room.id, 'members': members}
@@ -0,0 +1,189 @@
+import asyncio
+import atexit
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+
+from app.models import Message
+
+logger = logging.getLogger(__name__)
+
+# The database is unreachable: the batch is kept and written again later
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+def write_messages(messages):
+    """
+    Insert a batch in one bulk_create; returns (written, retry, failed).
+
+    When the database is unreachable the whole batch comes back in `retry`.
+    Any other error retries the batch one row at a time, so a single bad
+    message (its room was deleted, say) ends up in `failed` without losing
+    the others. Ids are generated by the server, so a conflict can only be
+    a message that was already written and writing it again is a no-op.
+    """
+    try:
+        Message.objects.bulk_create(messages, ignore_conflicts=True)
+        return len(messages), [], []
+    except TRANSIENT_ERRORS as e:
+        logger.warning(f"Message batch of {len(messages)} failed, will retry: {e}")
+        return 0, list(messages), []
+    except Exception as e:
+        logger.warning(f"Message batch of {len(messages)} failed, retrying one by one: {e}")
+
+    written, retry, failed = 0, [], []
+    for message in messages:
+        try:
+            Message.objects.bulk_create([message], ignore_conflicts=True)
+            written += 1
+        except TRANSIENT_ERRORS:
+            retry.append(message)
+        except Exception as e:
+            logger.error(f"Could not save chat message {message.id}: {e}")
+            failed.append(message)
+    return written, retry, failed
+
+
+class MessageWriter:
+    """
+    Per-process write-behind buffer for chat messages.
+
+    Consumers broadcast first and `submit()` the unsaved Message; a
+    background task writes them with bulk_create once `batch_size` are
+    queued or `flush_interval` seconds have passed. `submit()` waits while
+    `max_queue` messages are pending, which slows senders down instead of
+    growing memory. `close()` (and an atexit hook) writes whatever is left.
+
+    While the database is unreachable the batch is kept and written again
+    every `retry_delay` seconds. A message the database rejects is reported
+    to the `reply_to` channel it was submitted with as a
+    {"type": "chat.message_failed", "id"} event.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue=None, retry_delay=None):
+        self.batch_size = batch_size or settings.CHAT_WRITER_BATCH_SIZE
+        self.flush_interval = (
+            settings.CHAT_WRITER_FLUSH_INTERVAL if flush_interval is None else flush_interval)
+        self.retry_delay = settings.CHAT_WRITER_RETRY_DELAY if retry_delay is None else retry_delay
+        self.queue = asyncio.Queue(maxsize=max_queue or settings.CHAT_WRITER_MAX_QUEUE)
+        self.written = 0
+        self._batch_ready = asyncio.Event()
+        self._in_flight = []
+        self._reply_to = {}
+        self._task = None
+        _open_writers.add(self)
+
+    async def submit(self, message, reply_to=None):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        if reply_to:
+            self._reply_to[message.id] = reply_to
+        await self.queue.put(message)
+        if self.queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    async def _run(self):
+        while True:
+            # Messages taken off the queue stay in _in_flight until written,
+            # so close() can still save them if this task is cancelled
+            if not self._in_flight:
+                self._in_flight = [await self.queue.get()]
+                if self.queue.qsize() + 1 < self.batch_size:
+                    self._batch_ready.clear()
+                    try:
+                        await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            while len(self._in_flight) < self.batch_size and not self.queue.empty():
+                self._in_flight.append(self.queue.get_nowait())
+            retry = await self._write(self._in_flight)
+            # Kept in front of the queue until the database is back
+            self._in_flight = retry
+            if retry:
+                await asyncio.sleep(self.retry_delay)
+
+    async def _write(self, messages):
+        written, retry, failed = await database_sync_to_async(write_messages)(messages)
+        self.written += written
+        failed = [(self._reply_to.pop(message.id, None), message) for message in failed]
+        kept = {message.id for message in retry}
+        for message in messages:
+            if message.id not in kept:
+                self._reply_to.pop(message.id, None)
+        await self._report_failed([(channel, message) for channel, message in failed if channel])
+        return retry
+
+    async def _report_failed(self, replies):
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        for channel, message in replies:
+            try:
+                await layer.send(channel, {'type': 'chat.message_failed', 'id': str(message.id)})
+            except Exception as e:
+                logger.error(f"Could not report unsaved chat message {message.id}: {e}")
+
+    def _pending(self):
+        pending = list(self._in_flight)
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        return pending
+
+    async def close(self):
+        """
+        Stop the background task and write everything still buffered.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        pending = self._pending()
+        self._in_flight = []
+        if pending:
+            retry = await self._write(pending)
+            if retry:
+                logger.error(f"Database unavailable, {len(retry)} chat messages were not saved")
+        self._reply_to.clear()
+        _open_writers.discard(self)
+
+    def flush_sync(self):
+        """
+        Last resort at interpreter exit, when the event loop is gone.
+        """
+        pending = self._pending()
+        self._in_flight = []
+        if pending:
+            logger.info(f"Flushing {len(pending)} buffered chat messages at exit")
+            written, retry, failed = write_messages(pending)
+            self.written += written
+            if retry:
+                logger.error(f"Database unavailable, {len(retry)} chat messages were not saved")
+
+
+# Strong references: the atexit flush must still see writers whose loop is gone
+_open_writers = set()
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_message_writer():
+    """
+    The writer of the running event loop (one per daphne process).
+    """
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = MessageWriter()
+    return writer
+
+
+@atexit.register
+def _flush_at_exit():
+    for writer in list(_open_writers):
+        try:
+            writer.flush_sync()
+        except Exception as e:
+            logger.error(f"Could not flush chat messages at exit: {e}")
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+
+from django.conf import settings
+
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_open_queues = weakref.WeakSet()
+
+registry.register_gauge('chat.outbound.connections', lambda: len(_open_queues))
+registry.register_gauge('chat.outbound.queued', lambda: sum(len(queue) for queue in list(_open_queues)))
+registry.register_gauge(
+    'chat.outbound.max_depth', lambda: max((len(queue) for queue in list(_open_queues)), default=0))
+
+
+class OutboundQueue:
+    """
+    Bounded send buffer of one websocket. `send` is a coroutine function
+    taking a frame (dict), which the consumer encodes for its protocol.
+
+    `put()` never waits on the client, so a stalled socket cannot hold up
+    the group events of its worker. A background task sends what is
+    queued, one `send_message` frame per message. With `batching` (the
+    client negotiated a protocol that supports it, see chat.codec) several
+    waiting messages go out as a single `send_messages` frame instead.
+
+    Once `high_water` messages are queued the socket is a slow consumer:
+    - 'disconnect' closes it (the client reconnects and reloads history),
+    - 'degrade' drops the backlog and sends one `resync` frame telling the
+      client how many messages it missed, then carries on. Clients without
+      `batching` do not know that frame and are disconnected instead.
+    """
+
+    def __init__(self, send, close, high_water=None, policy=None, max_batch=None, batching=False):
+        self._send = send
+        self._close = close
+        self.high_water = high_water or settings.CHAT_OUTBOUND_HIGH_WATER
+        self.policy = (policy or settings.CHAT_OUTBOUND_POLICY) if batching else 'disconnect'
+        self.max_batch = (max_batch or settings.CHAT_OUTBOUND_MAX_BATCH) if batching else 1
+        self._pending = deque()
+        self._missed = 0
+        self._ready = asyncio.Event()
+        self._task = None
+        self.closed = False
+        _open_queues.add(self)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def put(self, message):
+        if self.closed:
+            return False
+        if len(self._pending) >= self.high_water:
+            if self.policy == 'disconnect':
+                registry.increment('chat.outbound.disconnected')
+                registry.increment('chat.outbound.dropped', len(self._pending) + 1)
+                self.close()
+                asyncio.ensure_future(self._close())
+                return False
+            registry.increment('chat.outbound.degraded')
+            registry.increment('chat.outbound.dropped', len(self._pending))
+            self._missed += len(self._pending)
+            self._pending.clear()
+
+        self._pending.append((message, time.perf_counter()))
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        self._ready.set()
+        return True
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._pending or self._missed:
+                if self._missed:
+                    frame, queued_at = {'action': 'resync', 'missed': self._missed}, None
+                    self._missed = 0
+                    registry.increment('chat.outbound.frames')
+                else:
+                    batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch))]
+                    queued_at = batch[0][1]
+                    if len(batch) == 1:
+                        frame = {'action': 'send_message', 'message': batch[0][0]}
+                    else:
+                        frame = {'action': 'send_messages', 'messages': [message for message, _ in batch]}
+                    registry.increment('chat.outbound.frames')
+                    registry.increment('chat.outbound.messages', len(batch))
+
+                try:
+                    await self._send(frame)
+                except Exception as e:
+                    logger.warning(f"Dropping outbound queue after a failed send: {e}")
+                    self._task = None
+                    self.close()
+                    return
+                if queued_at is not None:
+                    # Time the oldest message of the frame spent queued and sending
+                    registry.observe('chat.outbound.send_latency_ms', (time.perf_counter() - queued_at) * 1000)
+
+    def close(self):
+        self.closed = True
+        self._pending.clear()
+        _open_queues.discard(self)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -1,3 +1,432 @@
-from django.test import TestCase
+import asyncio
+import json
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from app.models import Message, Room, User
+from core.metrics import registry
+from core.websocket_auth import JWTAuthMiddleware
+from utils.redis import remove_cache
+from utils.testing import AuthTestMixin
+from utils.token_verifier import token_verifier
+from chat import cache
+from chat.codec import (
+    JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL, BatchingJsonCodec, JsonCodec, MsgpackCodec, select_codec,
+)
+from chat.consumers import ChatConsumer
+from chat.message_writer import MessageWriter
+from chat.outbound import OutboundQueue
+from chat.routing import websocket_urlpatterns
+from chat.views import MessageListView
+from utils.pagination import decode_cursor
+
+
+class LoadMessagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='chatter', email='chatter@example.com')
+        cls.room = Room.objects.create(name='history')
+        messages = Message.objects.bulk_create([
+            Message(room=cls.room, sender=cls.user if i % 2 else None, content=f"Message {i}")
+            for i in range(45)
+        ])
+        # Several messages share a timestamp so the id tie-breaker is exercised
+        start = timezone.now() - timedelta(hours=1)
+        for i, message in enumerate(messages):
+            Message.objects.filter(id=message.id).update(created_at=start + timedelta(seconds=i // 3))
+
+    def test_before_cursor_walks_the_whole_history_with_one_query_per_page(self):
+        seen, before = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page, before = ChatConsumer.get_messages(self.room.id, 10, before=before and decode_cursor(before))
+            seen = [message['content'] for message in page] + seen
+            if before is None:
+                break
+
+        expected = Message.objects.filter(room=self.room).order_by('created_at', 'id')
+        self.assertEqual(seen, [message.content for message in expected])
+
+    def test_sender_names_come_from_the_same_query(self):
+        with self.assertNumQueries(1):
+            page, _ = ChatConsumer.get_messages(self.room.id, 4)
+        self.assertEqual({message['sender'] for message in page}, {'chatter', 'Unknown'})
+
+
+class MessageListViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='export')
+        start = timezone.now() - timedelta(hours=1)
+        Message.objects.bulk_create([
+            Message(room=cls.room, content=f"Message {i}", created_at=start + timedelta(seconds=i // 2))
+            for i in range(25)
+        ])
+        cls.url = f'/api/chat/rooms/{cls.room.name}/messages/'
+        cls.expected = list(
+            Message.objects.filter(room=cls.room).order_by('created_at', 'id').values_list('content', flat=True))
+
+    def test_default_response_is_the_whole_history_oldest_first(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['content'] for message in response.json()['data']], self.expected)
+
+    def test_cursor_pages_cover_the_room_newest_first(self):
+        seen, url = [], self.url + '?page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [message['content'] for message in response.json()['data']]
+            url = response.json()['pagination']['next']
+        self.assertEqual(seen, self.expected[::-1])
+
+    def test_ndjson_export_streams_every_message_in_chunks(self):
+        self.patch_chunk_size(10)
+        response = self.client.get(self.url, {'export': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertTrue(response.streaming)
+        # 10 + 10 + 5 rows, the short chunk ends the export
+        with self.assertNumQueries(3):
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        # Same fields and timestamp precision as the JSON response
+        self.assertEqual([json.loads(line) for line in lines], self.client.get(self.url).json()['data'])
+
+    def test_unknown_room_is_not_found(self):
+        self.assertEqual(self.client.get('/api/chat/rooms/nowhere/messages/').status_code, 404)
+
+    def patch_chunk_size(self, size):
+        original = MessageListView.export_chunk_size
+        MessageListView.export_chunk_size = size
+        self.addCleanup(setattr, MessageListView, 'export_chunk_size', original)
+
+
+class MessageWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.room = Room.objects.create(name='writer')
+
+    def message(self, content, id=None):
+        return Message(id=id or uuid.uuid4(), room=self.room, content=content, created_at=timezone.now())
+
+    def test_full_batches_are_written_without_waiting_for_the_interval(self):
+        async def run():
+            writer = MessageWriter(batch_size=5, flush_interval=60, max_queue=100)
+            for i in range(10):
+                await writer.submit(self.message(f"Message {i}"))
+            for _ in range(100):
+                if writer.written == 10:
+                    break
+                await asyncio.sleep(0.01)
+            written = writer.written
+            await writer.close()
+            return written
+
+        self.assertEqual(async_to_sync(run)(), 10)
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 10)
+
+    def test_close_writes_what_is_buffered_and_resent_ids_are_ignored(self):
+        message_id = uuid.uuid4()
+
+        async def run():
+            writer = MessageWriter(batch_size=50, flush_interval=60, max_queue=100)
+            await writer.submit(self.message("first", id=message_id))
+            await writer.submit(self.message("retry", id=message_id))
+            await writer.submit(self.message("second"))
+            await writer.close()
+
+        async_to_sync(run)()
+        self.assertEqual(
+            sorted(Message.objects.filter(room=self.room).values_list('content', flat=True)),
+            ['first', 'second'])
+
+    def test_batch_is_kept_while_the_database_is_unreachable(self):
+        bulk_create = Message.objects.bulk_create
+        attempts = []
+
+        def flaky_bulk_create(*args, **kwargs):
+            attempts.append(len(args[0]))
+            if len(attempts) == 1:
+                raise OperationalError("server has gone away")
+            return bulk_create(*args, **kwargs)
+
+        async def run():
+            writer = MessageWriter(batch_size=3, flush_interval=60, max_queue=100, retry_delay=0)
+            for i in range(3):
+                await writer.submit(self.message(f"Message {i}"))
+            for _ in range(100):
+                if writer.written == 3:
+                    break
+                await asyncio.sleep(0.01)
+            await writer.close()
+
+        with mock.patch.object(Message.objects, 'bulk_create', side_effect=flaky_bulk_create):
+            async_to_sync(run)()
+        self.assertEqual(attempts, [3, 3])
+        self.assertEqual(Message.objects.filter(room=self.room).count(), 3)
+
+    def test_rejected_message_is_reported_to_its_sender(self):
+        layer = get_channel_layer()
+        orphan = Message(room_id=uuid.uuid4(), content="orphan", created_at=timezone.now())
+
+        async def run():
+            channel = await layer.new_channel()
+            writer = MessageWriter(batch_size=50, flush_interval=60, max_queue=100)
+            await writer.submit(self.message("kept"), reply_to=channel)
+            await writer.submit(orphan, reply_to=channel)
+            await writer.close()
+            return await asyncio.wait_for(layer.receive(channel), 1)
+
+        event = async_to_sync(run)()
+        self.assertEqual(event, {'type': 'chat.message_failed', 'id': str(orphan.id)})
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['kept'])
+
+
+class ChatCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='member', email='member@example.com')
+
+    def setUp(self):
+        cache.room_cache.clear()
+        cache.profile_cache.clear()
+
+    def join(self, room_name='cached'):
+        consumer = ChatConsumer()
+        consumer.room_name = room_name
+        async_to_sync(consumer.add_user_to_room)(self.user.id)
+        async_to_sync(cache.get_profile)(self.user.id)
+        return consumer
+
+    def test_reconnect_is_served_from_the_cache(self):
+        self.join()
+        room = Room.objects.get(name='cached')
+        self.assertTrue(room.members.filter(id=self.user.id).exists())
+
+        with self.assertNumQueries(0):
+            self.join()
+
+    def test_invalidation_from_another_process_evicts_the_entries(self):
+        self.join()
+
+        async def run():
+            cache.ensure_invalidation_listener()
+            await asyncio.sleep(0.05)
+            await get_channel_layer().group_send(cache.INVALIDATION_GROUP, {
+                'type': 'chat.cache.invalidate', 'origin': 'other-process',
+                'room': 'cached', 'user': str(self.user.id),
+            })
+            for _ in range(100):
+                if cache.room_cache.get('cached') is None:
+                    break
+                await asyncio.sleep(0.01)
+            cache._listeners[asyncio.get_running_loop()].cancel()
+
+        async_to_sync(run)()
+        self.assertIsNone(cache.room_cache.get('cached'))
+        self.assertIsNone(cache.profile_cache.get(str(self.user.id)))
+
+
+class WebsocketAuthTests(AuthTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='socket-user', email='socket@example.com')
+
+    def setUp(self):
+        super().setUp()
+        cache.room_cache.clear()
+        cache.profile_cache.clear()
+
+    def connect(self, path):
+        """
+        None when the socket stays open, else the code it was closed with.
+        """
+        async def run():
+            communicator = WebsocketCommunicator(JWTAuthMiddleware(URLRouter(websocket_urlpatterns)), path)
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            if await communicator.receive_nothing():
+                await communicator.disconnect()
+                return None
+            code = (await communicator.receive_output())['code']
+            await communicator.disconnect()
+            return code
+
+        return async_to_sync(run)()
+
+    def test_token_is_verified_once_and_reconnects_are_cached(self):
+        self.assertIsNone(self.connect(f"/ws/chat/auth/?token={self.token}"))
+        self.assertTrue(Room.objects.get(name='auth').members.filter(id=self.user.id).exists())
+
+        # Token, profile and room all come from the process caches
+        remove_cache(f"access_token:{self.token}")
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.connect(f"/ws/chat/auth/?token={self.token}"))
+
+    def test_missing_revoked_or_forged_tokens_are_rejected(self):
+        # The rejected socket never joined a group, so disconnect has nothing to leave
+        with self.assertNoLogs('chat.consumers', 'ERROR'):
+            self.assertEqual(self.connect("/ws/chat/auth/"), 4401)
+        self.assertEqual(self.connect(f"/ws/chat/auth/?id={self.user.id}"), 4401)
+        self.assertEqual(self.connect(f"/ws/chat/auth/?token={self.token}x"), 4401)
+
+        token_verifier.revoke(self.token)
+        remove_cache(f"access_token:{self.token}")
+        self.assertEqual(self.connect(f"/ws/chat/auth/?token={self.token}"), 4401)
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_entries_expire_and_least_recently_used_is_dropped(self):
+        lru = cache.TTLCache(max_size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+        expired = cache.TTLCache(max_size=2, ttl=0)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+
+class OutboundQueueTests(SimpleTestCase):
+    def setUp(self):
+        registry.reset()
+        self.frames, self.closed = [], 0
+        self.stalled = None
+
+    async def send(self, frame):
+        if self.stalled is not None:
+            await self.stalled.wait()
+        self.frames.append(frame)
+
+    async def close(self):
+        self.closed += 1
+
+    def test_a_burst_goes_out_as_one_frame(self):
+        async def run():
+            queue = OutboundQueue(self.send, self.close, high_water=10, max_batch=4, batching=True)
+            for i in range(6):
+                queue.put({'content': i})
+            await asyncio.sleep(0.01)
+            queue.put({'content': 6})
+            await asyncio.sleep(0.01)
+            queue.close()
+
+        async_to_sync(run)()
+        self.assertEqual(
+            [frame['action'] for frame in self.frames], ['send_messages', 'send_messages', 'send_message'])
+        self.assertEqual([len(frame['messages']) for frame in self.frames[:2]], [4, 2])
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['counters']['chat.outbound.messages'], 7)
+        self.assertEqual(snapshot['timings']['chat.outbound.send_latency_ms']['count'], 3)
+
+    def test_stalled_client_is_disconnected_at_the_high_water_mark(self):
+        async def run():
+            self.stalled = asyncio.Event()
+            queue = OutboundQueue(self.send, self.close, high_water=3, policy='disconnect')
+            queue.put({'content': 0})
+            # The first message is stuck in send(), three more fill the queue
+            await asyncio.sleep(0.01)
+            accepted = [queue.put({'content': i}) for i in range(1, 5)]
+            self.assertEqual(registry.snapshot()['gauges']['chat.outbound.queued'], 0)
+            await asyncio.sleep(0.01)
+            return accepted
+
+        self.assertEqual(async_to_sync(run)(), [True, True, True, False])
+        self.assertEqual(self.closed, 1)
+        self.assertEqual(registry.snapshot()['counters']['chat.outbound.dropped'], 4)
+
+    def test_degraded_client_gets_a_resync_frame(self):
+        async def run():
+            self.stalled = asyncio.Event()
+            queue = OutboundQueue(self.send, self.close, high_water=3, policy='degrade', batching=True)
+            queue.put({'content': 0})
+            await asyncio.sleep(0.01)
+            for i in range(1, 6):
+                queue.put({'content': i})
+            self.assertEqual(len(queue), 2)
+            self.stalled.set()
+            await asyncio.sleep(0.01)
+            queue.close()
+
+        async_to_sync(run)()
+        self.assertEqual(self.closed, 0)
+        self.assertEqual(self.frames, [
+            {'action': 'send_message', 'message': {'content': 0}},
+            {'action': 'resync', 'missed': 3},
+            {'action': 'send_messages', 'messages': [{'content': 4}, {'content': 5}]},
+        ])
+
+    def test_plain_json_clients_get_one_frame_per_message(self):
+        async def run():
+            self.stalled = asyncio.Event()
+            # 'degrade' would send a resync frame these clients do not know
+            queue = OutboundQueue(self.send, self.close, high_water=3, policy='degrade')
+            queue.put({'content': 0})
+            await asyncio.sleep(0.01)
+            for i in range(1, 3):
+                queue.put({'content': i})
+            self.stalled.set()
+            await asyncio.sleep(0.01)
+            self.stalled = asyncio.Event()
+            queue.put({'content': 3})
+            await asyncio.sleep(0.01)
+            for i in range(4, 8):
+                queue.put({'content': i})
+            await asyncio.sleep(0.01)
+
+        async_to_sync(run)()
+        self.assertEqual(self.frames, [
+            {'action': 'send_message', 'message': {'content': i}} for i in range(3)
+        ])
+        self.assertEqual(self.closed, 1)
+
+
+class CodecTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(name='codec')
+        Message.objects.bulk_create([Message(room=cls.room, content=f"Message {i}") for i in range(3)])
+
+    def consumer(self, codec):
+        consumer = ChatConsumer()
+        consumer.codec, consumer.room_id = codec, self.room.id
+        consumer.sent = []
+
+        async def send(text_data=None, bytes_data=None):
+            consumer.sent.append(bytes_data if bytes_data is not None else text_data)
+        consumer.send = send
+        return consumer
+
+    def test_subprotocol_negotiation(self):
+        self.assertIs(select_codec({'subprotocols': ['other', MSGPACK_SUBPROTOCOL]}), MsgpackCodec)
+        self.assertIs(select_codec({'subprotocols': [JSON_SUBPROTOCOL]}), BatchingJsonCodec)
+        self.assertIs(select_codec({'subprotocols': []}), JsonCodec)
+        self.assertIs(select_codec({}), JsonCodec)
+
+    def test_msgpack_frame_with_several_actions(self):
+        consumer = self.consumer(MsgpackCodec)
+        frame = msgpack.packb([{'action': 'load_messages', 'limit': 2}, {'action': 'unknown'}])
+        async_to_sync(consumer.receive)(bytes_data=frame)
+
+        replies = [msgpack.unpackb(data) for data in consumer.sent]
+        self.assertEqual(len(replies[0]['messages']), 2)
+        self.assertTrue(replies[0]['has_more'])
+        self.assertEqual(replies[1], {'error': 'invalid action'})
+
+    def test_json_clients_are_unchanged(self):
+        consumer = self.consumer(JsonCodec)
+        async_to_sync(consumer.receive)(text_data=json.dumps({'action': 'load_messages'}))
+        async_to_sync(consumer.receive)(text_data='not json')
+
+        self.assertEqual(len(json.loads(consumer.sent[0])['messages']), 3)
+        self.assertEqual(json.loads(consumer.sent[1]), {'error': 'Invalid JSON format'})
@@ -1,8 +1,13 @@
+import json
+
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
 from app.models import Room, Message
+from utils.pagination import InvalidCursor, KeysetPagination, keyset_filter
 from utils.response import failure_response, success_response
 from .serializers import RoomSerializer, MessageSerializer
 
@@ -29,17 +34,59 @@ class RoomListView(APIView):
 class MessageListView(APIView):
     """
     API để lấy tin nhắn trong một phòng chat.
+
+    The whole history, oldest first, as clients have always received it.
+    With `?cursor` or `?page_size` the messages come in cursor pages, newest
+    first. `?export=ndjson` streams the whole history oldest first, one JSON
+    object per line.
     """
+    export_chunk_size = 2000
+
     def get(self, request, room_name):
         try:
-            room = Room.objects.get(name=room_name)
+            room = Room.objects.only('id').get(name=room_name)
         except Room.DoesNotExist:
             return failure_response(message="Room not found", status_code=status.HTTP_404_NOT_FOUND)
-            
 
-        messages = Message.objects.filter(room=room).order_by('created_at')
-        serializer = MessageSerializer(messages, many=True)
-        return success_response(data=serializer.data)
+        messages = Message.objects.filter(room=room).only(*MessageSerializer.Meta.fields)
+        if request.query_params.get('export') == 'ndjson':
+            response = StreamingHttpResponse(
+                self.export_lines(messages), content_type='application/x-ndjson')
+            response['Content-Disposition'] = f'attachment; filename="{room_name}-messages.ndjson"'
+            return response
+
+        paginator = KeysetPagination()
+        if not any(param in request.query_params
+                   for param in (paginator.cursor_query_param, paginator.page_size_query_param)):
+            serializer = MessageSerializer(messages.order_by('created_at', 'id'), many=True)
+            return success_response(data=serializer.data)
+
+        try:
+            page = paginator.paginate_queryset(messages, request)
+        except InvalidCursor:
+            return failure_response(
+                message="Validation errors",
+                data={'cursor': 'invalid cursor'}
+            )
+        serializer = MessageSerializer(page, many=True)
+        return success_response(data=serializer.data, paginator=paginator)
+
+    def export_lines(self, messages):
+        """
+        Reads the room in keyset chunks so neither the database driver nor
+        this process ever holds more than one chunk, whatever the room size.
+        Lines are the MessageSerializer output of the JSON responses.
+        """
+        messages = messages.order_by('created_at', 'id')
+        cursor = None
+        while True:
+            chunk = keyset_filter(messages, 'created_at', cursor, reverse=True) if cursor else messages
+            rows = list(chunk[:self.export_chunk_size])
+            for message in MessageSerializer(rows, many=True).data:
+                yield json.dumps(message, cls=JSONEncoder) + '\n'
+            if len(rows) < self.export_chunk_size:
+                return
+            cursor = {'value': rows[-1].created_at, 'id': rows[-1].id}
 
 def test_view(request):
     return render(request, 'test.html')
\ No newline at end of file
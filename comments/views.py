@@ -8,6 +8,7 @@ from comments.serializers import CreateCommentTaskSerializers, CreateReplyCommen
 from middlewares import auth_middleware
 from utils.response import failure_response, success_response
 from firebase.firebase_config import db
+from notifications.dispatcher import NotificationDispatcher, read_value
 
 # Create your views here.
 @api_view(['POST'])
@@ -52,13 +53,14 @@ def create_comment_task_by_user(request):
         }
 
         # Push data to Firebase
-        ref = db.reference(f"comments/{task_id}")
-        snapshot = ref.push(new_data)
+        dispatcher = NotificationDispatcher()
+        comment_id = dispatcher.push(f"comments/{task_id}", new_data)
+        dispatcher.flush_on_commit()
 
         return success_response(
             message="Comment created successfully",
             status_code=status.HTTP_201_CREATED,
-            data={"id": snapshot.key, "comment_data": new_data}
+            data={"id": comment_id, "comment_data": new_data}
         )
     except Exception as e:
         return failure_response(message="An unexpected error occurred", data=str(e))
@@ -85,7 +87,7 @@ def update_comment_by_user(request):
             return failure_response(message="Invalid Task ID format")
         
         # check permissions
-        latest_data = ref.get()
+        latest_data = read_value(ref)
 
         if latest_data['user_id'] != user_id:
             return failure_response(
@@ -105,7 +107,9 @@ def update_comment_by_user(request):
             'updated_at': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
             'user_id': user_id,
         }
-        ref.update(new_data)
+        dispatcher = NotificationDispatcher()
+        dispatcher.update(f"comments/{task_id}/{req_body.validated_data['comment_id']}", new_data)
+        dispatcher.flush_on_commit()
         return success_response(
                 message="Comment updated successfully",
                 status_code=status.HTTP_201_CREATED,
@@ -140,7 +144,7 @@ def delete_comment_by_user(request):
             return failure_response(message="Task not found")
         
         # check permissions
-        latest_data = ref.get()
+        latest_data = read_value(ref)
 
         if latest_data['user_id'] != user_id:
             return failure_response(
@@ -150,7 +154,9 @@ def delete_comment_by_user(request):
         
         
         # Validate ok
-        ref.delete()
+        dispatcher = NotificationDispatcher()
+        dispatcher.delete(f"comments/{validated_data['task_id']}/{validated_data['comment_id']}")
+        dispatcher.flush_on_commit()
         
         
         return success_response(message="Delete comment succesfully", data=latest_data)
@@ -182,15 +188,15 @@ def create_reply_comment_by_user(request):
         if not is_exist_task:
             return failure_response(message="Task not found")
         
-        reply_ref = db.reference(f"comments/{validated_data['task_id']}/{validated_data['comment_id']}/replies")
-        
         new_reply_data = {
             "user_id": user_id,
             "created_at": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
             "updated_at": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
             "content": validated_data['content_reply']
         }
-        reply_ref.push(new_reply_data)
+        dispatcher = NotificationDispatcher()
+        dispatcher.push(f"comments/{validated_data['task_id']}/{validated_data['comment_id']}/replies", new_reply_data)
+        dispatcher.flush_on_commit()
 
         return success_response(
             message="Reply this comment successfully",
@@ -224,7 +230,7 @@ def update_reply_comment_by_user(request):
             return failure_response(message="Task not found")
         
         reply_ref = db.reference(f"comments/{validated_data['task_id']}/{validated_data['comment_id']}/replies/{validated_data['comment_reply_id']}")
-        latest_reply_comment = reply_ref.get()
+        latest_reply_comment = read_value(reply_ref)
 
         # check permission
         if not user_id == latest_reply_comment['user_id']:
@@ -237,7 +243,9 @@ def update_reply_comment_by_user(request):
             "updated_at": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
         }
 
-        reply_ref.update(update_data)
+        dispatcher = NotificationDispatcher()
+        dispatcher.update(f"comments/{validated_data['task_id']}/{validated_data['comment_id']}/replies/{validated_data['comment_reply_id']}", update_data)
+        dispatcher.flush_on_commit()
 
         
         return success_response(message="update comment successfully")
@@ -271,7 +279,7 @@ def delete_reply_comment_by_user(request):
             return failure_response(message="Task not found")
         
         reply_ref = db.reference(f"comments/{validated_data['task_id']}/{validated_data['comment_id']}/replies/{validated_data['comment_reply_id']}")
-        latest_reply_comment = reply_ref.get()
+        latest_reply_comment = read_value(reply_ref)
 
         # check permission
         if not user_id == latest_reply_comment['user_id']:
@@ -279,7 +287,9 @@ def delete_reply_comment_by_user(request):
                 message="you dont have permission for this action",
                 status_code= status.HTTP_403_FORBIDDEN
             )
-        reply_ref.delete()
+        dispatcher = NotificationDispatcher()
+        dispatcher.delete(f"comments/{validated_data['task_id']}/{validated_data['comment_id']}/replies/{validated_data['comment_reply_id']}")
+        dispatcher.flush_on_commit()
         return success_response(message="delete reply comment successfully")
     except Exception as e:
         return failure_response(message="An unexpected error occurred", data=str(e))
\ No newline at end of file
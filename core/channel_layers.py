@@ -0,0 +1,57 @@
+import bisect
+import hashlib
+
+from channels_redis.core import RedisChannelLayer
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes. Adding or removing a node only
+    moves the keys of that node (~1/N of them), unlike `crc32 % N`.
+    """
+
+    def __init__(self, nodes, replicas=160):
+        points = sorted(
+            (self._hash(f"{node}#{replica}"), index)
+            for index, node in enumerate(nodes)
+            for replica in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._indexes = [index for _, index in points]
+
+    @staticmethod
+    def _hash(value):
+        if isinstance(value, str):
+            value = value.encode('utf8')
+        return int.from_bytes(hashlib.md5(value).digest()[:8], 'big')
+
+    def get(self, key):
+        if not self._points:
+            raise ValueError("HashRing has no nodes")
+        position = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._indexes[position]
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer that places groups (e.g. `chat_<room>`) and
+    process-specific channels on hosts through a HashRing, so resizing the
+    Redis pool keeps most rooms on the shard they already use.
+
+    Every process must be configured with the same host list, in any order.
+    """
+
+    def __init__(self, *args, ring_replicas=160, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ring = HashRing([self._host_name(host) for host in self.hosts], replicas=ring_replicas)
+
+    @staticmethod
+    def _host_name(host):
+        if 'address' in host:
+            return str(host['address'])
+        return str(sorted(host.items()))
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        return self.ring.get(value)
@@ -0,0 +1,140 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class RequestMetrics:
+    """
+    Counters for the request currently being handled (see ProfilingMiddleware).
+    """
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.firebase_calls = 0
+        self.firebase_time = 0.0
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_request():
+    return _current.get()
+
+
+def record_cache(hit):
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+@contextmanager
+def track_firebase():
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.firebase_calls += 1
+            metrics.firebase_time += time.perf_counter() - start
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class MetricsRegistry:
+    """
+    Per-process aggregation of request metrics, keyed by view. Percentiles
+    are computed over the last `window` requests of each view.
+
+    Code outside the request cycle (e.g. websockets) reports through named
+    counters, gauges (callables read at snapshot time) and timings.
+    """
+
+    FIELDS = ('latency_ms', 'db_queries', 'db_ms', 'cache_hits', 'cache_misses',
+              'firebase_calls', 'firebase_ms')
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._samples = defaultdict(lambda: {field: deque(maxlen=self.window) for field in self.FIELDS})
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._timings = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, view, **values):
+        with self._lock:
+            self._counts[view] += 1
+            samples = self._samples[view]
+            for field in self.FIELDS:
+                samples[field].append(values.get(field, 0))
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def register_gauge(self, name, read):
+        self._gauges[name] = read
+
+    def observe(self, name, value):
+        with self._lock:
+            self._timings[name].append(value)
+
+    def snapshot(self):
+        gauges = {name: read() for name, read in list(self._gauges.items())}
+        with self._lock:
+            views = {}
+            for view, samples in self._samples.items():
+                views[view] = {'count': self._counts[view]}
+                for field, values in samples.items():
+                    values = list(values)
+                    views[view][field] = {
+                        'p50': percentile(values, 50),
+                        'p95': percentile(values, 95),
+                        'p99': percentile(values, 99),
+                    }
+            timings = {}
+            for name, values in self._timings.items():
+                values = list(values)
+                timings[name] = {
+                    'count': len(values),
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'p99': percentile(values, 99),
+                }
+            counters = dict(self._counters)
+        return {'views': views, 'counters': counters, 'gauges': gauges, 'timings': timings}
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._samples.clear()
+            self._counters.clear()
+            self._timings.clear()
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,92 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def view_path(view_func):
+    # DRF function/class views keep the original name on `cls`
+    view = getattr(view_func, 'cls', view_func)
+    return f"{view.__module__}.{view.__name__}"
+
+
+class ProfilingMiddleware:
+    """
+    Record DB queries, cache hits/misses, Firebase calls and latency for each
+    request. Results are sent back as a `Server-Timing` header and aggregated
+    in `core.metrics.registry` (served by /api/app/metrics).
+
+    Views listed in VIEW_QUERY_BUDGETS that run more queries than allowed are
+    logged, or raise QueryBudgetExceeded when ENFORCE_QUERY_BUDGETS is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(self._count_query))
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        total = time.perf_counter() - start
+
+        view = getattr(request, 'profiling_view', None)
+        if view is not None:
+            metrics.registry.record(
+                view,
+                latency_ms=total * 1000,
+                db_queries=request_metrics.db_queries,
+                db_ms=request_metrics.db_time * 1000,
+                cache_hits=request_metrics.cache_hits,
+                cache_misses=request_metrics.cache_misses,
+                firebase_calls=request_metrics.firebase_calls,
+                firebase_ms=request_metrics.firebase_time * 1000,
+            )
+            self._check_budget(view, request_metrics.db_queries)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={request_metrics.db_time * 1000:.1f};desc="{request_metrics.db_queries} queries"',
+            f'cache;desc="{request_metrics.cache_hits} hits {request_metrics.cache_misses} misses"',
+            f'firebase;dur={request_metrics.firebase_time * 1000:.1f};desc="{request_metrics.firebase_calls} calls"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profiling_view = view_path(view_func)
+
+    @staticmethod
+    def _count_query(execute, sql, params, many, context):
+        request_metrics = metrics.current_request()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if request_metrics is not None:
+                request_metrics.db_queries += 1
+                request_metrics.db_time += time.perf_counter() - start
+
+    @staticmethod
+    def _check_budget(view, db_queries):
+        budget = settings.VIEW_QUERY_BUDGETS.get(view)
+        if budget is None or db_queries <= budget:
+            return
+        message = f"{view} ran {db_queries} queries (budget {budget})"
+        if settings.ENFORCE_QUERY_BUDGETS:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,60 @@
+import logging
+from urllib.parse import parse_qs
+
+import jwt
+from asgiref.sync import sync_to_async
+from channels.middleware import BaseMiddleware
+
+from app.models import User
+from chat.cache import get_profile
+from utils.token_verifier import token_verifier
+
+logger = logging.getLogger(__name__)
+
+
+def get_token(scope):
+    """
+    Access token of a websocket handshake: `?token=` (browsers cannot set
+    headers on a WebSocket) or an `Authorization: Bearer` header.
+    """
+    token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if token:
+        return token[0]
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            value = value.decode()
+            if value.startswith('Bearer '):
+                return value[len('Bearer '):]
+    return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Verifies the access token once per connection and sets `scope['user']`
+    to {'id', 'role', 'username'}, or None when the token is missing,
+    expired, revoked or belongs to an unknown user.
+
+    Both lookups are cached per process: the token through token_verifier
+    (revocations evict it on every process) and the profile through
+    chat.cache, so a reconnect storm does not reach Redis or the database
+    once per socket.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope, user=await self.authenticate(scope))
+        return await super().__call__(scope, receive, send)
+
+    @staticmethod
+    async def authenticate(scope):
+        token = get_token(scope)
+        if not token:
+            return None
+        try:
+            payload = await sync_to_async(token_verifier.verify, thread_sensitive=False)(token)
+            profile = await get_profile(payload.get('id'))
+        except (jwt.InvalidTokenError, User.DoesNotExist):
+            return None
+        except Exception as e:
+            logger.error(f"Websocket authentication failed: {e}")
+            return None
+        return {'id': profile['id'], 'role': payload.get('role'), 'username': profile['username']}
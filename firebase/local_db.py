@@ -0,0 +1,193 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from firebase.push_id import generate_push_id
+
+
+class LocalDatabase:
+    """
+    In-memory stand-in for firebase_admin.db, used to benchmark and test
+    Firebase writes offline. `latency` (seconds) is slept on every call to
+    simulate the HTTPS round-trip of the real Realtime Database.
+    """
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.calls = 0
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def reference(self, path='/'):
+        return LocalReference(self, path)
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.data = {}
+
+    # Internal helpers
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _segments(path):
+        return [segment for segment in path.split('/') if segment]
+
+    def _get(self, segments):
+        node = self.data
+        for segment in segments:
+            if not isinstance(node, dict) or segment not in node:
+                return None
+            node = node[segment]
+        return copy.deepcopy(node)
+
+    def _resolve(self, segments, value):
+        # Server values: only {".sv": {"increment": n}} is supported
+        if isinstance(value, dict) and set(value) == {'.sv'}:
+            current = self._get(segments)
+            if not isinstance(current, (int, float)) or isinstance(current, bool):
+                current = 0
+            return current + value['.sv']['increment']
+        return value
+
+    def _set(self, segments, value):
+        value = self._resolve(segments, value)
+        if not segments:
+            self.data = value if isinstance(value, dict) else {}
+            return
+        if value is None:
+            self._delete(segments)
+            return
+        node = self.data
+        for segment in segments[:-1]:
+            if not isinstance(node.get(segment), dict):
+                node[segment] = {}
+            node = node[segment]
+        node[segments[-1]] = copy.deepcopy(value)
+
+    def _delete(self, segments):
+        if not segments:
+            self.data = {}
+            return
+        parents = []
+        node = self.data
+        for segment in segments[:-1]:
+            if not isinstance(node, dict) or segment not in node:
+                return
+            parents.append((node, segment))
+            node = node[segment]
+        if isinstance(node, dict):
+            node.pop(segments[-1], None)
+        # Firebase does not keep empty nodes around
+        for parent, segment in reversed(parents):
+            if parent[segment] == {}:
+                del parent[segment]
+
+
+class LocalReference:
+    def __init__(self, database, path):
+        self._database = database
+        self._segments = LocalDatabase._segments(path)
+
+    @property
+    def key(self):
+        return self._segments[-1] if self._segments else None
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self._segments)
+
+    def child(self, path):
+        return LocalReference(self._database, f"{self.path}/{path}")
+
+    def get(self):
+        self._database._round_trip()
+        with self._database._lock:
+            return self._database._get(self._segments)
+
+    def order_by_key(self):
+        return LocalQuery(self)
+
+    def set(self, value):
+        self._database._round_trip()
+        with self._database._lock:
+            self._database._set(self._segments, value)
+
+    def push(self, value=''):
+        if value is None:
+            raise ValueError('Value must not be None.')
+        self._database._round_trip()
+        key = generate_push_id()
+        with self._database._lock:
+            self._database._set(self._segments + [key], value)
+        return self.child(key)
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        self._database._round_trip()
+        with self._database._lock:
+            # Multi-path update: every key is a path relative to this reference
+            for child_path, child_value in value.items():
+                segments = self._segments + LocalDatabase._segments(child_path)
+                self._database._set(segments, child_value)
+
+    def delete(self):
+        self._database._round_trip()
+        with self._database._lock:
+            self._database._delete(self._segments)
+
+
+class LocalQuery:
+    """
+    Key-ordered query (`order_by_key()`), with the same range and limit
+    semantics as firebase_admin.db.Query.
+    """
+
+    def __init__(self, reference):
+        self._reference = reference
+        self._start = self._end = None
+        self._limit_first = self._limit_last = None
+
+    def start_at(self, start):
+        if start is None:
+            raise ValueError('Start value must not be None.')
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        if end is None:
+            raise ValueError('End value must not be None.')
+        self._end = end
+        return self
+
+    def equal_to(self, value):
+        return self.start_at(value).end_at(value)
+
+    def limit_to_first(self, limit):
+        self._limit_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_last = limit
+        return self
+
+    def get(self):
+        node = self._reference.get()
+        if not isinstance(node, dict):
+            return node
+        keys = sorted(
+            key for key in node
+            if (self._start is None or key >= self._start) and (self._end is None or key <= self._end)
+        )
+        if self._limit_first is not None:
+            keys = keys[:self._limit_first]
+        if self._limit_last is not None:
+            keys = keys[-self._limit_last:] if self._limit_last else []
+        return OrderedDict((key, node[key]) for key in keys)
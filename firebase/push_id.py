@@ -0,0 +1,52 @@
+import random
+import threading
+import time
+
+# Same alphabet and layout as the Firebase client SDKs, so keys generated here
+# sort chronologically next to keys created by ref.push() on the server.
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+_last_push_time = 0
+_last_rand_chars = [0] * 12
+_random = random.SystemRandom()
+_lock = threading.Lock()
+
+
+def generate_push_id():
+    """
+    Generate a Firebase push key locally (8 timestamp chars + 12 random chars).
+    """
+    global _last_push_time, _last_rand_chars
+
+    with _lock:
+        now = int(time.time() * 1000)
+        duplicate_time = now == _last_push_time
+        _last_push_time = now
+
+        time_chars = []
+        for _ in range(8):
+            time_chars.append(PUSH_CHARS[now % 64])
+            now //= 64
+        push_id = ''.join(reversed(time_chars))
+
+        if not duplicate_time:
+            _last_rand_chars = [_random.randrange(64) for _ in range(12)]
+        else:
+            # Same millisecond: increment the random part so keys stay ordered
+            i = 11
+            while i >= 0 and _last_rand_chars[i] == 63:
+                _last_rand_chars[i] = 0
+                i -= 1
+            if i >= 0:
+                _last_rand_chars[i] += 1
+
+        return push_id + ''.join(PUSH_CHARS[c] for c in _last_rand_chars)
+
+
+def parse_push_id(value):
+    """
+    `value` if it is shaped like a push key; raises ValueError otherwise.
+    """
+    if not isinstance(value, str) or len(value) != 20 or any(char not in PUSH_CHARS for char in value):
+        raise ValueError(f"Invalid push id: {value!r}")
+    return value
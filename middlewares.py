@@ -5,8 +5,7 @@ from functools import wraps
 from utils.jwt import decode_token
 from utils.response import failure_response
 import jwt
-from utils.redis import get_cache
-from core.settings import JWT_SECRET
+from utils.token_verifier import TokenRevoked, token_verifier
 
 
 def auth_middleware(view_func):
@@ -21,28 +20,22 @@ def auth_middleware(view_func):
         if not token:
             return failure_response(message="Access token missing", status_code=status.HTTP_401_UNAUTHORIZED)
         try:
-            if get_cache(f'access_token:{token}') == None:
-                return failure_response(message="Invalid token", status_code=status.HTTP_401_UNAUTHORIZED)
-
-            decoded = jwt.decode(
-                token,
-                key=JWT_SECRET,
-                algorithms=["HS256"],
-                options={"verify_exp": True},
-            )
+            decoded = token_verifier.verify(token)
 
             request.user = {
                 "id": decoded.get("id"),
                 "role": decoded.get("role"),
                 "access_token": token
             }
-
-            return view_func(request, *args, **kwargs)
+        except TokenRevoked:
+            return failure_response(message="Invalid token", status_code=status.HTTP_401_UNAUTHORIZED)
         except jwt.ExpiredSignatureError:
             return failure_response(message="Token expire", status_code=status.HTTP_401_UNAUTHORIZED)
         except jwt.InvalidTokenError as e:
             return failure_response(message="Token invalid", status_code=status.HTTP_401_UNAUTHORIZED)
 
+        return view_func(request, *args, **kwargs)
+
     return wrapper
 
 
@@ -0,0 +1,59 @@
+import logging
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from notifications.realtime import listeners, notification_group
+from user import presence
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes the notifications and invitations of the connected user as
+    {"action": "notification", "kind", "notification"} frames. While a
+    socket is open new notifications skip the Firebase mirror; missed ones
+    are read from /api/notification/all after a reconnect.
+    """
+
+    async def connect(self):
+        # Set by core.websocket_auth.JWTAuthMiddleware
+        user = self.scope.get('user')
+        if not user:
+            # 4401: missing or invalid access token. Accepted first: a close
+            # before accept() reaches the client as an HTTP 403 without the code
+            await self.accept()
+            await self.close(code=4401)
+            return
+
+        try:
+            self.user_id = user['id']
+            self.group_name = notification_group(self.user_id)
+            await self.channel_layer.group_add(self.group_name, self.channel_name)
+            await listeners.connect(self.user_id)
+            await presence.tracker.connect(self.user_id)
+            await self.accept()
+        except Exception as e:
+            logger.error(f"Error during notification websocket connect: {e}")
+            await self.close()
+
+    async def disconnect(self, close_code):
+        if not getattr(self, 'user_id', None):
+            return
+        try:
+            await listeners.disconnect(self.user_id)
+            await presence.tracker.disconnect(self.user_id)
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        except Exception as e:
+            logger.error(f"Error during notification websocket disconnect: {e}")
+
+    async def receive_json(self, content, **kwargs):
+        # Read state changes go through the HTTP API
+        await self.send_json({"error": "invalid action"})
+
+    async def notification_message(self, event):
+        await self.send_json({
+            "action": "notification",
+            "kind": event["kind"],
+            "notification": event["notification"],
+        })
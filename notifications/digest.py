@@ -0,0 +1,156 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from app.models import NotificationDigestEvent
+from core.metrics import registry
+from notifications.store import TIME_FORMAT, NotificationStore
+
+# Content of the digest replacing several events of one type
+DIGEST_TEMPLATES = {
+    'project_joined': "{count} people joined {subject}",
+    'task_joined': "{count} people joined {subject}",
+    'invitation_accepted': "{count} people accepted your invitation to {subject}",
+}
+# Actors listed in a digest's data
+MAX_DIGEST_ACTORS = 10
+
+
+@dataclass
+class DigestEvent:
+    recipient_id: str
+    # A DIGEST_TEMPLATES key
+    event: str
+    # Project or task the event is about, and its name
+    subject_id: str
+    subject: str
+    # Who caused it, e.g. the email of the user who joined
+    actor: str
+    # Notification sent when the event is alone in its window
+    payload: dict = field(default_factory=dict)
+
+    @property
+    def key(self):
+        return str(self.recipient_id), self.event, str(self.subject_id)
+
+
+def digest_payload(events):
+    """
+    One notification for the events of a window: the event's own payload
+    when a single actor caused them, a "N people ..." digest otherwise.
+    """
+    last = events[-1]
+    actors = list(dict.fromkeys(event.actor for event in events))
+    if len(actors) == 1:
+        return last.payload
+
+    now = datetime.utcnow().strftime(TIME_FORMAT)
+    return {
+        "title": last.subject,
+        "content": DIGEST_TEMPLATES[last.event].format(count=len(actors), subject=last.subject),
+        "is_read": False,
+        "type": "digest",
+        "event": last.event,
+        "subject_id": str(last.subject_id),
+        "count": len(actors),
+        "actors": actors[-MAX_DIGEST_ACTORS:],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class DigestEngine:
+    """
+    Coalescing stage in front of NotificationStore.
+
+    submit() records the events in the notification_digest_event table, in
+    the caller's transaction, so pending events survive a killed worker and
+    are shared by every process. flush_due(), run by the
+    `flush_notification_digests` Celery task every NOTIFICATION_DIGEST_TICK
+    seconds, merges the events with the same recipient, type and subject
+    into one notification (see digest_payload) once the first of them is
+    `window` seconds old. With `window` 0 events are delivered right away.
+
+    Counters: notifications.digest.events_in, notifications.digest.notifications_out.
+    """
+
+    def __init__(self, window=None, batch_size=500):
+        self.window = settings.NOTIFICATION_DIGEST_WINDOW if window is None else window
+        # Windows delivered per transaction
+        self.batch_size = batch_size
+
+    def __len__(self):
+        return NotificationDigestEvent.objects.count()
+
+    def submit(self, events):
+        events = list(events)
+        if not events:
+            return
+        registry.increment('notifications.digest.events_in', len(events))
+        if self.window <= 0:
+            self._deliver([[event] for event in events])
+            return
+
+        NotificationDigestEvent.objects.bulk_create([
+            NotificationDigestEvent(
+                recipient_id=event.recipient_id, event=event.event, subject_id=str(event.subject_id),
+                subject=event.subject, actor=event.actor, payload=event.payload,
+            )
+            for event in events
+        ])
+
+    def flush_due(self, now=None):
+        """
+        Deliver the windows that closed; returns the number of notifications written.
+        """
+        cutoff = (now or timezone.now()) - timedelta(seconds=self.window)
+        total = 0
+        while True:
+            delivered = self._flush_batch(cutoff)
+            total += delivered
+            if delivered < self.batch_size:
+                return total
+
+    def _flush_batch(self, cutoff):
+        with transaction.atomic():
+            keys = list(
+                NotificationDigestEvent.objects
+                .values('recipient_id', 'event', 'subject_id')
+                .annotate(first=Min('created_at'))
+                .filter(first__lte=cutoff)
+                .order_by('first')[:self.batch_size]
+            )
+            if not keys:
+                return 0
+            match = Q()
+            for key in keys:
+                match |= Q(recipient_id=key['recipient_id'], event=key['event'], subject_id=key['subject_id'])
+            # Windows another flush is delivering are skipped, not delivered twice
+            rows = list(
+                NotificationDigestEvent.objects.select_for_update(skip_locked=True)
+                .filter(match).order_by('created_at', 'id')
+            )
+
+            batches = {}
+            for row in rows:
+                event = DigestEvent(row.recipient_id, row.event, row.subject_id, row.subject, row.actor, row.payload)
+                batches.setdefault(event.key, []).append(event)
+            NotificationDigestEvent.objects.filter(id__in=[row.id for row in rows]).delete()
+            return self._deliver(list(batches.values()))
+
+    def _deliver(self, batches):
+        if not batches:
+            return 0
+        notifications = NotificationStore()
+        for events in batches:
+            notifications.notify(events[0].recipient_id, digest_payload(events))
+        notifications.save()
+        registry.increment('notifications.digest.notifications_out', len(batches))
+        return len(batches)
+
+
+engine = DigestEngine()
@@ -0,0 +1,61 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from user import presence
+
+logger = logging.getLogger(__name__)
+
+# Sockets of /ws/notifications/, tracked apart from general presence: a user
+# in a chat room with an older client still reads notifications from Firebase
+listeners = presence.PresenceTracker(key=settings.NOTIFICATION_PRESENCE_KEY)
+
+
+def notification_group(user_id):
+    return f"notifications_{user_id}"
+
+
+def is_shared_layer():
+    """
+    Whether group_send from this process reaches sockets held by others: an
+    in-memory layer only reaches this process's own.
+    """
+    return settings.CHANNEL_LAYERS['default']['BACKEND'] != 'channels.layers.InMemoryChannelLayer'
+
+
+def get_listening(user_ids):
+    """
+    Ids (as str) of the users with a notification socket open, or None when
+    presence is unavailable or a push could not reach them (no shared
+    channel layer), in which case everyone is mirrored.
+    """
+    if not is_shared_layer():
+        return None
+    return presence.get_online(user_ids, key=settings.NOTIFICATION_PRESENCE_KEY)
+
+
+def publish(events):
+    """
+    Send (user_id, kind, notification) events to the users' notification
+    sockets. Runs after commit; a failure is logged, the rows are already
+    stored and the client catches up on its next read.
+    """
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    send = async_to_sync(_group_send)
+    try:
+        send(layer, events)
+    except Exception as e:
+        logger.error(f"Notification push failed: {e}")
+
+
+async def _group_send(layer, events):
+    for user_id, kind, notification in events:
+        await layer.group_send(notification_group(user_id), {
+            'type': 'notification.message',
+            'kind': kind,
+            'notification': notification,
+        })
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 
@@ -11,4 +12,25 @@ class NotificationsRequestCreateSerializers(serializers.Serializer):
     is_read = serializers.BooleanField(default = False)
 
 class NotificationRequestUpdateStatusSerializers(serializers.Serializer):
-    notification_id = serializers.CharField(required=True)
\ No newline at end of file
+    notification_id = serializers.CharField(required=True)
+
+class NotificationsWindowSerializers(serializers.Serializer):
+    limit = serializers.IntegerField(default=20, min_value=1, max_value=100)
+    before = serializers.CharField(required=False)
+    unread_only = serializers.BooleanField(default=False)
+    kind = serializers.ChoiceField(choices=['notification', 'invitation'], default='notification')
+
+class NotificationsBulkSerializers(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        allow_empty=False,
+        max_length=settings.BULK_ACTION_MAX_IDS,
+    )
+    # Everything created before this time
+    before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('before' in attrs):
+            raise serializers.ValidationError("Provide either ids or before")
+        return attrs
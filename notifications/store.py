@@ -0,0 +1,217 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from app.models import Notification
+from notifications import realtime
+from notifications.dispatcher import INVITED_NOTIFICATIONS_PATH, NotificationDispatcher
+from utils.pagination import encode_cursor, keyset_filter
+
+# Payload keys stored in their own columns, the rest goes to Notification.data
+COLUMN_KEYS = ('title', 'content', 'is_read', 'sender_id')
+# Timestamps are set by the database row, not taken from the payload
+TIMESTAMP_KEYS = ('created_at', 'updated_at')
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def to_row(recipient_id, kind, payload):
+    data = {key: value for key, value in payload.items() if key not in COLUMN_KEYS + TIMESTAMP_KEYS}
+    return Notification(
+        recipient_id=recipient_id,
+        sender_id=payload.get('sender_id'),
+        kind=kind,
+        title=payload.get('title') or '',
+        content=payload.get('content') or '',
+        data=data,
+        is_read=bool(payload.get('is_read')),
+    )
+
+
+def to_payload(notification):
+    """
+    The Firebase-shaped dict of a row, as clients have always received it.
+    """
+    return {
+        **notification.data,
+        'title': notification.title,
+        'content': notification.content,
+        'is_read': notification.is_read,
+        'sender_id': str(notification.sender_id) if notification.sender_id else None,
+        'created_at': notification.created_at.strftime(TIME_FORMAT),
+        'updated_at': notification.updated_at.strftime(TIME_FORMAT) if notification.updated_at else None,
+    }
+
+
+class NotificationStore:
+    """
+    Collect the notifications and invitations of one request and insert them
+    with one bulk INSERT. The table is the source of truth.
+
+    After commit each row is pushed to the recipient's /ws/notifications/
+    sockets. Recipients without one open get it mirrored to Firebase under
+    the same key instead (through NotificationDispatcher, so after commit or
+    from the outbox) for clients that still listen there.
+
+    Usage:
+        notifications = NotificationStore()
+        notifications.notify(user_id, data)
+        notifications.save()
+    """
+
+    def __init__(self, dispatcher=None, mirror=None):
+        self.dispatcher = dispatcher if dispatcher is not None else NotificationDispatcher()
+        self.mirror = settings.NOTIFICATION_FIREBASE_MIRROR if mirror is None else mirror
+        self._rows = []
+
+    def __len__(self):
+        return len(self._rows)
+
+    def notify(self, recipient_id, payload):
+        return self._add(recipient_id, 'notification', payload)
+
+    def invite(self, recipient_id, payload):
+        return self._add(recipient_id, 'invitation', payload)
+
+    def _add(self, recipient_id, kind, payload):
+        row = to_row(recipient_id, kind, payload)
+        self._rows.append((row, payload))
+        return row.id
+
+    def remove_invitation(self, recipient_id, notification_id):
+        """
+        Delete an invitation (accepted or declined); returns whether it existed.
+        """
+        deleted, _ = Notification.objects.filter(
+            id=notification_id, recipient_id=recipient_id, kind='invitation'
+        ).delete()
+        if self.mirror:
+            self.dispatcher.delete(f"{INVITED_NOTIFICATIONS_PATH}/{recipient_id}/{notification_id}")
+        return bool(deleted)
+
+    def mark_read(self, recipient_id, notification_ids=None, before=None):
+        """
+        Mark the recipient's notifications in `notification_ids`, or the
+        oldest BULK_ACTION_MAX_IDS created before `before`, read with one
+        UPDATE; returns the ids that were unread.
+        """
+        with transaction.atomic():
+            rows = self._select(recipient_id, notification_ids, before, 'id', 'mirrored', is_read=False)
+            if not rows:
+                return []
+
+            now = timezone.now()
+            unread_ids = [row_id for row_id, _ in rows]
+            Notification.objects.filter(id__in=unread_ids).update(is_read=True, updated_at=now)
+        if self.mirror:
+            values = {'is_read': True, 'updated_at': now.strftime(TIME_FORMAT)}
+            for row_id, mirrored in rows:
+                if mirrored:
+                    self.dispatcher.mark_notification_read(recipient_id, row_id, values, was_unread=True)
+        return unread_ids
+
+    def delete(self, recipient_id, notification_ids=None, before=None):
+        """
+        Delete the recipient's notifications in `notification_ids`, or the
+        oldest BULK_ACTION_MAX_IDS created before `before`, with one DELETE;
+        returns the deleted ids.
+        """
+        with transaction.atomic():
+            rows = self._select(recipient_id, notification_ids, before, 'id', 'is_read', 'mirrored')
+            if not rows:
+                return []
+
+            deleted_ids = [row_id for row_id, _, _ in rows]
+            Notification.objects.filter(id__in=deleted_ids).delete()
+        if self.mirror:
+            for row_id, is_read, mirrored in rows:
+                if mirrored:
+                    self.dispatcher.delete_notification(recipient_id, row_id, was_unread=not is_read)
+        return deleted_ids
+
+    @staticmethod
+    def _select(recipient_id, notification_ids, before, *fields, **filters):
+        """
+        Lock the rows until the transaction ends, so a concurrent request
+        waits and then no longer sees them as unread or present, and the
+        Firebase counter is only decremented once.
+        """
+        queryset = Notification.objects.filter(recipient_id=recipient_id, kind='notification', **filters)
+        if notification_ids is not None:
+            queryset = queryset.filter(id__in=list(notification_ids))
+        if before is not None:
+            queryset = queryset.filter(created_at__lt=before)
+        queryset = queryset.select_for_update().order_by('created_at', 'id')
+        if before is not None:
+            queryset = queryset[:settings.BULK_ACTION_MAX_IDS]
+        return list(queryset.values_list(*fields))
+
+    def save(self):
+        """
+        Insert the collected rows and schedule the pushes and the Firebase
+        mirror. Call it inside the caller's transaction so both land together.
+        """
+        collected, self._rows = self._rows, []
+        rows = [row for row, _ in collected]
+        if rows:
+            # One presence lookup for every recipient; None (no Redis) pushes and mirrors all
+            listening = realtime.get_listening({row.recipient_id for row in rows})
+            for row, payload in collected:
+                row.mirrored = self.mirror and (listening is None or str(row.recipient_id) not in listening)
+                if row.mirrored:
+                    self._mirror(row, payload)
+            Notification.objects.bulk_create(rows, batch_size=500)
+
+            events = [
+                (row.recipient_id, row.kind, {'id': row.id, **to_payload(row)})
+                for row in rows if listening is None or str(row.recipient_id) in listening
+            ]
+            if events:
+                transaction.on_commit(lambda: realtime.publish(events), robust=True)
+        if self.mirror:
+            self.dispatcher.flush_on_commit()
+        return rows
+
+    def _mirror(self, row, payload):
+        if row.kind == 'invitation':
+            self.dispatcher.push(f"{INVITED_NOTIFICATIONS_PATH}/{row.recipient_id}", payload, key=row.id)
+        else:
+            self.dispatcher.push_notification(row.recipient_id, payload, key=row.id)
+
+
+def read_notifications(recipient_id, limit, cursor=None, unread_only=False, kind='notification'):
+    """
+    The `limit` newest notifications older than `cursor` (a decoded
+    pagination cursor), newest first, with the cursor of the next window or
+    None at the end. Served by the (recipient, kind|is_read, created_at)
+    indexes.
+    """
+    queryset = Notification.objects.filter(recipient_id=recipient_id, kind=kind)
+    if unread_only:
+        queryset = queryset.filter(is_read=False)
+    if cursor:
+        queryset = keyset_filter(queryset, 'created_at', cursor)
+
+    rows = list(queryset.order_by('-created_at', '-id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_before = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    return rows, next_before
+
+
+def get_unread_count(recipient_id):
+    return Notification.objects.filter(recipient_id=recipient_id, kind='notification', is_read=False).count()
+
+
+def mirrored_unread_counts(recipient_ids):
+    """
+    {recipient id: unread notifications mirrored to Firebase}, the value of
+    their unread counter there, in one query.
+    """
+    recipient_ids = {str(recipient_id) for recipient_id in recipient_ids}
+    counts = (
+        Notification.objects
+        .filter(recipient_id__in=recipient_ids, kind='notification', is_read=False, mirrored=True)
+        .values('recipient_id').annotate(count=Count('id')).values_list('recipient_id', 'count')
+    )
+    return {**dict.fromkeys(recipient_ids, 0), **{str(recipient_id): count for recipient_id, count in counts}}
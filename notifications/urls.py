@@ -1,10 +1,12 @@
 from django.urls import path
 
-from notifications.views import get_all_notifications_by_user, seen_notification_by_user, send_notifications_to_user
+from notifications.views import bulk_delete_notifications, bulk_seen_notifications, get_all_notifications_by_user, seen_notification_by_user, send_notifications_to_user
 
 
 urlpatterns = [
     path('all', get_all_notifications_by_user),
     path('create', send_notifications_to_user),
     path('update-status', seen_notification_by_user),
+    path('bulk-update-status', bulk_seen_notifications),
+    path('bulk-delete', bulk_delete_notifications),
 ]
@@ -5,30 +5,66 @@ from rest_framework.decorators import api_view
 from drf_yasg.utils import swagger_auto_schema
 from app.models import User
 from middlewares import auth_middleware
-from notifications.serializers import  NotificationsRequestCreateSerializers
+from notifications.serializers import  NotificationsBulkSerializers, NotificationsRequestCreateSerializers, NotificationsWindowSerializers
 from utils.response import failure_response, success_response
-from firebase.firebase_config import db
+from notifications.store import NotificationStore, get_unread_count, read_notifications, to_payload
+from firebase.push_id import parse_push_id
+from utils.pagination import decode_cursor
 from rest_framework import status
+from django.db import transaction
+from django.conf import settings
 
 @api_view(['GET'])
 @auth_middleware
 def get_all_notifications_by_user(request):
     """
-    Lấy tất cả thông báo của người dùng dựa trên ID.
+    Lấy thông báo của người dùng dựa trên ID, mới nhất trước.
+
+    Reads one window of `limit` notifications from the notification table;
+    pass `before` (the pagination cursor of the previous window) for older
+    ones, `unread_only=true` to skip read ones and `kind=invitation` for
+    pending invitations.
     """
-    user_id = request.user['id']
+    query = NotificationsWindowSerializers(data=request.query_params)
+    if not query.is_valid():
+        return failure_response(
+            message="Validation errors",
+            data=query.errors
+        )
 
-    ref = db.reference(f"notifications/{user_id}")
+    cursor = None
+    if query.validated_data.get('before'):
+        try:
+            cursor = decode_cursor(query.validated_data['before'], parse_id=parse_push_id)
+        except ValueError:
+            return failure_response(
+                message="Validation errors",
+                data={'before': 'invalid cursor'}
+            )
 
-    snapshot = ref.get()
+    user_id = request.user['id']
+    limit = query.validated_data['limit']
+    rows, next_before = read_notifications(
+        user_id, limit,
+        cursor=cursor,
+        unread_only=query.validated_data['unread_only'],
+        kind=query.validated_data['kind'],
+    )
+    notifications = {row.id: to_payload(row) for row in rows}
+    unread = get_unread_count(user_id)
 
-    if not snapshot:
+    if not notifications:
         return failure_response(
             message='No notifications found',
-            data=snapshot
+            data={'unread': unread}
         )
 
-    return success_response(message='successfully', data=snapshot)
+    return success_response(message='successfully', data=notifications, paginator={
+        'limit': limit,
+        'before': next_before,
+        'has_more': next_before is not None,
+        'unread': unread,
+    })
 
 
 @api_view(['POST'])
@@ -57,15 +93,13 @@ def send_notifications_to_user(request):
     notification_data['updated_at'] = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
     
     user_id = notification_data['user_id']
-    ref = db.reference(f"notifications/{UUID(user_id)}")
-    
-    # Uncomment the following line if you need to save the notification
-    snapshot = ref.push(notification_data) 
+    notifications = NotificationStore()
+    notification_id = notifications.notify(UUID(user_id), notification_data)
+    notifications.save()
 
     return success_response(
         message="Notification sent successfully",
-        # Uncomment this line if you need to return the notification ID
-        data={"notification_id": snapshot.key}
+        data={"notification_id": notification_id}
     )
 
 @api_view(['PATCH'])
@@ -84,16 +118,74 @@ def seen_notification_by_user(request):
                 }
             )
 
-        ref = db.reference(f"notifications/{user_id}/{notification_id}")
-
-        ref.update({
-            "is_read":True,
-            "updated_at": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        })
+        notifications = NotificationStore()
+        notifications.mark_read(user_id, [notification_id])
+        notifications.save()
 
         return success_response(message="update successfully")
     except Exception as e:
         return failure_response(
            message=str(e),
            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+def _bulk_update_notifications(request, action):
+    req_body = NotificationsBulkSerializers(data=request.data)
+    if not req_body.is_valid():
+        return failure_response(
+            message="Validation errors",
+            data=req_body.errors
+        )
+    try:
+        user_id = request.user['id']
+        notifications = NotificationStore()
+        with transaction.atomic():
+            changed = getattr(notifications, action)(
+                user_id,
+                notification_ids=req_body.validated_data.get('ids'),
+                before=req_body.validated_data.get('before'),
+            )
+            notifications.save()
+
+        return success_response(
+            message="update successfully" if action == 'mark_read' else "delete successfully",
+            data={
+                "changed": len(changed),
+                "unread": get_unread_count(user_id),
+                # `before` handles BULK_ACTION_MAX_IDS rows per call: repeat while true
+                "has_more": 'before' in req_body.validated_data and len(changed) >= settings.BULK_ACTION_MAX_IDS,
+            }
+        )
+    except Exception as e:
+        return failure_response(
+            message="An unexpected error occurred",
+            data=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Mark many notifications read: a list of ids or everything before a time",
+    tags=["Notifications"],
+    request_body=NotificationsBulkSerializers,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+def bulk_seen_notifications(request):
+    return _bulk_update_notifications(request, 'mark_read')
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Delete many notifications: a list of ids or everything before a time",
+    tags=["Notifications"],
+    request_body=NotificationsBulkSerializers,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+def bulk_delete_notifications(request):
+    return _bulk_update_notifications(request, 'delete')
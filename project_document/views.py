@@ -6,7 +6,7 @@ from django.db.models import Q
 from app.models import Project, ProjectDocument, User
 from middlewares import auth_middleware
 from project_document.serializers import CreateProjectDocumentSerializer, ProjectDocumentSerializer
-from utils.pagination import Pagination
+from utils.pagination import InvalidCursor, get_paginator
 from utils.response import failure_response, success_response
 
 # Create your views here.
@@ -71,8 +71,14 @@ def get_all_document(request):
             owner = user_id
         )
 
-        paginator = Pagination()
-        paginated_document = paginator.paginate_queryset(query_set,request)
+        paginator = get_paginator(request)
+        try:
+            paginated_document = paginator.paginate_queryset(query_set,request)
+        except InvalidCursor:
+            return failure_response(
+                message="Validation errors",
+                data={'cursor': 'invalid cursor'}
+            )
 
         data = ProjectDocumentSerializer(paginated_document, many=True).data
         return success_response(
@@ -1,7 +1,7 @@
 from app.models import Project, ProjectDocument, Task, User
 from rest_framework import serializers
 import django_filters
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 
 class CreateProjectSerializers(serializers.Serializer):
     name = serializers.CharField(
@@ -114,23 +114,34 @@ class ListTaskInProjectSerializer(serializers.ModelSerializer):
 class ListDocumentInProjectSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProjectDocument
-        fields = ['id', 'name', 'is_deleted']
+        fields = ['id', 'name']
 
 class ListProjectSerializer(serializers.ModelSerializer):
-    tasks = serializers.SerializerMethodField()
-    documents = serializers.SerializerMethodField()
+    """
+    Project sidebar. Expects a queryset prepared by `setup_queryset`, so a
+    page costs a fixed number of queries whatever its size.
+    """
+    tasks = ListTaskInProjectSerializer(source='active_tasks', many=True, read_only=True)
+    documents = ListDocumentInProjectSerializer(source='document_list', many=True, read_only=True)
 
     class Meta:
         model = Project
         fields = ['id', 'name', 'tasks', 'documents']
 
-    def get_tasks(self, obj):
-        tasks = Task.objects.filter(project_id=obj.id)
-        return ListTaskInProjectSerializer(tasks, many=True).data
-
-    def get_documents(self, obj):
-        documents = ProjectDocument.objects.filter(project_id=obj.id)
-        return ListDocumentInProjectSerializer(documents, many=True).data
+    @staticmethod
+    def setup_queryset(queryset):
+        return queryset.only('id', 'name', 'created_at').prefetch_related(
+            Prefetch(
+                'tasks',
+                queryset=Task.objects.only('id', 'title', 'is_deleted', 'project_id'),
+                to_attr='active_tasks',
+            ),
+            Prefetch(
+                'projectdocument_set',
+                queryset=ProjectDocument.objects.only('id', 'name', 'project_id'),
+                to_attr='document_list',
+            ),
+        )
 """
 Serializers for swagger
 """
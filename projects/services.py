@@ -0,0 +1,106 @@
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from app.models import Project, Task, User
+from utils.bulk_actions import bulk_set_deleted, parse_uuids
+
+ProjectMember = Project.members.through
+
+
+@dataclass
+class MembershipResult:
+    changed: set = field(default_factory=set)
+    unchanged: set = field(default_factory=set)
+    invalid: set = field(default_factory=set)
+
+
+def _resolve_users(member_ids):
+    valid, invalid = parse_uuids(member_ids)
+    existing = set(User.objects.filter(id__in=valid.keys()).values_list('id', flat=True))
+    invalid |= {valid[member_id] for member_id in valid.keys() - existing}
+    return existing, invalid
+
+
+def _current_members(project, user_ids):
+    return set(
+        ProjectMember.objects
+        .filter(project_id=project.id, user_id__in=user_ids)
+        .values_list('user_id', flat=True)
+    )
+
+
+def add_members(project, member_ids):
+    """
+    Add users to a project in one bulk insert.
+
+    Returns a MembershipResult (changed = added, unchanged = already members).
+    Nothing is written when any id does not match a user.
+    """
+    existing, invalid = _resolve_users(member_ids)
+    already_members = _current_members(project, existing)
+    result = MembershipResult(
+        changed={str(user_id) for user_id in existing - already_members},
+        unchanged={str(user_id) for user_id in already_members},
+        invalid=invalid,
+    )
+    if invalid or not result.changed:
+        result.changed = set()
+        return result
+
+    with transaction.atomic():
+        ProjectMember.objects.bulk_create(
+            [ProjectMember(project_id=project.id, user_id=user_id) for user_id in existing - already_members],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+    return result
+
+
+def remove_members(project, member_ids):
+    """
+    Remove users from a project in one DELETE.
+
+    Returns a MembershipResult (changed = removed, unchanged = not members).
+    Nothing is written when any id is not a user or not a member.
+    """
+    existing, invalid = _resolve_users(member_ids)
+    members = _current_members(project, existing)
+    result = MembershipResult(
+        changed={str(user_id) for user_id in members},
+        unchanged={str(user_id) for user_id in existing - members},
+        invalid=invalid,
+    )
+    if invalid or result.unchanged:
+        result.changed = set()
+        return result
+
+    with transaction.atomic():
+        ProjectMember.objects.filter(project_id=project.id, user_id__in=members).delete()
+    return result
+
+
+def set_projects_deleted(user, project_ids, deleted):
+    """
+    Bulk soft delete / restore for the owner (or an admin).
+
+    Like the single delete endpoint, projects with tasks still due are not
+    deleted. Returns ({project id: outcome}, number changed).
+    """
+    queryset = Project.all_objects.annotate(
+        has_pending_tasks=Exists(
+            Task.objects.filter(project_id=OuterRef('pk'), due_date__gt=timezone.now())
+        )
+    )
+
+    def check(row):
+        if not user['role'] and str(row['owner_id']) != str(user['id']):
+            return 'forbidden'
+        if deleted and row['has_pending_tasks']:
+            return 'incomplete_tasks'
+        return None
+
+    return bulk_set_deleted(
+        queryset, project_ids, deleted, fields=('owner_id', 'has_pending_tasks'), check=check)
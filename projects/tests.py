@@ -1,3 +1,186 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from app.models import Project, ProjectDocument, Task, User
+from projects import services
+from projects.views import get_list_project
+from utils.testing import AuthTestMixin
+from utils.token_verifier import token_verifier
+
+# COUNT + projects page + tasks prefetch + documents prefetch
+LIST_PROJECT_QUERY_BUDGET = 4
+
+
+class ListProjectQueryCountTests(AuthTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='sidebar-owner', email='owner@example.com', password='secret123')
+        other = User.objects.create_user(
+            username='sidebar-other', email='other@example.com', password='secret123')
+
+        for i in range(30):
+            # Half owned by the user, half where the user is only a member
+            owner = cls.user if i % 2 == 0 else other
+            project = Project.objects.create(name=f"Project {i}", owner=owner)
+            project.members.add(cls.user, other)
+            Task.objects.create(title=f"Task {i}-a", project=project)
+            Task.objects.create(title=f"Task {i}-b", project=project)
+            Task.objects.create(title=f"Task {i}-deleted", project=project, is_deleted=True)
+            ProjectDocument.objects.create(project_id=project, name=f"Doc {i}", content='...')
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+
+    def get_list(self, page_size, **params):
+        request = self.factory.get(
+            '/api/project/list', {'page_size': page_size, **params}, **self.auth_headers())
+        return get_list_project(request)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in (1, 10, 30):
+            with self.subTest(page_size=page_size):
+                token_verifier.clear()
+                with self.assertNumQueries(LIST_PROJECT_QUERY_BUDGET):
+                    response = self.get_list(page_size)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['data']), page_size)
+
+    def test_projects_are_not_duplicated_and_deleted_tasks_are_hidden(self):
+        response = self.get_list(50)
+        projects = response.data['data']
+
+        self.assertEqual(response.data['pagination']['total'], 30)
+        self.assertEqual(len({project['id'] for project in projects}), 30)
+        for project in projects:
+            self.assertEqual(len(project['tasks']), 2)
+            self.assertEqual(len(project['documents']), 1)
+            self.assertFalse(any(task['is_deleted'] for task in project['tasks']))
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        expected = [project['id'] for project in self.get_list(50).data['data']]
+
+        seen, pages, cursor = [], [], None
+        while True:
+            params = {'pagination': 'cursor', 'include_total': 'false'}
+            if cursor:
+                params['cursor'] = cursor
+            token_verifier.clear()
+            with self.assertNumQueries(LIST_PROJECT_QUERY_BUDGET - 1):
+                response = self.get_list(7, **params)
+            pagination = response.data['pagination']
+            self.assertIsNone(pagination['total'])
+            pages.append(pagination)
+            seen += [project['id'] for project in response.data['data']]
+            cursor = pagination['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, expected)
+        self.assertIsNone(pages[0]['previous_cursor'])
+
+        response = self.get_list(7, pagination='cursor', cursor=pages[-1]['previous_cursor'])
+        self.assertEqual([project['id'] for project in response.data['data']], expected[21:28])
+        self.assertEqual(response.data['pagination']['total'], 30)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.get_list(7, pagination='cursor', cursor='not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['data'], {'cursor': 'invalid cursor'})
+
+
+class BulkProjectDeleteTests(AuthTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='bulk-owner', email='bulk-owner@example.com')
+        cls.other = User.objects.create(username='bulk-other', email='bulk-other@example.com')
+        cls.projects = [Project.objects.create(name=f"Bulk {i}", owner=cls.owner) for i in range(5)]
+        cls.foreign = Project.objects.create(name='Not mine', owner=cls.other)
+        cls.busy = Project.objects.create(name='Busy', owner=cls.owner)
+        Task.objects.create(title='Due later', project=cls.busy,
+                            due_date=timezone.now() + timedelta(days=1))
+
+    auth_user = 'owner'
+
+    def test_bulk_delete_reports_each_id(self):
+        ids = [str(project.id) for project in self.projects]
+        missing = str(uuid.uuid4())
+
+        response = self.post('/api/project/bulk-delete',
+                             {'ids': ids + [str(self.foreign.id), str(self.busy.id), missing, 'nope']})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['changed'], 5)
+        self.assertEqual({data['results'][project_id] for project_id in ids}, {'deleted'})
+        self.assertEqual(data['results'][str(self.foreign.id)], 'forbidden')
+        self.assertEqual(data['results'][str(self.busy.id)], 'incomplete_tasks')
+        self.assertEqual(data['results'][missing], 'not_found')
+        self.assertEqual(data['results']['nope'], 'invalid_id')
+        self.assertEqual(Project.deleted_objects.count(), 5)
+
+        response = self.post('/api/project/bulk-restore', {'ids': ids[:2]})
+        self.assertEqual(response.json()['data']['changed'], 2)
+        self.assertEqual(Project.deleted_objects.count(), 3)
+
+    def test_bulk_delete_query_count_does_not_depend_on_batch_size(self):
+        for count in (1, 5):
+            with self.subTest(count=count):
+                token_verifier.clear()
+                Project.all_objects.restore()
+                # SELECT ... FOR UPDATE with permission annotations + one UPDATE,
+                # in a transaction (the savepoint and its release here)
+                with self.assertNumQueries(4):
+                    self.post('/api/project/bulk-delete',
+                              {'ids': [str(project.id) for project in self.projects[:count]]})
+
+
+class MembershipServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='members-owner', email='members-owner@example.com')
+        cls.users = User.objects.bulk_create([
+            User(username=f"member-{i}", email=f"member-{i}@example.com") for i in range(20)
+        ])
+        cls.project = Project.objects.create(name='Membership', owner=cls.owner)
+        cls.project.members.add(*cls.users[:2])
+
+    def member_ids(self):
+        return set(self.project.members.values_list('id', flat=True))
+
+    def test_add_mixes_new_and_existing_members(self):
+        ids = [str(user.id) for user in self.users[1:4]]
+        result = services.add_members(self.project, ids)
+
+        self.assertEqual(result.changed, set(ids[1:]))
+        self.assertEqual(result.unchanged, {ids[0]})
+        self.assertEqual(result.invalid, set())
+        self.assertEqual(self.member_ids(), {user.id for user in self.users[:4]})
+
+    def test_invalid_ids_write_nothing(self):
+        ids = [str(self.users[5].id), 'not-a-uuid', str(uuid.uuid4())]
+        result = services.add_members(self.project, ids)
+        self.assertEqual(result.invalid, set(ids[1:]))
+        self.assertEqual(result.changed, set())
+
+        result = services.remove_members(self.project, [str(self.users[0].id), str(self.users[5].id)])
+        self.assertEqual(result.unchanged, {str(self.users[5].id)})
+        self.assertEqual(result.changed, set())
+        self.assertEqual(self.member_ids(), {self.users[0].id, self.users[1].id})
+
+    def test_bulk_path_query_count_does_not_grow_with_members(self):
+        ids = [str(user.id) for user in self.users[2:]]
+        # users + current members + SAVEPOINT, INSERT, RELEASE
+        with self.assertNumQueries(5):
+            result = services.add_members(self.project, ids)
+        self.assertEqual(len(result.changed), 18)
+
+        # users + current members + SAVEPOINT, DELETE, RELEASE
+        with self.assertNumQueries(5):
+            result = services.remove_members(self.project, ids)
+        self.assertEqual(len(result.changed), 18)
+        self.assertEqual(self.member_ids(), {self.users[0].id, self.users[1].id})
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import accept_invite, add_user_to_project, create_project, decline_invite, delete_project_by_owner_or_admin, delete_user_from_project, get_all_projects_by_admin, get_list_project, get_project_by_filter, restore_project, update_project
+from .views import accept_invite, add_user_to_project, bulk_delete_projects, bulk_restore_projects, create_project, decline_invite, delete_project_by_owner_or_admin, delete_user_from_project, get_all_projects_by_admin, get_list_project, get_project_by_filter, restore_project, update_project
 
 urlpatterns = [
     path('create', create_project),
@@ -9,6 +9,8 @@ urlpatterns = [
     path('delete-user', delete_user_from_project),
     path('delete', delete_project_by_owner_or_admin),
     path('restore', restore_project),
+    path('bulk-delete', bulk_delete_projects),
+    path('bulk-restore', bulk_restore_projects),
     path('list', get_list_project),
     path('accept-invite',accept_invite),
     path('decline-invite', decline_invite),
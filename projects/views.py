@@ -6,13 +6,17 @@ from rest_framework.decorators import api_view
 from drf_yasg.utils import swagger_auto_schema
 from app.models import Project, User
 from middlewares import auth_middleware
+from projects import services
 from projects.serializers import AddOrDeleteUserToProjectSerializers, CreateProjectSerializers, DeleteProjectErrorResponseSerializer, DeleteProjectSuccessResponseSerializer, ListProjectSerializer, ProjectFilter, ProjectSerializer, RequireBody, RestoreProjectErrorResponseSerializer, RestoreProjectSuccessResponseSerializer
-from utils.pagination import Pagination
+from utils.bulk_actions import BulkIdsSerializer
+from utils.pagination import InvalidCursor, get_paginator
 from utils.response import failure_response, success_response
 from uuid import UUID
+from django.db import transaction
 from django.db.models import Q
 from drf_yasg import openapi
-from firebase.firebase_config import db
+from notifications.digest import DigestEvent, engine as digests
+from notifications.store import NotificationStore
 # Create new project
 @swagger_auto_schema(
     method='POST',
@@ -81,19 +85,20 @@ def create_project(request):
                     status_code=status.HTTP_400_BAD_REQUEST
                 )
 
-        # Create project
-        project = Project.objects.create(
-            name=validated_data['name'],
-            description=validated_data.get('description', ''),
-            owner=owner,
-            start_date = validated_data['start_date'],
-            end_date = validated_data['end_date'],
-            status = validated_data['status']
-        )
+        notifications = NotificationStore()
+        with transaction.atomic():
+            # Create project
+            project = Project.objects.create(
+                name=validated_data['name'],
+                description=validated_data.get('description', ''),
+                owner=owner,
+                start_date = validated_data['start_date'],
+                end_date = validated_data['end_date'],
+                status = validated_data['status']
+            )
 
-        if bool(members_string):
-            # Add members to project (including owner)
-            for user in member_ids:
+            if bool(members_string):
+                # Invite members, inserted in one batch and mirrored to Firebase after commit
                 new_data = {
                     "project": str(project.id),
                     "status": "pending",
@@ -103,8 +108,9 @@ def create_project(request):
                     "message": f"You have a invitation to join project {project.name} from {owner.email}",
                     "created_at" : datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
                 }
-                ref = db.reference(f"invitedNotifications/{user}")
-                ref.push(new_data)
+                for user in member_ids:
+                    notifications.invite(user, new_data)
+            notifications.save()
 
         # Serialize the project data
         project_data = ProjectSerializer(project).data
@@ -137,15 +143,21 @@ def get_all_projects_by_admin(request):
             message="You dont have permission for this action",
             status_code= status.HTTP_403_FORBIDDEN
             )
-    query_set = Project.objects.all()
+    query_set = Project.all_objects.all()
 
     # Filter
     project_filter = ProjectFilter(request.GET, queryset=query_set)  
     filtered_projects = project_filter.qs
 
     # paginate
-    paginator = Pagination()
-    paginated_projects = paginator.paginate_queryset(filtered_projects, request)
+    paginator = get_paginator(request)
+    try:
+        paginated_projects = paginator.paginate_queryset(filtered_projects, request)
+    except InvalidCursor:
+        return failure_response(
+            message="Validation errors",
+            data={'cursor': 'invalid cursor'}
+        )
 
     # serializer data
     data = ProjectSerializer(paginated_projects, many=True).data
@@ -171,7 +183,6 @@ def get_project_by_filter(request):
     query_set = Project.objects.filter(
         (Q(owner=UUID(current_user['id'])) | 
         Q(members__id=UUID(current_user['id'])))
-        & Q(is_deleted = False)
         ).distinct() 
 
     # apply filter
@@ -179,8 +190,14 @@ def get_project_by_filter(request):
     filtered_projects = project_filter.qs
 
     # paginate
-    paginator = Pagination()
-    paginated_projects = paginator.paginate_queryset(filtered_projects, request)
+    paginator = get_paginator(request)
+    try:
+        paginated_projects = paginator.paginate_queryset(filtered_projects, request)
+    except InvalidCursor:
+        return failure_response(
+            message="Validation errors",
+            data={'cursor': 'invalid cursor'}
+        )
 
     # serializer data
     data = ProjectSerializer(paginated_projects, many=True).data
@@ -225,42 +242,32 @@ def add_user_to_project(request):
         if not project:
             return failure_response(message="You are not the owner of this project", status_code=status.HTTP_403_FORBIDDEN)
 
-        current_member_ids = {str(member.id) for member in project.members.all()}
-
-        new_members = []
-        invalid_members = []
-        exist_members = []
-        for member_id in req_members_list:
-            try:
-                member = User.objects.get(id=member_id)
-                if member_id not in current_member_ids:
-                    project.members.add(member)
-                    new_members.append(str(member.id))
-                else:
-                   exist_members.append(member_id)
-            except User.DoesNotExist:
-                invalid_members.append(member_id)
-
-        if invalid_members:
+        # One lookup + one bulk insert, nothing is written if an id is invalid
+        result = services.add_members(project, req_members_list)
+
+        if result.invalid:
             return failure_response(
                 message="Some users were not found",
                 data={
-                    "invalid_members":invalid_members
+                    "invalid_members": sorted(result.invalid)
                 },
                 status_code=status.HTTP_404_NOT_FOUND
             )
         
-        if exist_members:
+        if not result.changed:
             return failure_response(
                 message="Some users have been member already",
                 data={
-                    "exist_members": exist_members
+                    "exist_members": sorted(result.unchanged)
                 }
             )
         
         return success_response(
             message="Users added successfully",
-            data={"added_members": new_members}
+            data={
+                "added_members": sorted(result.changed),
+                "exist_members": sorted(result.unchanged)
+            }
         )
 
     except Exception as e:
@@ -304,31 +311,19 @@ def delete_user_from_project(request):
         if not project:
             return failure_response(message="You are not the owner of this project", status_code=status.HTTP_403_FORBIDDEN)
 
-        current_member_ids = {str(member.id) for member in project.members.all()}
-
-        removed_members = []
-        not_member = []
-        for member_id in req_members_list:
-            try:
-                member = User.objects.get(id=member_id)
-                if member_id in current_member_ids:
-                    project.members.remove(member)  
-                    removed_members.append(str(member.id))
-                else:
-                    not_member.append(member_id)
-            except User.DoesNotExist:
-                not_member.append(member_id)
-
-        if not_member:
+        # One lookup + one DELETE, nothing is removed if an id is not a member
+        result = services.remove_members(project, req_members_list)
+
+        if result.invalid or result.unchanged:
             return failure_response(
                 message="Some users were not found in this project",
-                data={"not_member": not_member},
+                data={"not_member": sorted(result.invalid | result.unchanged)},
                 status_code=status.HTTP_404_NOT_FOUND
             )
 
         return success_response(
             message="Users removed successfully",
-            data={"removed_members": removed_members}
+            data={"removed_members": sorted(result.changed)}
         )
     except Exception as e:
         return failure_response(
@@ -456,13 +451,19 @@ def restore_project(request):
                 }
             )
         
-        project = Project.objects.filter( Q(owner=user['id']) & Q(id=project_id)).first()
+        project = Project.deleted_objects.filter( Q(owner=user['id']) & Q(id=project_id)).first()
         
         if not user['role']:
             return failure_response(
                 message="You dont have permissions for this action",
                 status_code=status.HTTP_403_FORBIDDEN
             )
+
+        if not project:
+            return failure_response(
+                message="Project not found",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
         
         project.restore()
 
@@ -476,16 +477,77 @@ def restore_project(request):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+def _bulk_set_projects_deleted(request, deleted):
+    serializer = BulkIdsSerializer(data=request.data)
+    if not serializer.is_valid():
+        return failure_response(
+            message="Validation Errors",
+            data=serializer.errors
+        )
+    try:
+        results, changed = services.set_projects_deleted(
+            request.user, serializer.validated_data['ids'], deleted)
+        return success_response(
+            message="Delete projects successfully" if deleted else "Restore projects successfully",
+            data={
+                "changed": changed,
+                "results": results
+            }
+        )
+    except Exception as e:
+        return failure_response(
+            message="An unexpected error occurred",
+            data=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Soft delete many projects (owner or admin)",
+    tags=["Projects"],
+    request_body=BulkIdsSerializer,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+def bulk_delete_projects(request):
+    return _bulk_set_projects_deleted(request, deleted=True)
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Restore many projects (owner or admin)",
+    tags=["Projects"],
+    request_body=BulkIdsSerializer,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+def bulk_restore_projects(request):
+    return _bulk_set_projects_deleted(request, deleted=False)
+
 @api_view(['GET'])
 @auth_middleware
 def get_list_project(request):
     try:
       user_id = request.user['id']
-      query_set = Project.objects.filter(
-          (Q( owner = user_id) | Q(members__id = user_id))
-        ).distinct()
-      paginator = Pagination()
-      paginated_project = paginator.paginate_queryset(query_set, request)
+      # Subquery on the membership table instead of JOIN + DISTINCT
+      member_project_ids = Project.members.through.objects.filter(user_id=user_id).values('project_id')
+      query_set = ListProjectSerializer.setup_queryset(
+          Project.objects.filter(
+              Q(owner=user_id) | Q(id__in=member_project_ids)
+          ).order_by('-created_at', 'id')
+      )
+      paginator = get_paginator(request)
+      try:
+        paginated_project = paginator.paginate_queryset(query_set, request)
+      except InvalidCursor:
+        return failure_response(
+            message="Validation errors",
+            data={'cursor': 'invalid cursor'}
+        )
 
       data = ListProjectSerializer(paginated_project, many=True).data
       return success_response(
@@ -528,39 +590,41 @@ def accept_invite(request):
           return failure_response(
               message="User is already a member of this project"
           )
-      # add members to projects
-      project.members.add(user)
+      notifications = NotificationStore()
+      with transaction.atomic():
+          # add members to projects
+          project.members.add(user)
 
-      ref = db.reference(f"invitedNotifications/{user_id}")
-      notification = ref.child(valid_data['notification_id'])
+          member_ids = project.members.exclude(id=user_id).values_list('id', flat=True)
+          now = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
-      member_ids = project.members.exclude(id=user_id)
-
-      for member in member_ids:
-          ref_member = db.reference(f"notifications/{str(member)}")
           new_notification = {
-            "title": f"{project.name}",
-            "content" : f"{user.email} has joined {project.name}",
-            "is_read": False,
-            "sender_id": user_id,
-            "created_at": datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-            "updated_at":datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-        }
-          ref_member.push(new_notification)
-
-      #delete notification
-      notification.delete()
-
-      ref_owner = db.reference(f"notifications/{str(project.owner.id)}")
-      new_notification = {
-            "title": f"{project.name}",
-            "content" : f"{user.email} has accept your invitation",
-            "is_read": False,
-            "sender_id":user_id,
-            "created_at": datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-            "updated_at":datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-        }
-      ref_owner.push(new_notification)
+              "title": f"{project.name}",
+              "content" : f"{user.email} has joined {project.name}",
+              "is_read": False,
+              "sender_id": user_id,
+              "created_at": now,
+              "updated_at": now,
+          }
+          # Merged per recipient with other joins of the same window
+          events = [
+              DigestEvent(member_id, 'project_joined', project.id, project.name, user.email, new_notification)
+              for member_id in member_ids
+          ]
+
+          #delete notification
+          notifications.remove_invitation(user_id, valid_data['notification_id'])
+
+          events.append(DigestEvent(project.owner.id, 'invitation_accepted', project.id, project.name, user.email, {
+              "title": f"{project.name}",
+              "content" : f"{user.email} has accept your invitation",
+              "is_read": False,
+              "sender_id":user_id,
+              "created_at": now,
+              "updated_at": now,
+          }))
+          notifications.save()
+          digests.submit(events)
 
       return success_response(
         message=f"User {user.email} has been successfully added to project {project.name}.",
@@ -602,21 +666,16 @@ def decline_invite(request):
                 status_code=status.HTTP_404_NOT_FOUND
             )
 
-        # Check if the notification exists in Firebase
-        ref = db.reference(f"invitedNotifications/{user_id}")
-        notification = ref.child(valid_data['notification_id'])
-        if not notification.get():
+        notifications = NotificationStore()
+
+        # Delete the notification to decline the invite
+        if not notifications.remove_invitation(user_id, valid_data['notification_id']):
             return failure_response(
                 message="Notification not found",
                 status_code=status.HTTP_404_NOT_FOUND
             )
 
-        # Delete the notification to decline the invite
-        notification.delete()
-
         # Send notification to owner
-        ref_owner = db.reference(f"notifications/{str(project.owner.id)}")
-
         new_notification = {
             "title": f"{project.name}",
             "content" : f"{user.email} has decline you invitation",
@@ -625,8 +684,8 @@ def decline_invite(request):
             "created_at": datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
             "updated_at":datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
         }
-
-        ref_owner.push(new_notification)
+        notifications.notify(project.owner.id, new_notification)
+        notifications.save()
 
         return success_response(
             message=f"Invitation to join project {project.name} has been declined.",
@@ -684,30 +743,31 @@ def update_project(request):
         members_string = validated_data.get('members', '')
         member_ids = members_string.split(',') if members_string else []
         
+        notifications = NotificationStore()
         if member_ids:
-            current_member_ids = set(str(member.id) for member in project.members.all())
+            current_member_ids = set(str(member_id) for member_id in project.members.values_list('id', flat=True))
             new_member_ids = set(member_ids) - current_member_ids
-            
-            for user_id in new_member_ids:
-                user = User.objects.filter(id=user_id).first()
-                if not user:
-                    continue  # Skip invalid user IDs
-                
-                # Create invitation notification
-                new_data = {
-                    "project": str(project.id),
-                    "status": "pending",
-                    "from": project.owner.email,
-                    "type": "invite",
-                    "context": "project",
-                    "message": f"You have an invitation to join project {project.name} from {project.owner.email}",
-                    "created_at": datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-                }
-                ref = db.reference(f"invitedNotifications/{user_id}")
-                ref.push(new_data)
+
+            # Skip invalid user IDs
+            invited_ids = User.objects.filter(id__in=new_member_ids).values_list('id', flat=True)
+
+            # Create invitation notification
+            new_data = {
+                "project": str(project.id),
+                "status": "pending",
+                "from": project.owner.email,
+                "type": "invite",
+                "context": "project",
+                "message": f"You have an invitation to join project {project.name} from {project.owner.email}",
+                "created_at": datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            }
+            for invited_id in invited_ids:
+                notifications.invite(invited_id, new_data)
 
         # Save project
-        project.save()
+        with transaction.atomic():
+            project.save()
+            notifications.save()
 
         # Return success response
         return success_response(
@@ -4,6 +4,7 @@ import datetime
 
 from sqlalchemy import null
 from app.models import Task, Project, User
+from django.db.models import Prefetch
 from rest_framework.serializers import ModelSerializer
 
 
@@ -105,13 +106,24 @@ class TaskSerializer(ModelSerializer):
         
         read_only_fields = ['id']
 
+    @staticmethod
+    def setup_queryset(queryset):
+        """
+        Prefetch assignees with only the columns AssigneeSerializer reads.
+        """
+        return queryset.prefetch_related(
+            Prefetch('assignees', queryset=User.objects.only(*AssigneeSerializer.Meta.fields))
+        )
 
-class ProjectSerializer(ModelSerializer):
-    tasks = TaskSerializer(many=True, read_only=True)
+
+class ProjectHeaderSerializer(ModelSerializer):
+    """
+    Project fields shown above a task page. Tasks are paginated separately.
+    """
 
     class Meta:
         model = Project
-        fields = ['id', 'name', 'tasks']
+        fields = ['id', 'name']
 
 class SendNotificationSerializers(serializers.Serializer):
     receiver_id = serializers.CharField()
@@ -1,3 +1,101 @@
+import uuid
+from unittest import mock
+
+from django.db.models import QuerySet
 from django.test import TestCase
 
-# Create your tests here.
+from app.models import Project, Task, User
+from utils.bulk_actions import bulk_set_deleted
+from utils.testing import AuthTestMixin
+from utils.token_verifier import token_verifier
+
+# project + COUNT + task page + assignees prefetch, as in VIEW_QUERY_BUDGETS
+TASKS_BY_PROJECT_QUERY_BUDGET = 4
+
+
+class TasksByProjectQueryCountTests(AuthTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='list-owner', email='list-owner@example.com')
+        cls.assignees = User.objects.bulk_create([
+            User(username=f"assignee-{i}", email=f"assignee-{i}@example.com") for i in range(3)
+        ])
+        cls.project = Project.objects.create(name='Listed', owner=cls.owner)
+        for i in range(12):
+            task = Task.objects.create(title=f"Listed {i}", project=cls.project)
+            task.assignees.set(cls.assignees[:i % 3 + 1])
+
+    auth_user = 'owner'
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in (2, 10):
+            with self.subTest(page_size=page_size):
+                token_verifier.clear()
+                with self.assertNumQueries(TASKS_BY_PROJECT_QUERY_BUDGET):
+                    response = self.get(
+                        '/api/tasks/', {'project_id': str(self.project.id), 'page_size': page_size})
+
+                self.assertEqual(response.status_code, 200)
+                tasks = response.json()['data']['project']['tasks']
+                self.assertEqual(len(tasks), page_size)
+                self.assertTrue(all(task['assignees'] for task in tasks))
+
+
+class BulkTaskDeleteTests(AuthTestMixin, TestCase):
+    # Admin role, as for the single delete; the project membership is checked per task
+    auth_user = 'member'
+    auth_role = True
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create(username='task-member', email='task-member@example.com')
+        cls.owner = User.objects.create(username='task-owner', email='task-owner@example.com')
+        cls.project = Project.objects.create(name='Shared', owner=cls.owner)
+        cls.project.members.add(cls.member)
+        cls.foreign_project = Project.objects.create(name='Foreign', owner=cls.owner)
+        cls.tasks = [Task.objects.create(title=f"Task {i}", project=cls.project) for i in range(4)]
+        cls.foreign = Task.objects.create(title='Not mine', project=cls.foreign_project)
+
+    def test_bulk_delete_reports_each_id(self):
+        ids = [str(task.id) for task in self.tasks]
+        missing = str(uuid.uuid4())
+        self.tasks[0].delete(soft=True)
+
+        response = self.post('/api/tasks/bulk-delete', {'ids': ids + [str(self.foreign.id), missing, 'nope']})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['changed'], 3)
+        self.assertEqual(data['results'][ids[0]], 'already_deleted')
+        self.assertEqual({data['results'][task_id] for task_id in ids[1:]}, {'deleted'})
+        self.assertEqual(data['results'][str(self.foreign.id)], 'forbidden')
+        self.assertEqual(data['results'][missing], 'not_found')
+        self.assertEqual(data['results']['nope'], 'invalid_id')
+        self.assertEqual(Task.deleted_objects.count(), 4)
+
+        response = self.post('/api/tasks/bulk-restore', {'ids': ids[:2]})
+        self.assertEqual(response.json()['data']['changed'], 2)
+        self.assertEqual(Task.deleted_objects.count(), 2)
+
+    def test_bulk_delete_query_count_does_not_depend_on_batch_size(self):
+        for count in (1, 4):
+            with self.subTest(count=count):
+                token_verifier.clear()
+                Task.all_objects.restore()
+                # SELECT ... FOR UPDATE with the membership annotation + one UPDATE,
+                # in a transaction (the savepoint and its release here)
+                with self.assertNumQueries(4):
+                    self.post('/api/tasks/bulk-delete', {'ids': [str(task.id) for task in self.tasks[:count]]})
+
+    def test_rows_are_locked_until_the_update(self):
+        task = self.tasks[0]
+        select_for_update = QuerySet.select_for_update
+
+        # A concurrent request blocks on the lock, then sees the row deleted
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=select_for_update) as lock:
+            results, changed = bulk_set_deleted(Task.all_objects.all(), [str(task.id)], True)
+            self.assertEqual((results, changed), ({str(task.id): 'deleted'}, 1))
+
+            results, changed = bulk_set_deleted(Task.all_objects.all(), [str(task.id)], True)
+            self.assertEqual((results, changed), ({str(task.id): 'already_deleted'}, 0))
+        self.assertEqual(lock.call_count, 2)
@@ -7,6 +7,8 @@ urlpatterns = [
     path('create', create_task),
     path('update', update_task),
     path('delete', delete_task),
+    path('bulk-delete', bulk_delete_tasks),
+    path('bulk-restore', bulk_restore_tasks),
     path('send-invite', send_invite_join_task),
     path('accept', accept_invitation),
     path('decline', decline_invitation),
@@ -3,7 +3,8 @@ import json
 from rest_framework.decorators import api_view
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from utils.pagination import Pagination
+from utils.bulk_actions import BulkIdsSerializer, bulk_set_deleted
+from utils.pagination import InvalidCursor, get_paginator
 from utils.response import success_response, failure_response
 from middlewares import auth_middleware, admin_middleware
 from rest_framework import status
@@ -11,12 +12,14 @@ from .serializers import GetTasksSerializer, CreateTaskSerializer, ResponseSeria
 from rest_framework.exceptions import ValidationError
 from app.models import Project, Task, User
 from rest_framework.pagination import PageNumberPagination
-from .serializers import TaskSerializer, ProjectSerializer
+from .serializers import TaskSerializer, ProjectHeaderSerializer
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 import uuid
-from firebase.firebase_config import db
-from django.db.models import Q
+from notifications.digest import DigestEvent, engine as digests
+from notifications.store import NotificationStore
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 
 
 @swagger_auto_schema(
@@ -73,15 +76,23 @@ def get_tasks_by_project_id(request, *args, **kwargs):
     per_page = serializer.validated_data.get('per_page')
     project_id = serializer.validated_data.get('project_id')
 
-    project = Project.objects.get(id=project_id)
+    project = Project.objects.only('id', 'name').filter(id=project_id).first()
     if not project:
         return failure_response(message="Not found project", status_code=status.HTTP_404_NOT_FOUND)
-    tasks = project.tasks.filter(deleted_at__isnull=True, is_deleted=False)
+    tasks = TaskSerializer.setup_queryset(
+        project.tasks.filter(deleted_at__isnull=True, is_deleted=False).order_by('-created_at', '-id')
+    )
 
-    paginator = Pagination()
-    paginated_tasks = paginator.paginate_queryset(tasks, request)
+    paginator = get_paginator(request)
+    try:
+        paginated_tasks = paginator.paginate_queryset(tasks, request)
+    except InvalidCursor:
+        return failure_response(
+            message="Validation errors",
+            data={'cursor': 'invalid cursor'}
+        )
 
-    project_data = ProjectSerializer(project).data
+    project_data = ProjectHeaderSerializer(project).data
     tasks_data = TaskSerializer(paginated_tasks, many=True).data
 
     project_data['tasks'] = tasks_data
@@ -145,21 +156,20 @@ def create_task(request, *args, **kwargs):
             )
 
 
-        new_task = Task.objects.create(
-            title = valid_data['title'],
-            description = valid_data['description'],
-            start_date = valid_data['start_date'],
-            end_date = valid_data['end_date'],
-            status = valid_data['status'],
-            priority = valid_data['priority'],
-            estimate_hour = valid_data['estimate_hour'],
-            actual_hour = valid_data['actual_hour']
-        )
-
-        project.tasks.add(new_task)
+        notifications = NotificationStore()
+        with transaction.atomic():
+            new_task = Task.objects.create(
+                title = valid_data['title'],
+                description = valid_data['description'],
+                start_date = valid_data['start_date'],
+                end_date = valid_data['end_date'],
+                status = valid_data['status'],
+                priority = valid_data['priority'],
+                estimate_hour = valid_data['estimate_hour'],
+                actual_hour = valid_data['actual_hour'],
+                project = project
+            )
 
-        for mem in assignee_ids:
-            ref = db.reference(f'invitedNotifications/{mem}')
             new_data = {
                     "project": str(project.id),
                     "task": str(new_task.id),
@@ -170,7 +180,9 @@ def create_task(request, *args, **kwargs):
                     "message": f"You have a invitation to join task {new_task.title} from {user.email}",
                     "created_at" : datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
                 }
-            ref.push(new_data)
+            for mem in assignee_ids:
+                notifications.invite(mem, new_data)
+            notifications.save()
         
         return success_response(
             message="Task created successfully",
@@ -232,13 +244,14 @@ def update_task(request, *args, **kwargs):
 
         # Check if the user is a member of the project
        
+        notifications = NotificationStore()
+
         # Update assignees if provided
         if assignee_ids is not None:
             if len(assignee_ids) == 0:
                 task.assignees.clear()
             else:      
                 for mem in assignee_ids:
-                    ref = db.reference(f'invitedNotifications/{mem}')
                     # check if member is already in the task
                     if task.assignees.filter(id=mem).exists():
                     # Create a new notification only for unassigned users
@@ -252,10 +265,9 @@ def update_task(request, *args, **kwargs):
                             "message": f"You have an invitation to join task {task.title} from {user.email}",
                             "created_at": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
                         }
-                        ref.push(new_data)
+                        notifications.invite(mem, new_data)
 
                     if mem == user_id:
-                        ref = db.reference(f'notifications/{mem}')
                         task.assignees.add(user)
 
                         new_notification = {
@@ -267,7 +279,7 @@ def update_task(request, *args, **kwargs):
                             "updated_at": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
                         }
 
-                        ref.push(new_notification)
+                        notifications.notify(mem, new_notification)
                 
         # Update task fields if provided
         if title is not None:
@@ -286,6 +298,7 @@ def update_task(request, *args, **kwargs):
             task.priority = priority
         task.updated_at = timezone.now()
         task.save()
+        notifications.save()
 
         return success_response(status_code=status.HTTP_200_OK, data=TaskSerializer(task).data)
 
@@ -341,18 +354,84 @@ def delete_task(request, *args, **kwargs):
         return failure_response(message="User not in project", status_code=status.HTTP_403_FORBIDDEN)
 
     task = get_object_or_404(Task, id=task_id, project_id=project_id)
-    task.deleted_at = timezone.now()
-    task.is_deleted = True
-    task.save()
+    task.delete(soft=True)
 
     return success_response(status_code=200, data={"message": "Delete task successfully"})
 
+
+def _bulk_set_tasks_deleted(request, deleted):
+    serializer = BulkIdsSerializer(data=request.data)
+    if not serializer.is_valid():
+        return failure_response(
+            message="Validation Errors",
+            data=serializer.errors
+        )
+
+    user_id = request.user['id']
+    # Membership is resolved in the same query as the tasks
+    queryset = Task.all_objects.annotate(
+        is_member=Exists(
+            Project.members.through.objects.filter(project_id=OuterRef('project_id'), user_id=user_id)
+        )
+    )
+
+    def check(row):
+        if row['is_member'] or str(row['project__owner_id']) == str(user_id):
+            return None
+        return 'forbidden'
+
+    try:
+        results, changed = bulk_set_deleted(
+            queryset, serializer.validated_data['ids'], deleted,
+            fields=('is_member', 'project__owner_id'), check=check)
+        return success_response(
+            message="Delete tasks successfully" if deleted else "Restore tasks successfully",
+            data={
+                "changed": changed,
+                "results": results
+            }
+        )
+    except Exception as e:
+        return failure_response(
+            message="An unexpected error occurred",
+            data=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Soft delete many tasks of projects the user belongs to",
+    tags=["Task"],
+    request_body=BulkIdsSerializer,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+@admin_middleware
+def bulk_delete_tasks(request):
+    return _bulk_set_tasks_deleted(request, deleted=True)
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Restore many tasks of projects the user belongs to",
+    tags=["Task"],
+    request_body=BulkIdsSerializer,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+@admin_middleware
+def bulk_restore_tasks(request):
+    return _bulk_set_tasks_deleted(request, deleted=False)
+
+
 @api_view(['POST'])
 @auth_middleware
 def send_invite_join_task(request):
     try:
       user_id = request.user['id']
-      ref = db.reference(f"invitedNotifications/{user_id}")
 
       user = User.objects.get(id=user_id)
 
@@ -382,7 +461,9 @@ def send_invite_join_task(request):
           "message": f"You have a invitation to join {task.title} from {user.email}",
           "created_at" : datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
       }
-      snapshot = ref.push(new_data)
+      notifications = NotificationStore()
+      notifications.invite(user_id, new_data)
+      notifications.save()
       return success_response(
           message="Send invitation successfully",
       )
@@ -398,7 +479,6 @@ def send_invite_join_task(request):
 def accept_invitation(request):
     try:
       user_id = request.user['id']
-      ref = db.reference(f"invitedNotifications/{user_id}")
 
       req_body = ResponseSerializers(data=request.data)
 
@@ -422,24 +502,28 @@ def accept_invitation(request):
           return failure_response(
               message="User is already a member of this task"
           )
-      task.assignees.add(user)
-
-      notification = ref.child(valid_data['notification_id'])
-      member_ids = task.assignees.exclude(id=user_id)
+      notifications = NotificationStore()
+      with transaction.atomic():
+          task.assignees.add(user)
 
-      for member in member_ids:
-          ref_member = db.reference(f"notifications/{str(member)}")
+          member_ids = task.assignees.exclude(id=user_id).values_list('id', flat=True)
+          now = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
           new_notification = {
             "title": f"{task.title}",
             "content" : f"{user.email} has joined {task.title}",
             "is_read": False,
             "sender_id": user_id,
-            "created_at": datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-            "updated_at":datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            "created_at": now,
+            "updated_at": now,
             }
-          ref_member.push(new_notification)
+          # Merged per recipient with other joins of the same window
+          digests.submit(
+              DigestEvent(member_id, 'task_joined', task.id, task.title, user.email, new_notification)
+              for member_id in member_ids
+          )
 
-      notification.delete()
+          notifications.remove_invitation(user_id, valid_data['notification_id'])
+          notifications.save()
       return success_response(
         message=f"User {user.email} has been successfully added to project {task.title}.",
         status_code=status.HTTP_200_OK
@@ -457,7 +541,6 @@ def accept_invitation(request):
 def decline_invitation(request):
     try:
         user_id = request.user.get('id')
-        ref = db.reference(f"invitedNotifications/{user_id}")
 
         req_body = ResponseSerializers(data=request.data)
         if not req_body.is_valid():
@@ -476,8 +559,9 @@ def decline_invitation(request):
                 status_code=status.HTTP_400_BAD_REQUEST
             )
 
-        child_ref = ref.child(invitation_id)
-        child_ref.delete()
+        notifications = NotificationStore()
+        notifications.remove_invitation(user_id, invitation_id)
+        notifications.save()
 
         return success_response(
             message="Invitation declined successfully"
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+
+def _redis():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception as e:
+        # Not a Redis cache (e.g. tests): callers fall back to User.online_status
+        logger.debug(f"Presence disabled: {e}")
+        return None
+
+
+def _decode(member):
+    return member.decode() if isinstance(member, bytes) else member
+
+
+# Drop one process from a user's sockets; the user stays online until the
+# latest expiry of the processes left, or goes offline when there are none.
+# KEYS: presence set, the user's process set. ARGV: user id, process, now
+_DISCONNECT_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3])
+local latest = redis.call('ZRANGE', KEYS[2], -1, -1, 'WITHSCORES')
+if latest[2] then
+    redis.call('ZADD', KEYS[1], latest[2], ARGV[1])
+else
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('DEL', KEYS[2])
+end
+"""
+
+
+def process_id():
+    # Computed on each call: workers forked after import get their own
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_key(key, user_id):
+    # Processes holding sockets of the user, scored like the presence set
+    return f"{key}:{user_id}"
+
+
+def heartbeat(user_ids, key=None, process=None):
+    """
+    Mark users online until now + PRESENCE_TTL with one ZADD. The score of a
+    member is the time its presence expires. `key` selects another sorted
+    set than PRESENCE_KEY. With `process`, also record that this process
+    holds sockets of the users, so mark_offline() from another process
+    keeps them online.
+    """
+    connection = _redis()
+    if connection is None or not user_ids:
+        return
+    key = key or settings.PRESENCE_KEY
+    expires_at = time.time() + settings.PRESENCE_TTL
+    try:
+        pipeline = connection.pipeline(transaction=False)
+        pipeline.zadd(key, {str(user_id): expires_at for user_id in user_ids})
+        if process:
+            for user_id in user_ids:
+                pipeline.zadd(_process_key(key, user_id), {process: expires_at})
+                pipeline.expire(_process_key(key, user_id), settings.PRESENCE_TTL)
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Presence heartbeat failed: {e}")
+
+
+def mark_offline(user_ids, key=None, process=None):
+    """
+    Mark users offline. With `process`, only drop that process's sockets:
+    users still connected through another process stay online.
+    """
+    connection = _redis()
+    if connection is None or not user_ids:
+        return
+    key = key or settings.PRESENCE_KEY
+    try:
+        if not process:
+            connection.zrem(key, *[str(user_id) for user_id in user_ids])
+            return
+        disconnect = connection.register_script(_DISCONNECT_SCRIPT)
+        pipeline = connection.pipeline(transaction=False)
+        now = time.time()
+        for user_id in user_ids:
+            disconnect(keys=[key, _process_key(key, user_id)], args=[str(user_id), process, now], client=pipeline)
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Presence update failed: {e}")
+
+
+def get_online(user_ids, key=None):
+    """
+    Ids (as str) of the given users that are online, in one ZMSCORE call.
+    Returns None when Redis is unavailable, so callers can fall back to the
+    (periodically flushed) User.online_status column.
+    """
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return set()
+    connection = _redis()
+    if connection is None:
+        return None
+    try:
+        scores = connection.zmscore(key or settings.PRESENCE_KEY, user_ids)
+    except Exception as e:
+        logger.warning(f"Presence lookup failed: {e}")
+        return None
+    now = time.time()
+    return {user_id for user_id, score in zip(user_ids, scores) if score is not None and score > now}
+
+
+def sync_online_status(online_ids, chunk_size=500):
+    """
+    Make User.online_status match `online_ids`, writing only the rows whose
+    status changed. Returns how many users went online and offline.
+    """
+    online_ids = {str(user_id) for user_id in online_ids}
+    stored = {str(user_id) for user_id in User.all_objects.filter(online_status=True).values_list('id', flat=True)}
+    went_online = sorted(online_ids - stored)
+    went_offline = sorted(stored - online_ids)
+    for ids, status in ((went_online, True), (went_offline, False)):
+        for start in range(0, len(ids), chunk_size):
+            User.all_objects.filter(id__in=ids[start:start + chunk_size]).update(online_status=status)
+    return len(went_online), len(went_offline)
+
+
+def flush_to_db():
+    """
+    Drop expired members from the sorted set and copy presence to
+    User.online_status. Returns None when Redis is unavailable.
+    """
+    connection = _redis()
+    if connection is None:
+        return None
+    now = time.time()
+    pipeline = connection.pipeline()
+    pipeline.zremrangebyscore(settings.PRESENCE_KEY, '-inf', now)
+    pipeline.zrangebyscore(settings.PRESENCE_KEY, now, '+inf')
+    _, online = pipeline.execute()
+    return sync_online_status(_decode(member) for member in online)
+
+
+class PresenceTracker:
+    """
+    Sockets per user in this process. Each connect and the last disconnect
+    of a user update Redis right away; in between, one heartbeat every
+    PRESENCE_HEARTBEAT_INTERVAL refreshes every user connected here, so the
+    users of a process that dies expire after PRESENCE_TTL.
+
+    Redis also keeps, per user, the processes holding their sockets: the
+    last disconnect here leaves a user with sockets on another process
+    online.
+    """
+
+    def __init__(self, key=None):
+        # Sorted set to update, PRESENCE_KEY when None
+        self.key = key
+        self._sockets = Counter()
+        self._task = None
+
+    async def connect(self, user_id):
+        self._sockets[str(user_id)] += 1
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = asyncio.ensure_future(self._run())
+        await sync_to_async(heartbeat, thread_sensitive=False)([user_id], key=self.key, process=process_id())
+
+    async def disconnect(self, user_id):
+        user_id = str(user_id)
+        if user_id not in self._sockets:
+            return
+        self._sockets[user_id] -= 1
+        if self._sockets[user_id] <= 0:
+            del self._sockets[user_id]
+            await sync_to_async(mark_offline, thread_sensitive=False)(
+                [user_id], key=self.key, process=process_id())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_INTERVAL)
+            if self._sockets:
+                await sync_to_async(heartbeat, thread_sensitive=False)(
+                    list(self._sockets), key=self.key, process=process_id())
+
+
+tracker = PresenceTracker()
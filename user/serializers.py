@@ -64,9 +64,19 @@ class UpdateUserSerializer(serializers.Serializer):
         model = User
 
 class ListUserSerializer(serializers.ModelSerializer):
+    online = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ['id', 'email', 'avatar']
+        fields = ['id', 'email', 'avatar', 'online']
+
+    def get_online(self, obj):
+        # Pass `online` (from user.presence.get_online) in the context to
+        # read live presence instead of the flushed column
+        online = self.context.get('online')
+        if online is None:
+            return obj.online_status
+        return str(obj.id) in online
 
 class ListUserFilterSerializer(django_filters.FilterSet):
     email = django_filters.CharFilter(field_name="email", lookup_expr="icontains")
\ No newline at end of file
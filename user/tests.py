@@ -1,3 +1,234 @@
+import uuid
+from unittest import mock
+
+from django.conf import settings
 from django.test import TestCase
 
-# Create your tests here.
+from app.models import User
+from app.tasks import flush_presence
+from user import presence
+from user.serializers import ListUserSerializer
+from utils.testing import AuthTestMixin
+
+
+class FakeRedis:
+    """
+    The sorted set commands presence uses, with the disconnect script
+    replayed in Python (there is no Lua interpreter here).
+    """
+
+    def __init__(self):
+        self.sets = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update({member: float(score) for member, score in mapping.items()})
+
+    def zrem(self, key, *members):
+        for member in members:
+            self.sets.get(key, {}).pop(member, None)
+
+    def zremrangebyscore(self, key, low, high):
+        members = self.sets.get(key, {})
+        for member, score in list(members.items()):
+            if float(low) <= score <= float(high):
+                del members[member]
+
+    def zrangebyscore(self, key, low, high):
+        members = sorted(self.sets.get(key, {}).items(), key=lambda item: item[1])
+        return [member.encode() for member, score in members if float(low) <= score <= float(high)]
+
+    def zmscore(self, key, members):
+        return [self.sets.get(key, {}).get(member) for member in members]
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def register_script(self, script):
+        assert script == presence._DISCONNECT_SCRIPT
+
+        def disconnect(keys, args, client=None):
+            if isinstance(client, FakePipeline):
+                client.calls.append(lambda: self._disconnect(keys, args))
+            else:
+                self._disconnect(keys, args)
+        return disconnect
+
+    def _disconnect(self, keys, args):
+        key, process_key = keys
+        user_id, process, now = args
+        self.zrem(process_key, process)
+        self.zremrangebyscore(process_key, '-inf', now)
+        processes = self.sets.get(process_key)
+        if processes:
+            self.zadd(key, {user_id: max(processes.values())})
+        else:
+            self.zrem(key, user_id)
+            self.sets.pop(process_key, None)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+        return lambda *args, **kwargs: self.calls.append(lambda: method(*args, **kwargs))
+
+    def execute(self):
+        return [call() for call in self.calls]
+
+
+class PresenceTests(AuthTestMixin, TestCase):
+    auth_user = 'viewer'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f"presence-{i}", email=f"presence-{i}@example.com", online_status=i < 3)
+            for i in range(6)
+        ])
+        cls.viewer = cls.users[5]
+
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(presence, '_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(presence, 'time')
+        self.clock = patcher.start()
+        self.clock.time.return_value = 1000.0
+        self.addCleanup(patcher.stop)
+
+    def online(self, user):
+        return presence.get_online([user.id]) == {str(user.id)}
+
+    def test_heartbeat_keeps_users_online(self):
+        user = self.users[0]
+        presence.heartbeat([user.id], process='web-1')
+        self.clock.time.return_value += settings.PRESENCE_TTL - 10
+        self.assertTrue(self.online(user))
+
+        presence.heartbeat([user.id], process='web-1')
+        self.clock.time.return_value += 20
+        self.assertTrue(self.online(user))
+        self.assertEqual(self.redis.ttls[f"{settings.PRESENCE_KEY}:{user.id}"], settings.PRESENCE_TTL)
+
+        # No heartbeat for a whole TTL: the process is presumed dead
+        self.clock.time.return_value += settings.PRESENCE_TTL
+        self.assertFalse(self.online(user))
+
+    def test_user_stays_online_while_another_process_holds_a_socket(self):
+        user = self.users[0]
+        presence.heartbeat([user.id], process='web-1')
+        presence.heartbeat([user.id], process='web-2')
+
+        presence.mark_offline([user.id], process='web-1')
+        self.assertTrue(self.online(user))
+
+        presence.mark_offline([user.id], process='web-2')
+        self.assertFalse(self.online(user))
+        self.assertNotIn(f"{settings.PRESENCE_KEY}:{user.id}", self.redis.sets)
+
+    def test_expired_processes_do_not_keep_users_online(self):
+        user = self.users[0]
+        presence.heartbeat([user.id], process='web-1')
+        presence.heartbeat([user.id], process='web-2')
+        self.clock.time.return_value += settings.PRESENCE_TTL + 1
+        presence.heartbeat([user.id], process='web-1')
+
+        # web-2 died without disconnecting
+        presence.mark_offline([user.id], process='web-1')
+        self.assertFalse(self.online(user))
+
+    def test_flush_presence_only_writes_changed_rows(self):
+        presence.heartbeat([self.users[0].id, self.users[4].id])
+        # Expired, dropped from the set by the flush
+        self.redis.zadd(settings.PRESENCE_KEY, {str(self.users[1].id): 900})
+
+        # current online ids, users going online, users going offline
+        with self.assertNumQueries(3):
+            self.assertEqual(flush_presence(), (1, 2))
+        self.assertEqual(
+            set(User.objects.filter(online_status=True).values_list('id', flat=True)),
+            {self.users[0].id, self.users[4].id})
+        self.assertNotIn(str(self.users[1].id), self.redis.sets[settings.PRESENCE_KEY])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_presence(), (0, 0))
+
+    def test_flush_only_writes_changed_rows(self):
+        online = [self.users[0].id, self.users[4].id]
+        # current online ids, users going online, users going offline
+        with self.assertNumQueries(3):
+            self.assertEqual(presence.sync_online_status(online), (1, 2))
+        self.assertEqual(
+            set(User.objects.filter(online_status=True).values_list('id', flat=True)), set(online))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(presence.sync_online_status(online), (0, 0))
+
+    def test_online_field_prefers_live_presence_over_the_column(self):
+        live = ListUserSerializer(self.users[:4], many=True, context={'online': {str(self.users[3].id)}}).data
+        self.assertEqual([user['online'] for user in live], [False, False, False, True])
+
+        flushed = ListUserSerializer(self.users[:4], many=True).data
+        self.assertEqual([user['online'] for user in flushed], [True, True, True, False])
+
+    @mock.patch.object(presence, '_redis', return_value=None)
+    def test_user_list_falls_back_to_the_column_without_redis(self, _redis):
+        self.assertIsNone(presence.get_online([self.users[0].id]))
+
+        response = self.get('/api/user/list')
+
+        self.assertEqual(response.status_code, 200)
+        online = {user['id']: user['online'] for user in response.json()['data']}
+        self.assertEqual(online[str(self.users[0].id)], True)
+        self.assertEqual(online[str(self.users[4].id)], False)
+
+
+class BulkUserDeleteTests(AuthTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='bulk-admin', email='bulk-admin@example.com', is_staff=True)
+        cls.users = User.objects.bulk_create([
+            User(username=f"bulk-user-{i}", email=f"bulk-user-{i}@example.com") for i in range(3)
+        ])
+
+    auth_user = 'admin'
+    auth_role = True
+
+    def test_bulk_delete_reports_each_id(self):
+        ids = [str(user.id) for user in self.users]
+        missing = str(uuid.uuid4())
+
+        response = self.post('/api/user/bulk-delete', {'ids': ids + [str(self.admin.id), missing, 'nope']})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(data['changed'], 3)
+        self.assertEqual({data['results'][user_id] for user_id in ids}, {'deleted'})
+        self.assertEqual(data['results'][str(self.admin.id)], 'forbidden')
+        self.assertEqual(data['results'][missing], 'not_found')
+        self.assertEqual(data['results']['nope'], 'invalid_id')
+        self.assertEqual(User.deleted_objects.count(), 3)
+
+        response = self.post('/api/user/bulk-delete', {'ids': ids[:1]})
+        self.assertEqual(response.json()['data'], {'changed': 0, 'results': {ids[0]: 'already_deleted'}})
+
+        response = self.post('/api/user/bulk-restore', {'ids': ids[:2]})
+        self.assertEqual(response.json()['data']['changed'], 2)
+        self.assertEqual(User.deleted_objects.count(), 1)
+
+    def test_bulk_delete_requires_admin(self):
+        token = self.authenticate(self.admin, role=False)
+        response = self.post('/api/user/bulk-delete', {'ids': [str(self.users[0].id)]}, token=token)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(User.deleted_objects.exists())
@@ -1,10 +1,12 @@
 from django.urls import path
 
-from user.views import delete_user_by_admin, get_all_user_by_admin, get_list_user, restore_user_by_admin
+from user.views import bulk_delete_users_by_admin, bulk_restore_users_by_admin, delete_user_by_admin, get_all_user_by_admin, get_list_user, restore_user_by_admin
 
 urlpatterns = [
     path('all', get_all_user_by_admin),
     path('delete', delete_user_by_admin),
     path('restore', restore_user_by_admin),
+    path('bulk-delete', bulk_delete_users_by_admin),
+    path('bulk-restore', bulk_restore_users_by_admin),
     path('list', get_list_user)
 ]
@@ -3,11 +3,12 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from django.db.models import Q
 from app.models import Project, User
-from middlewares import auth_middleware
+from middlewares import admin_middleware, auth_middleware
 from drf_yasg.utils import swagger_auto_schema
+from user import presence
 from user.serializers import AllUserFilterSerializers, AllUserSerializers, ListUserFilterSerializer, ListUserSerializer, UpdateUserSerializer
-from utils import pagination
-from utils.pagination import Pagination
+from utils.bulk_actions import BulkIdsSerializer, bulk_set_deleted
+from utils.pagination import InvalidCursor, get_paginator
 from utils.response import failure_response, success_response
 
 
@@ -32,15 +33,21 @@ def get_all_user_by_admin(request):
             )
     
     # query set
-    query_set = User.objects.all()
+    query_set = User.all_objects.all()
 
     # apply filter
     user_filter = AllUserFilterSerializers(request.GET, queryset=query_set)  
     filtered_users = user_filter.qs
 
     # paginate
-    paginator = Pagination()
-    paginated_projects = paginator.paginate_queryset(filtered_users, request)
+    paginator = get_paginator(request, ordering_field='date_joined')
+    try:
+        paginated_projects = paginator.paginate_queryset(filtered_users, request)
+    except InvalidCursor:
+        return failure_response(
+            message="Validation errors",
+            data={'cursor': 'invalid cursor'}
+        )
 
     # serializing data
     data = AllUserSerializers(paginated_projects, many=True).data
@@ -106,7 +113,7 @@ def restore_user_by_admin(request):
                 message="You dont have permission for this action"
             )
         
-        user = User.objects.filter(id = UUID(user_id)).first()
+        user = User.deleted_objects.filter(id = UUID(user_id)).first()
         # check existance user
         if not user:
             return failure_response(
@@ -129,6 +136,67 @@ def restore_user_by_admin(request):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+def _bulk_set_users_deleted(request, deleted):
+    serializer = BulkIdsSerializer(data=request.data)
+    if not serializer.is_valid():
+        return failure_response(
+            message="Validation Errors",
+            data=serializer.errors
+        )
+
+    current_user_id = str(request.user['id'])
+
+    def check(row):
+        # admins cannot lock themselves out
+        return 'forbidden' if str(row['id']) == current_user_id else None
+
+    try:
+        results, changed = bulk_set_deleted(
+            User.all_objects.all(), serializer.validated_data['ids'], deleted, check=check)
+        return success_response(
+            message="deleted successfully" if deleted else "restore user successfully",
+            data={
+                "changed": changed,
+                "results": results
+            }
+        )
+    except Exception as e:
+        return failure_response(
+            message="An unexpected error occurred",
+            data=str(e),
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Soft delete many users by admin",
+    tags=["Users"],
+    request_body=BulkIdsSerializer,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+@admin_middleware
+def bulk_delete_users_by_admin(request):
+    return _bulk_set_users_deleted(request, deleted=True)
+
+
+@swagger_auto_schema(
+    method='POST',
+    operation_description="Restore many users by admin",
+    tags=["Users"],
+    request_body=BulkIdsSerializer,
+    security=[{'Bearer': []}]
+)
+@api_view(['POST'])
+@auth_middleware
+@admin_middleware
+def bulk_restore_users_by_admin(request):
+    return _bulk_set_users_deleted(request, deleted=False)
+
+
 @api_view(['GET'])
 @auth_middleware
 def get_list_user(request):
@@ -142,10 +210,17 @@ def get_list_user(request):
         query_filter = ListUserFilterSerializer(request.GET,queryset=user)
         filter_list = query_filter.qs
 
-        paginator = Pagination()
-        paginated_list_user = paginator.paginate_queryset(filter_list,request)
+        paginator = get_paginator(request, ordering_field='date_joined')
+        try:
+            paginated_list_user = paginator.paginate_queryset(filter_list,request)
+        except InvalidCursor:
+            return failure_response(
+                message="Validation errors",
+                data={'cursor': 'invalid cursor'}
+            )
 
-        data = ListUserSerializer(paginated_list_user, many=True).data
+        online = presence.get_online([user.id for user in paginated_list_user])
+        data = ListUserSerializer(paginated_list_user, many=True, context={'online': online}).data
 
         return success_response(
             message="get list user successfully",
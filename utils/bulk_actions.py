@@ -0,0 +1,73 @@
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=settings.BULK_ACTION_MAX_IDS,
+    )
+
+
+def parse_uuids(raw_ids):
+    """
+    Split raw ids into {UUID: raw id} and the set of raw values that are not UUIDs.
+    """
+    valid, invalid = {}, set()
+    for raw_id in raw_ids:
+        try:
+            valid[UUID(str(raw_id))] = str(raw_id)
+        except ValueError:
+            invalid.add(str(raw_id))
+    return valid, invalid
+
+
+def bulk_set_deleted(queryset, raw_ids, deleted, fields=(), check=None):
+    """
+    Soft delete (deleted=True) or restore the rows of `queryset` matching
+    `raw_ids` with one SELECT and one UPDATE.
+
+    `queryset` should come from `all_objects`, annotated with whatever
+    `check` needs; `fields` are the extra values loaded for it. `check(row)`
+    returns None when the row may be changed, or the outcome to report.
+
+    Returns ({raw id: outcome}, number of rows changed). The rows are locked
+    from the SELECT to the UPDATE, so a concurrent request waits and then
+    reports them as already deleted/not deleted: each outcome is the one
+    actually applied.
+    """
+    valid, invalid = parse_uuids(raw_ids)
+    results = {raw_id: 'invalid_id' for raw_id in invalid}
+    with transaction.atomic():
+        rows = {
+            row['id']: row
+            for row in queryset.filter(id__in=valid.keys())
+            .select_for_update().order_by('id').values('id', 'is_deleted', *fields)
+        }
+
+        to_change = []
+        for row_id, raw_id in valid.items():
+            row = rows.get(row_id)
+            if row is None:
+                results[raw_id] = 'not_found'
+                continue
+            outcome = check(row) if check else None
+            if outcome:
+                results[raw_id] = outcome
+            elif row['is_deleted'] == deleted:
+                results[raw_id] = 'already_deleted' if deleted else 'not_deleted'
+            else:
+                to_change.append(row_id)
+
+        if not to_change:
+            return results, 0
+
+        changed_rows = queryset.model.all_objects.filter(id__in=to_change, is_deleted=not deleted)
+        changed = changed_rows.soft_delete() if deleted else changed_rows.restore()
+    for row_id in to_change:
+        results[valid[row_id]] = 'deleted' if deleted else 'restored'
+    return results, changed
@@ -1,6 +1,12 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
 from math import ceil
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class Pagination(PageNumberPagination):
     page_size = 25  
@@ -28,3 +34,159 @@ class Pagination(PageNumberPagination):
                 'previous': self.get_previous_link()  
             }
         })
+
+
+def encode_cursor(value, id, reverse=False):
+    """
+    Opaque cursor for the (value, id) position of a row.
+    """
+    payload = json.dumps({
+        'v': value.isoformat() if isinstance(value, datetime) else value,
+        'id': str(id),
+        'r': reverse,
+    })
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def decode_cursor(cursor, parse_id=UUID):
+    """
+    Returns {'value', 'id', 'reverse'}; raises InvalidCursor (a ValueError)
+    for a malformed cursor, including one that decodes but whose value is not
+    an ISO datetime or whose id `parse_id` rejects.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {
+            'value': datetime.fromisoformat(payload['v']),
+            'id': str(parse_id(payload['id'])),
+            'reverse': bool(payload.get('r')),
+        }
+    except (TypeError, ValueError, KeyError, AttributeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def keyset_filter(queryset, field, cursor, reverse=False):
+    """
+    Rows after `cursor` in `field DESC, id DESC` order (before it when
+    reverse). Spelled out with a leading range on `field` so every backend
+    can seek on a (field, id) index.
+    """
+    lookup = 'gt' if reverse else 'lt'
+    return queryset.filter(
+        Q(**{f'{field}__{lookup}e': cursor['value']}),
+        Q(**{f'{field}__{lookup}': cursor['value']}) |
+        Q(**{f'id__{lookup}': cursor['id']})
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on (ordering_field, id), newest first.
+
+    Pages are fetched with `WHERE (field, id) < cursor ORDER BY field DESC,
+    id DESC LIMIT n`, so page 1000 costs the same as page 1. Cursors are
+    opaque; pass `include_total=false` to skip the COUNT(*). A malformed
+    cursor raises InvalidCursor, which views answer with a 400.
+    """
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    include_total_query_param = 'include_total'
+
+    def __init__(self, ordering_field='created_at'):
+        self.ordering_field = ordering_field
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        self.total = None
+        if request.query_params.get(self.include_total_query_param, 'true').lower() != 'false':
+            self.total = queryset.count()
+
+        field = self.ordering_field
+        reverse = bool(cursor and cursor['reverse'])
+
+        if cursor:
+            queryset = keyset_filter(queryset, field, cursor, reverse=reverse)
+
+        if reverse:
+            queryset = queryset.order_by(field, 'id')
+        else:
+            queryset = queryset.order_by(f'-{field}', '-id')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.first, self.last = (rows[0], rows[-1]) if rows else (None, None)
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def encode_cursor(self, obj, reverse=False):
+        return encode_cursor(getattr(obj, self.ordering_field), obj.id, reverse=reverse)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        return decode_cursor(cursor)
+
+    def get_next_cursor(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last)
+
+    def get_previous_cursor(self):
+        if not self.has_previous or self.first is None:
+            return None
+        return self.encode_cursor(self.first, reverse=True)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        next_cursor = self.get_next_cursor()
+        previous_cursor = self.get_previous_cursor()
+        return Response({
+            'success': True,
+            'message': 'successful',
+            'data': data,
+            'pagination': {
+                'total': self.total,
+                'page_size': self.page_size,
+                'next_cursor': next_cursor,
+                'previous_cursor': previous_cursor,
+                'next': self._link(next_cursor),
+                'previous': self._link(previous_cursor),
+            }
+        })
+
+
+def get_paginator(request, ordering_field='created_at'):
+    """
+    `?pagination=cursor` opts into keyset pagination, page numbers otherwise.
+    """
+    if request.query_params.get('pagination') == 'cursor':
+        return KeysetPagination(ordering_field=ordering_field)
+    return Pagination()
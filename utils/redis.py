@@ -1,14 +1,22 @@
 import json
 from django.core.cache import cache
+from core.metrics import record_cache
 
 def set_cache(key, data, time):
     cache.set(key, json.dumps(data), timeout=time)
 
 def get_cache(key):
     cached_data = cache.get(key)
+    record_cache(cached_data is not None)
     if cached_data:
         return json.loads(cached_data) 
     return None
 
+def has_cache(key):
+    # Existence check only, skips the JSON decode of get_cache
+    hit = cache.get(key) is not None
+    record_cache(hit)
+    return hit
+
 def remove_cache(key):
     cache.delete(key)
@@ -1,10 +1,10 @@
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination
 
 # Success Response Utility
 def success_response(data: dict = None, message: str = "Operation successful", status_code: int = status.HTTP_200_OK, paginator=None):
-    if paginator and isinstance(paginator, PageNumberPagination):
+    if paginator and isinstance(paginator, BasePagination):
         return paginator.get_paginated_response(data)
     response_data = {
         "success": True,
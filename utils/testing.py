@@ -0,0 +1,36 @@
+from utils.jwt import generate_access_token
+from utils.redis import remove_cache, set_cache
+from utils.token_verifier import token_verifier
+
+
+class AuthTestMixin:
+    """
+    Signs the test client's requests in with an access token of the user
+    stored in the `auth_user` attribute (usually set in setUpTestData),
+    with `auth_role` as the admin flag of the token.
+    """
+    auth_user = 'user'
+    auth_role = False
+
+    def setUp(self):
+        super().setUp()
+        token_verifier.clear()
+        self.token = self.authenticate(getattr(self, self.auth_user), self.auth_role)
+
+    def authenticate(self, user, role=False):
+        """
+        Access token of `user`, accepted by auth_middleware until the test ends.
+        """
+        token = generate_access_token(user.id, role)
+        set_cache(f"access_token:{token}", token, 60)
+        self.addCleanup(remove_cache, f"access_token:{token}")
+        return token
+
+    def auth_headers(self, token=None):
+        return {'HTTP_AUTHORIZATION': f"Bearer {token or self.token}"}
+
+    def get(self, url, data=None, token=None):
+        return self.client.get(url, data, **self.auth_headers(token))
+
+    def post(self, url, data, token=None):
+        return self.client.post(url, data, content_type='application/json', **self.auth_headers(token))
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+
+from utils.redis import has_cache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRevoked(jwt.InvalidTokenError):
+    pass
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenVerifier:
+    """
+    Two-tier access token check used by `auth_middleware`.
+
+    1. Per-process LRU of already verified tokens. An entry lives until the
+       JWT `exp`, capped at AUTH_LOCAL_TOKEN_MAX_TTL seconds.
+    2. On a miss: the Redis `access_token:<token>` whitelist + jwt.decode.
+
+    `revoke()` evicts the token locally and publishes its digest on the Redis
+    revocation channel so every other process evicts it too.
+    """
+
+    def __init__(self, max_size=None, max_ttl=None, use_local_cache=None):
+        self.max_size = max_size or settings.AUTH_LOCAL_TOKEN_CACHE_SIZE
+        self.max_ttl = max_ttl or settings.AUTH_LOCAL_TOKEN_MAX_TTL
+        self.use_local_cache = (
+            settings.AUTH_LOCAL_TOKEN_CACHE if use_local_cache is None else use_local_cache
+        )
+        self._entries = OrderedDict()
+        # Bumped by every eviction, so a check that raced a revoke() is not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def verify(self, token):
+        """
+        Return the decoded payload, or raise a jwt exception.
+        """
+        if not self.use_local_cache:
+            return self._verify_remote(token)
+
+        self._ensure_listener()
+        digest = token_digest(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                payload, expires_at = entry
+                if now < expires_at:
+                    self._entries.move_to_end(digest)
+                    return payload
+                del self._entries[digest]
+            generation = self._generation
+
+        payload = self._verify_remote(token)
+
+        expires_at = min(payload.get('exp', now), now + self.max_ttl)
+        with self._lock:
+            if generation != self._generation:
+                # Revoked (or cleared) while Redis was checked: valid now, not cached
+                return payload
+            self._entries[digest] = (payload, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return payload
+
+    def revoke(self, token):
+        digest = token_digest(token)
+        self.evict(digest)
+        try:
+            from django_redis import get_redis_connection
+            get_redis_connection('default').publish(settings.AUTH_REVOCATION_CHANNEL, digest)
+        except Exception as e:
+            logger.warning(f"Could not publish token revocation: {e}")
+
+    def evict(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    # Internal helpers
+
+    @staticmethod
+    def _verify_remote(token):
+        if not has_cache(f'access_token:{token}'):
+            raise TokenRevoked("Invalid token")
+        return jwt.decode(
+            token,
+            key=settings.JWT_SECRET,
+            algorithms=["HS256"],
+            options={"verify_exp": True},
+        )
+
+    def _ensure_listener(self):
+        # One subscriber thread per process (re-created after a fork)
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            self._entries.clear()
+        threading.Thread(target=self._listen, name='token-revocation-listener', daemon=True).start()
+
+    def _listen(self):
+        try:
+            from django_redis import get_redis_connection
+            connection = get_redis_connection('default')
+        except Exception as e:
+            # Not a Redis cache (e.g. tests): entries still expire after max_ttl
+            logger.info(f"Token revocation listener disabled: {e}")
+            return
+
+        backoff = 1
+        while True:
+            try:
+                pubsub = connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(settings.AUTH_REVOCATION_CHANNEL)
+                backoff = 1
+                for message in pubsub.listen():
+                    digest = message.get('data')
+                    if isinstance(digest, bytes):
+                        digest = digest.decode()
+                    if digest:
+                        self.evict(digest)
+            except Exception as e:
+                logger.warning(f"Token revocation listener error: {e}")
+                # Anything revoked while disconnected may still be cached
+                self.clear()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+token_verifier = TokenVerifier()